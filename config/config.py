@@ -1,8 +1,9 @@
 import os
-import json
 from dotenv import load_dotenv
 from pathlib import Path
 
+from src.roster import Roster
+
 # .envファイルのロード
 load_dotenv()
 
@@ -24,17 +25,20 @@ DISCORD_TOKEN = _get_env_var('DISCORD_TOKEN')
 REPORT_CHANNEL_ID = _get_env_int('DISCORD_REPORT_CHANNEL_ID')
 DECLARATION_CHANNEL_ID = _get_env_int('DISCORD_DECLARATION_CHANNEL_ID')
 
-# Google Sheets設定
-SPREADSHEET_ID = _get_env_var('SPREADSHEET_ID')
+# Google Sheets設定(RESULT_SINKSに'sheets'を含む場合のみ必要)
+SPREADSHEET_ID = _get_env_var('SPREADSHEET_ID', required=False)
 CREDENTIALS_PATH = Path(__file__).parent / 'credentials.json'
 
 # 日付フォーマット設定
+# 先に書いたパターンほど優先される(同じ位置でマッチした場合)。
+# 年・月・日はそれぞれ名前付きグループ year, month, day で取り出す(year は省略可)
 DATE_FORMATS = [
     # 年/月/日パターン(優先)
-    r'(?<!\d)(?:20)?\d{2}[/-]\d{1,2}[/-]\d{1,2}(?!\d)',  # YYYY/MM/DD, YY/MM/DD
+    # 月・日は範囲を限定し、"12/28-12/29"のような月/日の並びを年/月/日として取り込まないようにする
+    r'(?<!\d)(?P<year>(?:20)?\d{2})[/-](?P<month>1[0-2]|0?[1-9])[/-](?P<day>3[01]|[12][0-9]|0?[1-9])(?!\d)',  # YYYY/MM/DD, YY/MM/DD
     # 月/日パターン(年/月/日にマッチしない場合のみ)
-    r'(?<!\d)\d{1,2}[/-]\d{1,2}(?=日[報誌記]|$|\s|[^0-9])',   # MM/DD（日報/日誌/空白/行末）
-    r'\d{1,2}月\d{1,2}日(?=日[報誌記]|$|\s|[^0-9])'    # MM月DD日
+    r'(?<!\d)(?P<month>\d{1,2})[/-](?P<day>\d{1,2})(?=日[報誌記]|$|\s|[^0-9])',   # MM/DD（日報/日誌/空白/行末）
+    r'(?P<month>\d{1,2})月(?P<day>\d{1,2})日(?=日[報誌記]|$|\s|[^0-9])'    # MM月DD日
 ]
 
 # 1月1日の開始行
@@ -42,40 +46,48 @@ START_ROW = 7  # 7行目からデータ開始
 
 # Discord設定の追加
 MESSAGE_HISTORY_LIMIT = 500  # メッセージ履歴取得の制限
+CHANNEL_SCAN_CONCURRENCY = 2  # チャンネル走査の同時実行数
+THREAD_CRAWL_CONCURRENCY = 4  # スレッド履歴取得の同時実行数
 
-# ユーザー設定の読み込み
-def _column_to_index(column: str) -> int:
-    # 列名(A,B,C...)を数値インデックス(0,1,2...)に変換
-    return sum((ord(char) - ord('A') + 1) * (26 ** i)
-            for i, char in enumerate(reversed(column))) - 1
+# 常駐モード設定
+DAEMON_FLUSH_INTERVAL = 5  # 書き込み待ちを確認する間隔(秒)
+DAEMON_FLUSH_DEBOUNCE_SECONDS = 30  # 最後の変更からこの秒数変更がなければ書き込む
+DAEMON_FLUSH_MAX_DELAY_SECONDS = 300  # 変更が続いてもこの秒数を超えたら書き込む
 
-def _index_to_column(index: int) -> str:
-    # 数値インデックスを列名に変換
-    index += 1
-    result = ""
-    while index:
-        index, remainder = divmod(index - 1, 26)
-        result = chr(ord('A') + remainder) + result
-    return result
+# ローカルデータ設定
+DATA_DIR = Path(__file__).parent.parent / 'data'
+MESSAGE_ARCHIVE_ENABLED = True  # メッセージアーカイブを使用して差分のみを取得する
+MESSAGE_ARCHIVE_PATH = DATA_DIR / 'messages.sqlite3'
+# 同期済みでも取得し直す直近の秒数(検索範囲の2日間と直後の1日の編集・削除を反映する)
+MESSAGE_ARCHIVE_RESYNC_SECONDS = 3 * 24 * 60 * 60
+# 日付抽出メモ(本文のハッシュ → 抽出した日付)の最大件数と保存先
+DATE_MEMO_SIZE = 50000
+DATE_MEMO_PERSIST = True
+DATE_MEMO_PATH = DATA_DIR / 'date_memo.sqlite3'
+# アーカイブの再判定(--reevaluate)の並列数(Noneの場合はCPUコア数)と1チャンクのメッセージ数
+REEVALUATION_WORKERS = None
+REEVALUATION_CHUNK_SIZE = 2000
+# Sheets APIの1分あたりのリクエスト数の上限(ユーザーごとのクォータ)と同時実行数・最大再試行回数
+SHEETS_READ_REQUESTS_PER_MINUTE = 60
+SHEETS_WRITE_REQUESTS_PER_MINUTE = 60
+SHEETS_CONCURRENT_LIMIT = 3
+SHEETS_MAX_RETRIES = 5
+# Sheets APIのアクセストークンのキャッシュ(実行をまたいで有効期限内のトークンを使い回す)
+SHEETS_TOKEN_CACHE_PATH = DATA_DIR / 'sheets_token.json'
+# スプレッドシートのシート名 → sheetIdのキャッシュ
+SHEET_METADATA_CACHE_PATH = DATA_DIR / 'sheet_metadata.json'
+# 判定結果の書き込み先('sheets': Google Sheets, 'sqlite': ローカルの結果DB)。複数指定するとすべてに書き込む
+RESULT_SINKS = ['sheets']
+RESULT_DB_PATH = DATA_DIR / 'results.sqlite3'
+# Google Sheetsに書き込む前の結果を記録する送信待ちファイル(書き込みに失敗した結果は run.py --replay で再送する)
+OUTBOX_ENABLED = True
+OUTBOX_PATH = DATA_DIR / 'outbox.jsonl'
+USER_NAME_CACHE_PATH = DATA_DIR / 'user_names.json'
+USER_NAME_CACHE_TTL = 7 * 24 * 60 * 60  # ユーザー名キャッシュの有効期限(秒)
 
-def _load_user_columns():
-    json_path = Path(__file__).parent / 'user_columns.json'
-    with open(json_path, 'r', encoding='utf-8') as f:
-        users = json.load(f)
-    
-    # ユーザー列の設定を変換
-    user_columns = {}
-    for user in users:
-        sangen_col = user['sengenCol']
-        # 列名を数値インデックスに変換、1を加算して次の列を取得、再び列名に変換
-        sangen_index = _column_to_index(sangen_col)
-        report_col = _index_to_column(sangen_index + 1)
-        user_columns[user['userId']] = {
-            "name": user.get('name', 'N/A'),  # nameフィールドがない場合はN/A
-            "declaration": sangen_col,
-            "report": report_col
-        }
-    return user_columns
+# ユーザー設定の読み込み(常駐中はreload_if_changed()でファイルの変更を反映する)
+USER_COLUMNS_PATH = Path(__file__).parent / 'user_columns.json'
+ROSTER = Roster(USER_COLUMNS_PATH)
 
-# ユーザーIDと列の対応
-USER_COLUMNS = _load_user_columns()
\ No newline at end of file
+# ユーザーIDと列の対応(起動時点の内容)
+USER_COLUMNS = ROSTER.columns()
@@ -1,11 +1,23 @@
 # run.py
+import time
+# 起動時間の計測開始(ライブラリの読み込みを含める)
+PROCESS_STARTED_AT = time.perf_counter()
+
 import os
 import asyncio
 import argparse
 import logging
-from datetime import datetime, date
+import logging.handlers
+import queue
+from datetime import datetime, date, timedelta
 from pathlib import Path
-from src.bot import ReportBot
+from src.bot import CHANNEL_CONFIGS, ReportBot
+from src.daemon import ReportDaemon
+from src.message_archive import MessageArchive
+from src.outbox import ResultOutbox
+from src.reevaluator import ArchiveReevaluator
+from src.result_sink import create_result_sink
+from src.window_planner import WindowPlanner
 
 def parse_date(date_str: str) -> date:
     try:
@@ -27,22 +39,87 @@ def parse_args():
         help='チェックする日付（YYYY/MM/DD形式）。指定がない場合は本日の日付',
         default=date.today()
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--from',
+        dest='from_date',
+        type=parse_date,
+        help='バックフィルの開始日（YYYY/MM/DD形式）。--toと組み合わせて期間をまとめてチェック',
+        default=None
+    )
+    parser.add_argument(
+        '--to',
+        dest='to_date',
+        type=parse_date,
+        help='バックフィルの終了日（YYYY/MM/DD形式）。指定がない場合は本日の日付',
+        default=None
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='常駐モード。接続を維持して投稿のたびに判定し、変更をGoogle Sheetsに書き込む'
+    )
+    parser.add_argument(
+        '--reevaluate',
+        action='store_true',
+        help='Discordに接続せず、アーカイブ済みのメッセージだけで期間を再判定して書き込む(日付ルールの変更後など)'
+    )
+    parser.add_argument(
+        '--replay',
+        action='store_true',
+        help='書き込みに失敗して送信待ちになっている結果をGoogle Sheetsにまとめて再送する'
+    )
+    parser.add_argument(
+        '--debug',
+        action='store_true',
+        help='メッセージごとの判定の詳細をログに出力する'
+    )
+    args = parser.parse_args()
+
+    if args.daemon and (args.from_date or args.to_date):
+        parser.error('--daemon は --from/--to と同時に指定できません')
+    if args.daemon and args.reevaluate:
+        parser.error('--daemon は --reevaluate と同時に指定できません')
+    if args.replay and (args.daemon or args.reevaluate or args.from_date or args.to_date):
+        parser.error('--replay は他のモードや期間の指定と同時に指定できません')
+    if args.to_date and not args.from_date:
+        parser.error('--to は --from と組み合わせて指定してください')
+    if args.from_date:
+        args.to_date = args.to_date or date.today()
+        if args.from_date > args.to_date:
+            parser.error('--from には --to 以前の日付を指定してください')
+    return args
 from config.config import (
     DISCORD_TOKEN,
     REPORT_CHANNEL_ID,
     DECLARATION_CHANNEL_ID,
     SPREADSHEET_ID,
-    CREDENTIALS_PATH
+    CREDENTIALS_PATH,
+    USER_COLUMNS,
+    MESSAGE_ARCHIVE_PATH,
+    REEVALUATION_WORKERS,
+    REEVALUATION_CHUNK_SIZE,
+    OUTBOX_ENABLED,
+    OUTBOX_PATH,
+    RESULT_SINKS,
+    RESULT_DB_PATH
 )
 
-def setup_logging(target_date: date, debug_mode: bool = False):
+def setup_logging(target_date: date, debug_mode: bool = False, end_date: date = None) -> logging.handlers.QueueListener:
+    """
+    ロギングを設定する
+
+    ファイルへの書き込みはQueueListenerのバックグラウンドスレッドで行い、
+    イベントループのスレッドではキューへの追加だけを行う。戻り値のリスナーは終了時にstop()すること
+    """
     # logディレクトリが存在しない場合は作成
     log_dir = Path("log")
     log_dir.mkdir(exist_ok=True)
     
-    # ログファイル名を設定（YYYYMMDD.log形式）
-    log_file = log_dir / f"{target_date.strftime('%Y%m%d')}.log"
+    # ログファイル名を設定（YYYYMMDD.log形式、期間指定の場合はYYYYMMDD-YYYYMMDD.log形式）
+    if end_date and end_date != target_date:
+        log_file = log_dir / f"{target_date.strftime('%Y%m%d')}-{end_date.strftime('%Y%m%d')}.log"
+    else:
+        log_file = log_dir / f"{target_date.strftime('%Y%m%d')}.log"
     
     # ロガーの設定
     logger = logging.getLogger()
@@ -60,11 +137,15 @@ def setup_logging(target_date: date, debug_mode: bool = False):
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
     
-    # ロガーにハンドラーを追加
-    logger.addHandler(file_handler)
+    # ロガーにはキューハンドラーだけを追加し、ファイルへの書き込みはリスナーに任せる
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
     
     if debug_mode:
         logging.info("デバッグモードが有効です")
+    return listener
 
 def check_environment():
     logging.info("環境変数チェック中...")
@@ -72,8 +153,11 @@ def check_environment():
         'DISCORD_TOKEN': DISCORD_TOKEN,
         'REPORT_CHANNEL_ID': REPORT_CHANNEL_ID,
         'DECLARATION_CHANNEL_ID': DECLARATION_CHANNEL_ID,
-        'SPREADSHEET_ID': SPREADSHEET_ID
     }
+    # Google Sheetsに書き込まない構成(RESULT_SINKSが'sqlite'のみ)では不要
+    uses_sheets = 'sheets' in RESULT_SINKS
+    if uses_sheets:
+        required_vars['SPREADSHEET_ID'] = SPREADSHEET_ID
 
     missing_vars = [name for name, value in required_vars.items() if not value]
     
@@ -83,7 +167,7 @@ def check_environment():
             logging.error(f"- {var}")
         return False
 
-    if not CREDENTIALS_PATH.exists():
+    if uses_sheets and not CREDENTIALS_PATH.exists():
         logging.error("Google認証情報ファイルが見つかりません:")
         logging.error(f"- {CREDENTIALS_PATH}")
         return False
@@ -93,30 +177,56 @@ def check_environment():
 
 async def main():
     args = parse_args()
+    start_date = args.from_date or args.date
+    end_date = args.to_date or args.date
+    days = (end_date - start_date).days + 1
     
-    # ロギングの設定（デフォルトはINFOレベル）
-    setup_logging(args.date, debug_mode=False)
-    
+    # ロギングの設定（デフォルトはINFOレベル、--debugでメッセージごとの詳細も出力）
+    log_listener = setup_logging(start_date, debug_mode=args.debug, end_date=end_date)
+    try:
+        await run(args, start_date, end_date, days)
+    finally:
+        # キューに残っているログを書き出してから終了
+        log_listener.stop()
+
+async def run(args, start_date: date, end_date: date, days: int):
+    """Botを起動してチェックを実行する"""
     logging.info("=== 報告・宣言チェックBot ===")
     
     if not check_environment():
         logging.error("❌ 環境設定が不完全です。プログラムを終了します。")
         return
 
+    if args.replay:
+        await run_replay()
+        return
+    if args.reevaluate:
+        await run_reevaluation(start_date, end_date)
+        return
+
     logging.info("🤖 Botを起動中...")
-    logging.info(f"チェック対象日: {args.date.strftime('%Y/%m/%d')}")
-    bot = ReportBot(target_date=args.date)
+    if args.daemon:
+        await run_daemon()
+        return
+    if days == 1:
+        logging.info(f"チェック対象日: {start_date.strftime('%Y/%m/%d')}")
+    else:
+        logging.info(f"バックフィル期間: {start_date.strftime('%Y/%m/%d')} 〜 {end_date.strftime('%Y/%m/%d')} ({days}日間)")
+    bot = ReportBot(target_date=start_date, end_date=end_date, started_at=PROCESS_STARTED_AT)
+
+    # タイムアウト（1日分は5分、バックフィルは1日ごとに1分を追加）
+    timeout = 300 + 60 * (days - 1)
     
     try:
         # Botを起動し、チェック完了を待つ
         async with bot:
             logging.info("✓ Bot準備完了")
-            # 5分のタイムアウトを設定
+            # タイムアウトを設定
             try:
-                async with asyncio.timeout(300):  # 5分
+                async with asyncio.timeout(timeout):
                     await bot.start(DISCORD_TOKEN)
             except asyncio.TimeoutError:
-                logging.warning("⚠️ タイムアウト：処理が5分以上かかったため終了します")
+                logging.warning(f"⚠️ タイムアウト：処理が{timeout}秒以上かかったため終了します")
     except KeyboardInterrupt:
         logging.warning("⚠️ プログラムが中断されました")
     except Exception as e:
@@ -126,5 +236,92 @@ async def main():
             await bot.close()
         logging.info("✓ プログラムを終了しました")
 
+async def run_daemon():
+    """常駐モードで起動する(タイムアウトなし)"""
+    logging.info("常駐モードで起動します")
+    bot = ReportDaemon(started_at=PROCESS_STARTED_AT)
+    try:
+        async with bot:
+            logging.info("✓ Bot準備完了")
+            await bot.start(DISCORD_TOKEN)
+    except KeyboardInterrupt:
+        logging.warning("⚠️ プログラムが中断されました")
+    except Exception as e:
+        logging.error(f"❌ エラーが発生しました: {str(e)}")
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        logging.info("✓ プログラムを終了しました")
+
+async def run_reevaluation(start_date: date, end_date: date):
+    """アーカイブ済みのメッセージだけで期間を再判定し、結果を書き込む(Discordには接続しない)"""
+    target_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    logging.info(f"再判定期間: {start_date.strftime('%Y/%m/%d')} 〜 {end_date.strftime('%Y/%m/%d')} ({len(target_dates)}日間)")
+    logging.info("※ アーカイブの同期済み範囲に含まれない日は書き込みません")
+
+    archive = MessageArchive(MESSAGE_ARCHIVE_PATH)
+    try:
+        reevaluator = ArchiveReevaluator(archive, USER_COLUMNS.keys(), max_workers=REEVALUATION_WORKERS,
+                                         chunk_size=REEVALUATION_CHUNK_SIZE)
+        planner = WindowPlanner()
+        channel_results = {
+            channel_id: reevaluator.evaluate(channel_id, planner.plan(target_dates, config['date_offset']))
+            for channel_id, config in CHANNEL_CONFIGS.items()
+        }
+    finally:
+        archive.close()
+
+    # 報告・宣言のどちらかのチャンネルで再判定できなかった日は書き込まない
+    covered_dates = [target_date for target_date in target_dates
+                     if all(target_date in results for results in channel_results.values())]
+    skipped_dates = [target_date for target_date in target_dates if target_date not in covered_dates]
+    if skipped_dates:
+        logging.warning(f"⚠️ アーカイブの同期済み範囲外のため{len(skipped_dates)}日をスキップしました: "
+                        f"{', '.join(d.strftime('%Y/%m/%d') for d in skipped_dates)}")
+    if not covered_dates:
+        logging.error("❌ 再判定できる日がありません(通常の実行でアーカイブを同期してください)")
+        return
+
+    updates = [
+        (
+            datetime.combine(target_date, datetime.min.time()),
+            user_id,
+            channel_results[REPORT_CHANNEL_ID][target_date][user_id],
+            channel_results[DECLARATION_CHANNEL_ID][target_date][user_id]
+        )
+        for target_date in covered_dates
+        for user_id in USER_COLUMNS
+    ]
+    logging.info(f"再判定結果を書き込み中... ({len(updates)}件)")
+    outbox = ResultOutbox(OUTBOX_PATH) if OUTBOX_ENABLED else None
+    outbox_ids = outbox.append(updates) if outbox is not None else []
+    result_sink = create_result_sink(RESULT_SINKS, RESULT_DB_PATH)
+    try:
+        await result_sink.write_check_results(updates)
+        if outbox is not None:
+            outbox.acknowledge(outbox_ids)
+    finally:
+        await result_sink.close()
+    logging.info("✓ 再判定が完了しました")
+
+async def run_replay():
+    """送信待ちの結果を書き込み先(Google Sheetsなど)にまとめて再送する(Discordには接続しない)"""
+    outbox = ResultOutbox(OUTBOX_PATH)
+    outbox_ids, updates = outbox.pending()
+    if not updates:
+        logging.info("再送する結果はありません")
+        return
+
+    logging.info(f"送信待ちの結果を再送中... ({len(updates)}件)")
+    result_sink = create_result_sink(RESULT_SINKS, RESULT_DB_PATH)
+    try:
+        await result_sink.write_check_results(updates)
+        outbox.acknowledge(outbox_ids)
+        logging.info("✓ 再送が完了しました")
+    except Exception as e:
+        logging.error(f"❌ 再送に失敗しました(結果は送信待ちのまま残ります): {str(e)}")
+    finally:
+        await result_sink.close()
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,23 +1,60 @@
 import discord
 from discord.ext import commands
-from discord.ext import tasks
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import asyncio
 import logging
-import pytz
-from typing import Optional, List, Tuple, Dict
+import time
+from typing import Optional, List, Dict
 
 from config.config import (
-    USER_COLUMNS,
+    ROSTER,
     REPORT_CHANNEL_ID,
     DECLARATION_CHANNEL_ID,
-    MESSAGE_HISTORY_LIMIT
+    CHANNEL_SCAN_CONCURRENCY,
+    THREAD_CRAWL_CONCURRENCY,
+    MESSAGE_ARCHIVE_ENABLED,
+    MESSAGE_ARCHIVE_PATH,
+    MESSAGE_ARCHIVE_RESYNC_SECONDS,
+    USER_NAME_CACHE_PATH,
+    USER_NAME_CACHE_TTL,
+    DATE_MEMO_SIZE,
+    DATE_MEMO_PERSIST,
+    DATE_MEMO_PATH,
+    OUTBOX_ENABLED,
+    OUTBOX_PATH,
+    RESULT_SINKS,
+    RESULT_DB_PATH
 )
-from src.message_checker import MessageChecker
-from src.sheets_handler import SheetsHandler
+from src.message_checker import EXTRACTION_FINGERPRINT
+from src.channel_scanner import ChannelScanner, MessageMatches
+from src.date_memo import DateMemo
+from src.message_archive import MessageArchive
+from src.name_cache import UserNameCache
+from src.outbox import ResultOutbox
+from src.result_sink import ResultSink, SheetWriteBuffer, create_result_sink
+from src.window_planner import WindowPlanner
+
+# チャンネル固有の設定(date_offset: 対象日から検索開始日までの日数)
+CHANNEL_CONFIGS = {
+    REPORT_CHANNEL_ID: {
+        'type': "日報",
+        'date_offset': 0,  # 当日
+        'description': "日報チャンネル"
+    },
+    DECLARATION_CHANNEL_ID: {
+        'type': "宣言",
+        'date_offset': -1,  # 前日
+        'description': "宣言チャンネル"
+    }
+}
+
 
 class ReportBot(commands.Bot):
-    def __init__(self, target_date=None, batch_size=5):
+    def __init__(self, target_date=None, scan_concurrency=CHANNEL_SCAN_CONCURRENCY, end_date=None,
+                 started_at: Optional[float] = None):
+        # 起動時間の計測開始時刻(time.perf_counter()の値。省略時はBotの作成時)
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.startup_seconds: Optional[float] = None
         intents = discord.Intents.default()
         intents.message_content = True
         intents.messages = True
@@ -25,14 +62,57 @@ class ReportBot(commands.Bot):
         
         # 指定された日付、または現在の日付を使用
         self.target_date = target_date.date() if isinstance(target_date, datetime) else target_date or datetime.now().date()
-        logging.info(f"チェック対象日: {self.target_date.strftime('%Y/%m/%d')}")
+        # end_dateを指定した場合はtarget_dateからend_dateまでの複数日をまとめてチェック(バックフィル)
+        end_date = end_date.date() if isinstance(end_date, datetime) else end_date or self.target_date
+        self.target_dates = [self.target_date + timedelta(days=i)
+                             for i in range((end_date - self.target_date).days + 1)]
+        if len(self.target_dates) == 1:
+            logging.info(f"チェック対象日: {self.target_date.strftime('%Y/%m/%d')}")
+        else:
+            logging.info(f"チェック対象期間: {self.target_date.strftime('%Y/%m/%d')} 〜 {end_date.strftime('%Y/%m/%d')} "
+                         f"({len(self.target_dates)}日間)")
         
-        self.message_checker = MessageChecker(target_date=self.target_date, batch_size=batch_size)
-        self.sheets_handler = SheetsHandler()
-        self.batch_size = batch_size
+        # 書き込みが必要になるまで書き込み先(Sheetsの認証情報の読み込みなど)を作成しない
+        self._result_sink: Optional[ResultSink] = None
+        self._write_buffer: Optional[SheetWriteBuffer] = None
+        # 書き込みに失敗しても結果を失わないように、計算した結果を先に記録する
+        self.outbox = ResultOutbox(OUTBOX_PATH) if OUTBOX_ENABLED else None
+        self.message_archive = MessageArchive(MESSAGE_ARCHIVE_PATH, MESSAGE_ARCHIVE_RESYNC_SECONDS) if MESSAGE_ARCHIVE_ENABLED else None
+        self.user_name_cache = UserNameCache(USER_NAME_CACHE_PATH, USER_NAME_CACHE_TTL)
+        self.date_memo = DateMemo(DATE_MEMO_SIZE, DATE_MEMO_PATH if DATE_MEMO_PERSIST else None,
+                                  EXTRACTION_FINGERPRINT)
+        # ユーザー設定(作成者IDの整数をキーにした対応表)
+        self.roster = ROSTER
+        self.channel_scanner = ChannelScanner(self.roster.user_ids, archive=self.message_archive,
+                                              thread_concurrency=THREAD_CRAWL_CONCURRENCY,
+                                              date_memo=self.date_memo)
+        self.scan_concurrency = scan_concurrency
+        # 走査対象のチャンネル(チャンネルを追加する場合はここに追記)
+        self.target_channel_ids = [REPORT_CHANNEL_ID, DECLARATION_CHANNEL_ID]
+
+    @property
+    def result_sink(self) -> ResultSink:
+        """判定結果の書き込み先(RESULT_SINKSで設定)"""
+        if self._result_sink is None:
+            self._result_sink = create_result_sink(RESULT_SINKS, RESULT_DB_PATH)
+        return self._result_sink
+
+    @property
+    def write_buffer(self) -> SheetWriteBuffer:
+        """実行中の結果をためておき、最後に1回だけ書き込むバッファ"""
+        if self._write_buffer is None:
+            self._write_buffer = SheetWriteBuffer(self.result_sink, self.outbox)
+        return self._write_buffer
+
+    def _log_startup_time(self):
+        """起動からDiscordへの接続完了までの時間を記録する(再接続時は記録しない)"""
+        if self.startup_seconds is None:
+            self.startup_seconds = time.perf_counter() - self.started_at
+            logging.info(f"起動時間: {self.startup_seconds:.2f}秒 (接続完了まで)")
 
     async def on_ready(self):
         logging.info("✓ Discordサーバーへの接続が完了しました")
+        self._log_startup_time()
         logging.info(f"Bot名: {self.user.name}")
         logging.info(f"Bot ID: {self.user.id}")
         
@@ -41,333 +121,165 @@ class ReportBot(commands.Bot):
 
     async def close(self):
         logging.info("✓ プログラムを終了します")
+        if self.message_archive:
+            self.message_archive.close()
+            self.message_archive = None
+        if self.date_memo:
+            stats = self.date_memo.stats()
+            logging.info(f"日付抽出メモ: ヒット {stats['hits']}件 / ミス {stats['misses']}件 (記録数: {stats['entries']}件)")
+            self.date_memo.close()
+            self.date_memo = None
+        if self._result_sink:
+            await self._result_sink.close()
+            self._result_sink = None
         await super().close()
 
-    def _create_user_batches(self) -> List[List[str]]:
-        """ユーザーIDをバッチに分割する"""
-        user_ids = list(USER_COLUMNS.keys())
-        batches = []
-        for i in range(0, len(user_ids), self.batch_size):
-            batch = user_ids[i:i + self.batch_size]
-            batches.append(batch)
-        return batches
-
-    async def _fetch_user_names(self, user_ids: List[str]) -> Dict[str, str]:
-        """指定されたユーザーIDのユーザー名をフェッチする"""
-        user_names = {}
-        for user_id in user_ids:
-            try:
-                user = await self.fetch_user(int(user_id))
-                user_names[user_id] = user.name
-            except:
-                user_names[user_id] = user_id
-        return user_names
+    async def _fetch_user_names(self, user_ids: List[str], guild) -> Dict[str, str]:
+        """
+        指定されたユーザーIDのユーザー名を取得する
+
+        ディスクキャッシュ → サーバーのメンバーキャッシュ → メンバー一括取得(100人ずつ)の順に解決し、
+        解決できなかったユーザーはIDをそのまま名前として使う
+        """
+        user_names = self.user_name_cache.get_many(user_ids)
+        cached_count = len(user_names)
+        resolved = {}
+
+        missing = [user_id for user_id in user_ids if user_id not in user_names]
+        for user_id in missing:
+            member = guild.get_member(int(user_id)) if guild else None
+            if member:
+                resolved[user_id] = member.name
+
+        missing = [user_id for user_id in missing if user_id not in resolved]
+        if guild and missing:
+            for i in range(0, len(missing), 100):
+                chunk = missing[i:i + 100]
+                try:
+                    members = await guild.query_members(user_ids=[int(user_id) for user_id in chunk], limit=100, cache=False)
+                except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException) as e:
+                    logging.warning(f"ユーザー名の一括取得に失敗しました: {type(e).__name__}: {str(e)}")
+                    break
+                for member in members:
+                    resolved[str(member.id)] = member.name
+
+        if resolved:
+            self.user_name_cache.update(resolved)
+            self.user_name_cache.save()
+        user_names.update(resolved)
+        logging.info(f"ユーザー名を解決: キャッシュ {cached_count}人, 取得 {len(resolved)}人, "
+                     f"未解決 {len(user_ids) - len(user_names)}人")
+        return {user_id: user_names.get(user_id, user_id) for user_id in user_ids}
 
     async def _check_all_channels(self):
         logging.info("=== 日次チェック開始 ===")
-        check_time = datetime.combine(self.target_date, datetime.min.time())
         logging.info(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        logging.info(f"チェック対象日: {self.target_date.strftime('%Y/%m/%d')}")
+        logging.info(f"チェック対象日: {', '.join(d.strftime('%Y/%m/%d') for d in self.target_dates)}")
 
-        report_channel = self.get_channel(REPORT_CHANNEL_ID)
-        declaration_channel = self.get_channel(DECLARATION_CHANNEL_ID)
+        channels = [self.get_channel(channel_id) for channel_id in self.target_channel_ids]
 
-        if not report_channel or not declaration_channel:
+        if not all(channels):
             logging.error("エラー: チャンネルが見つかりません")
             return
 
         logging.info("チェック対象チャンネル:")
-        logging.info(f"- 報告チャンネル: {report_channel.name}")
-        logging.info(f"- 宣言チャンネル: {declaration_channel.name}")
+        for channel in channels:
+            logging.info(f"- {self._get_channel_config(channel)['description']}: {channel.name}")
 
-        # ユーザーをバッチに分割
-        batches = self._create_user_batches()
-        logging.info(f"全{len(USER_COLUMNS)}人のユーザーを{len(batches)}バッチに分割して処理します")
-        logging.info(f"バッチサイズ: {self.batch_size}人")
-
-        all_updates = []
         total_start_time = datetime.now()
 
-        for batch_num, user_batch in enumerate(batches, 1):
-            batch_start_time = datetime.now()
-            logging.info(f"=== バッチ {batch_num}/{len(batches)} の処理開始 ===")
-            
-            # バッチ内のユーザー名をフェッチ
-            user_names = await self._fetch_user_names(user_batch)
-            
-            # バッチ内の各ユーザーをチェック
-            batch_updates = []
-            for user_id in user_batch:
+        # 各チャンネルの履歴を1回だけ走査し、全ユーザー分の結果をまとめて取得
+        channel_results = await self._scan_channels(channels)
+        report_results = channel_results[REPORT_CHANNEL_ID]
+        declaration_results = channel_results[DECLARATION_CHANNEL_ID]
+        scan_time = (datetime.now() - total_start_time).total_seconds()
+        logging.info(f"✓ 全チャンネルの走査完了 (走査時間: {scan_time:.2f}秒)")
+
+        # 全ユーザーの名前を最初にまとめて解決する
+        user_names = await self._fetch_user_names(self.roster.user_ids, channels[0].guild)
+
+        # 全対象日・全ユーザーの結果を集計する
+        all_updates = []
+        for target_date in self.target_dates:
+            check_time = datetime.combine(target_date, datetime.min.time())
+            for user_id in self.roster.user_ids:
                 user_name = user_names.get(user_id, user_id)
-                config_name = USER_COLUMNS.get(user_id, {}).get("name", "N/A")
-                logging.info("========================================")
-                logging.info(f"🧑 ユーザー処理開始: {user_name} (ID: {user_id}) - 名前: {config_name}")
-                
-                logging.info("📌 報告チャンネルをチェック中...")
-                report_status = await self._check_channel(report_channel, user_id)
-                logging.info(f"📝 報告状態: {'○' if report_status else '×'}")
-                
-                logging.info("📌 宣言チャンネルをチェック中...")
-                declaration_status = await self._check_channel(declaration_channel, user_id)
-                logging.info(f"📝 宣言状態: {'○' if declaration_status else '×'}")
-                
-                logging.info(f"✅ ユーザー処理完了: {user_name}")
-                
-                # 結果をバッチリストに追加
-                batch_updates.append((check_time, user_id, report_status, declaration_status))
-            
-            # バッチの結果をGoogle Sheetsに書き込み
-            logging.info("Google Sheetsにバッチ結果を書き込み中...")
-            try:
-                await self.sheets_handler.write_check_results(batch_updates)
-                all_updates.extend(batch_updates)
-                
-                batch_end_time = datetime.now()
-                batch_processing_time = (batch_end_time - batch_start_time).total_seconds()
-                logging.info(f"✓ バッチ {batch_num} 完了 (処理時間: {batch_processing_time:.2f}秒)")
-            except Exception as e:
-                logging.error(f"× バッチ {batch_num} 書き込みエラー: {str(e)}")
+                entry = self.roster.find(user_id)
+                config_name = entry.name if entry else "N/A"
+                report_status = report_results[target_date].get(user_id, False)
+                declaration_status = declaration_results[target_date].get(user_id, False)
+                logging.info(f"🧑 {target_date.strftime('%Y/%m/%d')} {user_name} (ID: {user_id}) - 名前: {config_name} "
+                             f"報告: {'○' if report_status else '×'} / 宣言: {'○' if declaration_status else '×'}")
+                all_updates.append((check_time, user_id, report_status, declaration_status))
+        self.write_buffer.add(all_updates)
+
+        # 結果をまとめて書き込み先(Google Sheetsなど)に書き込み
+        logging.info(f"結果を書き込み中... ({len(self.write_buffer)}件)")
+        try:
+            request_count = await self.write_buffer.flush()
+            logging.info(f"✓ 書き込み完了 (リクエスト数: {request_count})")
+        except Exception as e:
+            logging.error(f"× 書き込みエラー: {str(e)}")
+            if self.outbox is not None:
+                logging.warning(f"送信待ちの結果 {len(self.outbox)}件を保存しました。"
+                                f"python run.py --replay で再送できます")
 
         total_end_time = datetime.now()
         total_processing_time = (total_end_time - total_start_time).total_seconds()
-        logging.info(f"全バッチ処理完了 (総処理時間: {total_processing_time:.2f}秒)")
-        logging.info(f"処理したユーザー数: {len(all_updates)}")
+        logging.info(f"集計・書き込み完了 (総処理時間: {total_processing_time:.2f}秒)")
+        logging.info(f"処理した結果数: {len(all_updates)} ({len(self.target_dates)}日 × {len(self.roster)}人)")
 
         logging.info("=== 日次チェック完了 ===")
         # チェック完了後にBotを終了
         await self.close()
 
-    def _get_channel_config(self, channel) -> tuple:
+    def _get_channel_config(self, channel) -> dict:
         """チャンネル固有の設定を取得"""
-        if channel.id == REPORT_CHANNEL_ID:
-            return {
-                'type': "日報",
-                'date_offset': 0,  # 当日
-                'description': "日報チャンネル"
-            }
-        elif channel.id == DECLARATION_CHANNEL_ID:
-            return {
-                'type': "宣言",
-                'date_offset': -1,  # 前日
-                'description': "宣言チャンネル"
-            }
-        else:
-            logging.warning(f"未定義チャンネル {channel.name}")
-            return {
-                'type': "未定義",
-                'date_offset': 0,
-                'description': f"未定義チャンネル: {channel.name}"
-            }
-
-    def _get_search_range(self, base_date: datetime, time_info: dict) -> tuple:
-        """検索範囲を計算"""
-        jst = time_info['jst']
-        now = time_info['now']
-        
-        # 検索開始日時（指定日の0:00 JST）
-        search_start_jst = jst.localize(datetime.combine(base_date, datetime.min.time()))
-        
-        # 検索終了日時（指定日の2日後の0:00 JSTまたは現在時刻）
-        two_days_later = base_date + timedelta(days=2)
-        end_date_jst = jst.localize(datetime.combine(two_days_later, datetime.min.time()))
-        search_end_jst = min(now, end_date_jst)
-        
-        # UTC変換
-        search_start_utc = search_start_jst.astimezone(pytz.utc)
-        search_end_utc = search_end_jst.astimezone(pytz.utc)
-        
-        # 検索範囲の情報をログ出力
-        logging.info(f"\n検索範囲:")
-        logging.info(f"  開始: {search_start_jst.strftime('%Y/%m/%d %H:%M:%S')} JST")
-        logging.info(f"  終了: {search_end_jst.strftime('%Y/%m/%d %H:%M:%S')} JST")
-        if search_end_jst == now:
-            logging.info("  ※ 現在時刻までを検索範囲としています")
-        else:
-            logging.info("  ※ 指定日の2日後の0:00までを検索範囲としています")
-        
-        return search_start_jst, search_end_jst, search_start_utc, search_end_utc
+        if channel.id in CHANNEL_CONFIGS:
+            return CHANNEL_CONFIGS[channel.id]
+        logging.warning(f"未定義チャンネル {channel.name}")
+        return {
+            'type': "未定義",
+            'date_offset': 0,
+            'description': f"未定義チャンネル: {channel.name}"
+        }
 
-    async def _check_channel(self, channel, user_id) -> bool:
-        if not channel:
-            error_msg = f"Channel not found for user {user_id}"
-            logging.error(f"エラー: {error_msg}")
-            return False
+    async def _scan_channels(self, channels: List,
+                             matches: Optional[Dict[int, MessageMatches]] = None) -> Dict[int, Dict[date, Dict[str, bool]]]:
+        """
+        複数チャンネルを同時実行数の上限付きで並行して走査する
 
-        try:
-            def _init_time_info(target_date: datetime) -> dict:
-                """時刻関連の情報を初期化"""
-                jst = pytz.timezone('Asia/Tokyo')
-                now = datetime.now(jst)
-                
-                return {
-                    'jst': jst,
-                    'now': now,
-                    'target_date': target_date
-                }
-
-            # チャンネル設定を取得
-            config = self._get_channel_config(channel)
-            channel_type = config['type']
-            
-            # 検索対象日を計算
-            target_date = self.target_date + timedelta(days=config['date_offset'])
-            
-            # 時刻関連の情報を初期化
-            time_info = _init_time_info(target_date)
-            jst = time_info['jst']
-            now = time_info['now']
-            
-            logging.info(f"\n=== {config['description']}の検索開始 ===")
-            logging.info(f"チャンネル名: {channel.name}")
-            logging.info(f"ユーザーID: {user_id}")
-            logging.info(f"対象日: {target_date.strftime('%Y/%m/%d')}")
-
-            # 検索範囲を取得（ログ出力も_get_search_range内で行う）
-            search_start_jst, search_end_jst, search_start_utc, search_end_utc = self._get_search_range(target_date, time_info)
-            
-            # 時刻情報を含む状態を初期化
-            state = {
-                'message_count': 0,
-                'user_message_count': 0,
-                'thread_message_count': 0,
-                'matched_messages': [],
-                'last_message_time': None,
-                'stats': {
-                    'main_channel': 0,
-                    'thread': 0,
-                    'user_main': 0,
-                    'user_thread': 0
-                },
-                'time_info': time_info  # 時刻関連の情報を状態に含める
-            }
-            
-            logging.info("\nメッセージ検索開始...")
-            logging.info("メッセージ一覧:")
-
-            # 進捗報告用の設定
-            progress_interval = 10  # 10件ごとに進捗を報告
-            logging.info("\nメッセージ取得設定:")
-            logging.info("- 取得順序: 古い順")
-            logging.info("- 開始日時: " + search_start_utc.strftime('%Y/%m/%d %H:%M:%S UTC'))
-            logging.info("- 終了日時: " + search_end_utc.strftime('%Y/%m/%d %H:%M:%S UTC'))
-            
-            def _update_stats(state: dict, message: discord.Message, user_id: str):
-                """統計情報を更新"""
-                if message.thread:
-                    state['stats']['thread'] += 1
-                    if str(message.author.id) == user_id:
-                        state['stats']['user_thread'] += 1
-                else:
-                    state['stats']['main_channel'] += 1
-                    if str(message.author.id) == user_id:
-                        state['stats']['user_main'] += 1
-
-            def _log_message_info(message: discord.Message, count: int, thread_info: str, jst: pytz.timezone):
-                """メッセージの基本情報をログ出力"""
-                created_at_jst = message.created_at.astimezone(jst)
-                logging.info(f"\n=== メッセージ #{count} {thread_info} ===")
-                logging.info(f"作成日時 (UTC): {message.created_at.strftime('%Y/%m/%d %H:%M:%S')}")
-                logging.info(f"作成日時 (JST): {created_at_jst.strftime('%Y/%m/%d %H:%M:%S')}")
-                logging.info(f"作成者: {message.author.name} (ID: {message.author.id})")
-                logging.info(f"内容の先頭行: {message.content.split('\n')[0][:100]}")
-                if message.thread:
-                    logging.info(f"スレッド名: {message.thread.name}")
-                    logging.info(f"スレッドID: {message.thread.id}")
-
-            async for message in channel.history(
-                after=search_start_utc,
-                before=search_end_utc,
-                limit=None,
-                oldest_first=True  # 古いメッセージから順に取得
-            ):
-                state['message_count'] += 1
-                
-                # スレッド内のメッセージの記録
-                thread_info = "（スレッド内）" if message.thread else "（メインチャンネル）"
-                
-                # 進捗報告
-                if state['message_count'] % progress_interval == 0:
-                    logging.info(f"\n進捗状況: {state['message_count']}件目を処理中...")
-                    if state['last_message_time']:
-                        logging.info(f"現在の処理位置: {state['last_message_time'].astimezone(jst).strftime('%Y/%m/%d %H:%M:%S JST')}")
-
-                # メッセージの基本情報を出力
-                _log_message_info(message, state['message_count'], thread_info, jst)
-                
-                # 最後のメッセージ時刻を更新
-                state['last_message_time'] = message.created_at
-                
-                # 対象ユーザーのメッセージのみを処理
-                logging.info("ユーザーチェック:")
-                logging.info(f"- メッセージの author.id: {message.author.id} ({type(message.author.id)})")
-                logging.info(f"- 比較対象の user_id: {user_id} ({type(user_id)})")
-                if str(message.author.id) == user_id:
-                    state['user_message_count'] += 1
-                    logging.info(f"✓ ユーザーIDが一致")
-                    logging.info(f"\n=== ユーザーメッセージ #{state['user_message_count']} ===")
-                    logging.info(f"投稿日時 (UTC): {message.created_at.strftime('%Y/%m/%d %H:%M:%S')}")
-                    logging.info(f"投稿日時 (JST): {message.created_at.astimezone(jst).strftime('%Y/%m/%d %H:%M:%S')}")
-                    
-                    lines = message.content.splitlines()
-                    logging.info("メッセージ内容:")
-                    for i, line in enumerate(lines[:10], 1):
-                        logging.info(f"    [{i}行目] {line}")
-                    if len(lines) > 10:
-                        logging.info("    （※ 11行目以降は省略）")
-                    
-                    logging.info("\n日付チェック開始...")
-                    if self.message_checker.has_valid_date(message.content):
-                        logging.info("✓ 対象日の日付を含むメッセージを発見")
-                        state['matched_messages'].append(message)
-                        return True
-                    else:
-                        logging.info("× このメッセージは対象日の日付を含んでいません")
-
-                # 統計情報を更新
-                _update_stats(state, message, user_id)
-
-            def _log_search_summary(state: dict, channel_type: str, jst: pytz.timezone,
-                                search_start_utc: datetime, search_end_utc: datetime,
-                                last_message: discord.Message, now: datetime) -> None:
-                """検索結果のサマリーを出力"""
-                logging.info(f"\n検索結果サマリー:")
-                logging.info(f"- 総メッセージ数: {state['message_count']}件")
-                logging.info(f"  * メインチャンネル: {state['stats']['main_channel']}件")
-                logging.info(f"  * スレッド内: {state['stats']['thread']}件")
-                logging.info(f"- ユーザーのメッセージ数: {state['user_message_count']}件")
-                logging.info(f"  * メインチャンネル: {state['stats']['user_main']}件")
-                logging.info(f"  * スレッド内: {state['stats']['user_thread']}件")
-                logging.info(f"- 日付マッチ数: {len(state['matched_messages'])}件")
-                
-                if state['last_message_time']:
-                    first_message_time = state['last_message_time']  # 最後に保存された時刻が最古のメッセージ（oldest_first=Trueのため）
-                    logging.info("\n取得されたメッセージの時間範囲:")
-                    logging.info(f"- 最古のメッセージ: {first_message_time.astimezone(jst).strftime('%Y/%m/%d %H:%M:%S JST')}")
-                    logging.info(f"- 最新のメッセージ: {last_message.created_at.astimezone(jst).strftime('%Y/%m/%d %H:%M:%S JST')}")
-                    
-                    # 検索範囲の検証
-                    _validate_search_range(first_message_time, last_message.created_at,
-                                      search_start_utc, search_end_utc)
-                
-                if not state['matched_messages']:
-                    logging.warning(f"- 対象日の日付を含むメッセージが見つかりませんでした")
-                
-                logging.info(f"=== {channel_type}チャンネルの検索終了 ===\n")
-
-            def _validate_search_range(first_time: datetime, last_time: datetime,
-                                  start_utc: datetime, end_utc: datetime) -> None:
-                """検索範囲の妥当性を検証"""
-                if first_time > start_utc:
-                    logging.warning("! 注意: 検索開始日時までのメッセージが取得できていない可能性があります")
-                if last_time < end_utc:
-                    logging.warning("! 注意: 検索終了日時までのメッセージが取得できていない可能性があります")
-
-            # 検索結果のサマリーを出力
-            _log_search_summary(state, channel_type, jst, search_start_utc, search_end_utc, message, now)
-            return False
-
-        except (discord.errors.Forbidden, discord.errors.HTTPException, Exception) as e:
-            error_type = type(e).__name__
-            error_msg = f"{error_type} in {channel.name}: {str(e)}"
-            logging.error(f"エラー: {error_msg}")
-            return False
\ No newline at end of file
+        Args:
+            channels: 走査対象のチャンネルのリスト
+            matches: 指定した場合はチャンネルIDごとに○の根拠となったメッセージIDを追加する
+
+        Returns:
+            チャンネルIDをキーとした、対象日・ユーザーごとの判定結果
+        """
+        semaphore = asyncio.Semaphore(self.scan_concurrency)
+        # 検索範囲は実行ごとに1回だけ計算する
+        planner = WindowPlanner()
+
+        async def bounded_scan(channel):
+            async with semaphore:
+                channel_matches = matches.setdefault(channel.id, {}) if matches is not None else None
+                return await self._scan_channel(channel, planner, channel_matches)
+
+        logging.info(f"📌 {len(channels)}チャンネルを並行して走査中... (同時実行数: {self.scan_concurrency})")
+        results = await asyncio.gather(*[bounded_scan(channel) for channel in channels])
+        return {channel.id: result for channel, result in zip(channels, results)}
+
+    async def _scan_channel(self, channel, planner: WindowPlanner,
+                            matches: Optional[MessageMatches] = None) -> Dict[date, Dict[str, bool]]:
+        """チャンネルを1回だけ走査し、全対象日・全ユーザーの判定結果を返す"""
+        # チャンネル設定を取得
+        config = self._get_channel_config(channel)
+
+        logging.info(f"=== {config['description']}の検索開始: {channel.name} ===")
+
+        # 対象日ごとの検索範囲(検索開始日 = 対象日 + チャンネルの日付オフセット)
+        windows = planner.plan(self.target_dates, config['date_offset'])
+
+        results = await self.channel_scanner.scan(channel, windows, matches)
+        logging.info(f"=== {config['type']}チャンネルの検索終了 ===\n")
+        return results
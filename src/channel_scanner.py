@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import math
+from contextlib import aclosing
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import discord
+import pytz
+
+from src.message_archive import HISTORY_PAGE_SIZE, MessageArchive, MessageRecord
+from src.date_memo import DateMemo
+from src.message_checker import MessageChecker
+from src.window_planner import SearchWindow
+
+
+# 対象日 → 検索範囲
+SearchWindows = Dict[date, SearchWindow]
+# (対象日, ユーザーID) → ○の根拠となったメッセージID
+MessageMatches = Dict[Tuple[date, str], Set[int]]
+
+
+class ChannelScanner:
+    """チャンネル履歴を1回だけ走査し、ロスター全員・全対象日の投稿状況をまとめて判定する"""
+
+    def __init__(self, user_ids: Iterable[str], archive: Optional[MessageArchive] = None,
+                 progress_interval: int = 100, thread_concurrency: int = 4,
+                 date_memo: Optional[DateMemo] = None):
+        self.user_ids = list(user_ids)
+        self.archive = archive
+        self.progress_interval = progress_interval
+        # スレッド履歴を同時に取得する数の上限
+        self.thread_concurrency = thread_concurrency
+        # 日付の抽出結果を本文のハッシュごとに再利用するメモ
+        self.date_memo = date_memo
+
+    async def scan(self, channel, windows: SearchWindows,
+                   matches: Optional[MessageMatches] = None) -> Dict[date, Dict[str, bool]]:
+        """
+        全対象日の検索範囲をまとめた範囲の履歴を1回だけ取得し、(対象日, ユーザー)ごとの判定結果を返す
+
+        各メッセージは投稿日時が検索範囲に含まれる対象日についてのみ判定する。
+        スレッド内の返信も同じ判定にかけ、全員・全対象日の○が確定した時点で履歴の取得を打ち切る
+
+        Args:
+            channel: 走査対象のチャンネル
+            windows: 対象日をキーとした検索範囲(WindowPlannerで作成)
+            matches: 指定した場合は○の根拠となったメッセージIDをすべて追加する
+                (編集・削除で×に戻せるように、○が確定した後も検索範囲の最後まで判定する)
+
+        Returns:
+            対象日ごとの、ユーザーIDをキーとした判定結果(True: ○, False: ×)
+        """
+        jst = pytz.timezone('Asia/Tokyo')
+        # author.id(int) → ユーザーID(str)の対応表
+        roster = {int(user_id): user_id for user_id in self.user_ids}
+        results = {target_date: {user_id: False for user_id in self.user_ids} for target_date in windows}
+        # 検索範囲が空でない対象日のみ走査する
+        windows = {target_date: window for target_date, window in windows.items() if not window.is_empty}
+        if not windows:
+            logging.info(f"{channel.name}: 検索範囲がないため走査をスキップします")
+            return results
+        combined = self._combine(windows)
+        search_start_utc, search_end_utc = combined.start_utc, combined.end_utc
+        # まだ○が確定していない(作成者ID, 対象日)(空になった時点で走査を打ち切る)
+        unresolved = {(author_id, target_date) for author_id in roster for target_date in windows}
+        # 検索範囲の終了をまだ過ぎていない対象日
+        open_dates = set(windows)
+        # 作成者IDごとのメッセージ数
+        author_counts: Dict[int, int] = {}
+        state = {
+            'message_count': 0,
+            'checked_count': 0,
+            'prefiltered_count': 0,
+            'regex_count': 0,
+            'first_message_time': None,
+            'last_message_time': None,
+            'stopped_early': False,
+            'saved_pages': 0
+        }
+        # スレッド内メッセージの統計
+        thread_state = dict(state, thread_count=0)
+        # API取得の統計(_iter_messagesが書き込む)
+        fetch_stats: Dict[str, Any] = {}
+
+        logging.info(f"=== {channel.name} の一括走査開始 "
+                     f"({search_start_utc.strftime('%Y/%m/%d %H:%M')} 〜 {search_end_utc.strftime('%Y/%m/%d %H:%M')} UTC, "
+                     f"{len(roster)}人, {len(windows)}日) ===")
+
+        try:
+            # スレッドを先に判定する(メインチャンネルの走査中に検索範囲を過ぎた対象日を判定対象から外せるように)
+            threads = await self._discover_threads(channel, combined)
+            thread_state['thread_count'] = len(threads)
+            await self._crawl_threads(threads, windows, roster, results, unresolved, author_counts, thread_state, jst,
+                                      matches)
+
+            if not unresolved:
+                # スレッドだけで全員の判定が確定した
+                state['stopped_early'] = True
+            else:
+                async with aclosing(self._iter_messages(channel, combined, fetch_stats)) as messages:
+                    async for message in messages:
+                        # 検索範囲を過ぎた対象日は以降のメッセージで○にならないため判定対象から外す
+                        for target_date in [d for d in open_dates if message.id >= windows[d].before_id]:
+                            open_dates.discard(target_date)
+                            unresolved.difference_update({(author_id, target_date) for author_id in roster})
+                        self._process_message(message, windows, roster, results, unresolved,
+                                              author_counts, state, jst, matches)
+                        if not unresolved:
+                            # 全員の判定が確定したので以降のページは取得しない
+                            state['stopped_early'] = True
+                            break
+
+        except Exception as e:
+            error_type = type(e).__name__
+            logging.error(f"エラー: {error_type} in {channel.name}: {str(e)}")
+
+        if state['stopped_early'] and not fetch_stats.get('exhausted', True):
+            state['saved_pages'] = self._estimate_saved_pages(fetch_stats, state['last_message_time'], search_end_utc)
+
+        self._log_scan_summary(channel, state, thread_state, fetch_stats, author_counts, results, jst)
+        return results
+
+    @staticmethod
+    def _combine(windows: SearchWindows) -> SearchWindow:
+        """全対象日の検索範囲をまとめた範囲"""
+        return SearchWindow(
+            start_utc=min(window.start_utc for window in windows.values()),
+            end_utc=max(window.end_utc for window in windows.values()),
+            after_id=min(window.after_id for window in windows.values()),
+            before_id=max(window.before_id for window in windows.values())
+        )
+
+    async def _discover_threads(self, channel, combined: SearchWindow) -> List:
+        """検索範囲内にメッセージがあり得るスレッド(アーカイブ済みを含む)を取得する"""
+        threads = {thread.id: thread for thread in getattr(channel, 'threads', [])}
+
+        if hasattr(channel, 'archived_threads'):
+            try:
+                # アーカイブ日時の新しい順に返るため、検索開始より前にアーカイブされたスレッドで打ち切る
+                async for thread in channel.archived_threads(limit=None):
+                    if thread.archive_timestamp and thread.archive_timestamp < combined.start_utc:
+                        break
+                    threads[thread.id] = thread
+            except Exception as e:
+                # 取得できなくてもメインチャンネルは走査する(アクティブなスレッドと取得済みの分だけを対象にする)
+                logging.error(f"エラー: {type(e).__name__} in {channel.name} のアーカイブ済みスレッド取得: {str(e)}")
+
+        targets = []
+        for thread in threads.values():
+            # 検索範囲の終了後に作成されたスレッドは対象外
+            if thread.id >= combined.before_id:
+                continue
+            # 最後のメッセージが検索開始より前のスレッドは対象外
+            if thread.last_message_id and thread.last_message_id <= combined.after_id:
+                continue
+            targets.append(thread)
+
+        logging.info(f"{channel.name}: 対象スレッド {len(targets)}件 (検出 {len(threads)}件)")
+        return targets
+
+    async def _crawl_threads(self, threads: List, windows: SearchWindows, roster: Dict[int, str],
+                             results: Dict[date, Dict[str, bool]], unresolved: Set[Tuple[int, date]],
+                             author_counts: Dict[int, int], state: dict, jst: pytz.timezone,
+                             matches: Optional[MessageMatches] = None) -> None:
+        """スレッドの履歴を同時実行数の上限付きで並行して取得し、メインチャンネルと同じ判定にかける"""
+        if not threads:
+            return
+        combined = self._combine(windows)
+        semaphore = asyncio.Semaphore(self.thread_concurrency)
+
+        async def crawl(thread):
+            async with semaphore:
+                # 全員の判定が確定していれば取得しない
+                if not unresolved:
+                    return
+                async with aclosing(self._iter_messages(thread, combined, {})) as messages:
+                    async for message in messages:
+                        self._process_message(message, windows, roster, results, unresolved,
+                                              author_counts, state, jst, matches)
+                        if not unresolved:
+                            break
+
+        crawl_results = await asyncio.gather(*[crawl(thread) for thread in threads], return_exceptions=True)
+        for thread, result in zip(threads, crawl_results):
+            if isinstance(result, Exception):
+                logging.error(f"エラー: {type(result).__name__} in スレッド {thread.name}: {str(result)}")
+
+    def _process_message(self, message: MessageRecord, windows: SearchWindows, roster: Dict[int, str],
+                         results: Dict[date, Dict[str, bool]], unresolved: Set[Tuple[int, date]],
+                         author_counts: Dict[int, int], state: dict, jst: pytz.timezone,
+                         matches: Optional[MessageMatches] = None) -> None:
+        """1件のメッセージを判定し、結果と統計を更新する"""
+        state['message_count'] += 1
+        if state['first_message_time'] is None:
+            state['first_message_time'] = message.created_at
+        state['last_message_time'] = message.created_at
+
+        # DEBUGでなければ投稿日時のJST変換を省く
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+        # 進捗報告
+        if debug and state['message_count'] % self.progress_interval == 0:
+            logging.debug("進捗状況: %d件目を処理中... (%s)", state['message_count'], message.created_at.astimezone(jst))
+
+        # ロスター外のユーザーは対象外
+        author_id = message.author_id
+        user_id = roster.get(author_id)
+        if user_id is None:
+            return
+        author_counts[author_id] = author_counts.get(author_id, 0) + 1
+
+        # 投稿日時が検索範囲に含まれ、まだ○が確定していない対象日を候補として1回だけ判定する
+        candidate_dates = [
+            target_date for target_date, window in windows.items()
+            if window.contains(message.id) and (author_id, target_date) in unresolved
+        ]
+        if not candidate_dates:
+            return
+
+        state['checked_count'] += 1
+        if debug:
+            logging.debug("メッセージ #%d (ID: %d) - 候補日: %s 投稿日時 (JST): %s",
+                          state['message_count'], author_id, candidate_dates, message.created_at.astimezone(jst))
+        for target_date in MessageChecker.find_dates(message.content, candidate_dates, self.date_memo, state):
+            logging.debug("✓ %sの日付を含むメッセージを発見: %s", target_date, user_id)
+            results[target_date][user_id] = True
+            if matches is None:
+                unresolved.discard((author_id, target_date))
+            else:
+                # 根拠を集める場合は検索範囲を過ぎるまで判定を続ける
+                matches.setdefault((target_date, user_id), set()).add(message.id)
+
+    async def _iter_messages(self, channel, window: SearchWindow,
+                             fetch_stats: Dict[str, Any]) -> AsyncIterator[MessageRecord]:
+        """検索範囲のメッセージを古い順に返す(アーカイブがあれば差分だけをAPIから取得)"""
+        if self.archive is not None:
+            async with aclosing(self.archive.iter_channel(channel, window.start_utc, window.end_utc,
+                                                          fetch_stats)) as records:
+                async for record in records:
+                    yield record
+            return
+
+        fetch_stats.update({'api_messages': 0, 'api_pages': 0, 'api_after': window.start_utc, 'exhausted': False})
+        async for message in channel.history(
+            after=discord.Object(id=window.after_id),
+            before=discord.Object(id=window.before_id),
+            limit=None,
+            oldest_first=True  # 古いメッセージから順に取得
+        ):
+            fetch_stats['api_messages'] += 1
+            yield MessageRecord.from_message(message)
+        fetch_stats['exhausted'] = True
+        fetch_stats['api_pages'] = fetch_stats['api_messages'] // HISTORY_PAGE_SIZE + 1
+
+    @staticmethod
+    def _estimate_saved_pages(fetch_stats: Dict[str, Any], stop_time: datetime, search_end_utc: datetime) -> int:
+        """打ち切り時点までの取得ペースから、取得せずに済んだページ数を推定する"""
+        api_after = fetch_stats.get('api_after')
+        if api_after is None or stop_time is None:
+            return 0
+        fetched = fetch_stats['api_messages']
+        elapsed = (stop_time - api_after).total_seconds()
+        remaining = (search_end_utc - stop_time).total_seconds()
+        if remaining <= 0:
+            return 0
+        if fetched == 0 or elapsed <= 0:
+            # 取得ペースが分からない場合は少なくとも次の1ページ分
+            return 1
+        remaining_messages = fetched * remaining / elapsed
+        return max(1, math.ceil(remaining_messages / HISTORY_PAGE_SIZE))
+
+    def _log_scan_summary(self, channel, state: dict, thread_state: dict, fetch_stats: Dict[str, Any],
+                          author_counts: Dict[int, int], results: Dict[date, Dict[str, bool]],
+                          jst: pytz.timezone) -> None:
+        """走査結果のサマリーを出力(INFOはチャンネルごとに数行にまとめる)"""
+        logging.info(f"{channel.name} の走査結果: メッセージ {state['message_count']}件, "
+                     f"スレッド {thread_state['thread_count']}件 ({thread_state['message_count']}件), "
+                     f"対象ユーザーのメッセージ {sum(author_counts.values())}件 ({len(author_counts)}人), "
+                     f"日付チェック {state['checked_count'] + thread_state['checked_count']}件 "
+                     f"(数字なしで除外 {state['prefiltered_count'] + thread_state['prefiltered_count']}件, "
+                     f"正規表現で抽出 {state['regex_count'] + thread_state['regex_count']}件), "
+                     f"API取得 {fetch_stats.get('api_messages', 0)}件")
+        logging.info(f"{channel.name} の提出済みユーザー: " + ", ".join(
+            f"{target_date.strftime('%Y/%m/%d')} {sum(1 for status in date_results.values() if status)}/{len(date_results)}人"
+            for target_date, date_results in results.items()
+        ))
+        if state['stopped_early']:
+            logging.info(f"{channel.name}: 全員の判定が確定したため走査を打ち切り (削減ページ数(推定): {state['saved_pages']})")
+        if state['first_message_time']:
+            logging.debug("%s: 最古のメッセージ %s / 最新のメッセージ %s", channel.name,
+                          state['first_message_time'].astimezone(jst), state['last_message_time'].astimezone(jst))
+        logging.info(f"=== {channel.name} の一括走査終了 ===\n")
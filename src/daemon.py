@@ -0,0 +1,237 @@
+from discord.ext import tasks
+from discord.utils import time_snowflake
+from datetime import date, datetime, timedelta, timezone
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.config import (
+    REPORT_CHANNEL_ID,
+    DECLARATION_CHANNEL_ID,
+    DAEMON_FLUSH_INTERVAL,
+    DAEMON_FLUSH_DEBOUNCE_SECONDS,
+    DAEMON_FLUSH_MAX_DELAY_SECONDS
+)
+from src.bot import ReportBot
+from src.channel_scanner import MessageMatches
+from src.message_checker import MessageChecker
+from src.window_planner import JST, WindowPlanner
+
+
+class ReportDaemon(ReportBot):
+    """
+    接続を維持し、投稿・編集・削除のたびに判定を更新する常駐Bot
+
+    接続時(新しいセッションで再接続した場合を含む)に履歴を走査して状態表を作成し、以降はon_messageなどのイベントで
+    状態表を更新する。変更のあったセルだけをデバウンスしてGoogle Sheetsに書き込む
+    """
+
+    def __init__(self, started_at: Optional[float] = None):
+        super().__init__(target_date=self._today(), started_at=started_at)
+        self.target_dates = self._live_dates()
+        # (チャンネルID, 対象日, ユーザーID) → ○の根拠となるメッセージID
+        self._matches: Dict[Tuple[int, date, str], Set[int]] = {}
+        # 書き込み待ちの(対象日, ユーザーID)
+        self._dirty: Set[Tuple[date, str]] = set()
+        self._first_dirty_time: Optional[datetime] = None
+        self._last_change_time: Optional[datetime] = None
+        # 常駐モードでは検索範囲を現在時刻で打ち切らない(日付が変わっても範囲は変わらないため使い回す)
+        self._window_planner = WindowPlanner(cap_at_now=False)
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(JST).date()
+
+    def _live_dates(self) -> List[date]:
+        """
+        現在の投稿が影響し得る対象日(前日・当日・翌日)
+
+        日報は対象日から2日間、宣言は対象日の前日から2日間が検索範囲のため
+        """
+        today = self._today()
+        return [today - timedelta(days=1), today, today + timedelta(days=1)]
+
+    async def on_ready(self):
+        logging.info("✓ Discordサーバーへの接続が完了しました(常駐モード)")
+        self._log_startup_time()
+        logging.info(f"Bot名: {self.user.name}")
+
+        # on_readyは新しいセッションで接続したときに呼ばれる(セッションを再開した場合はon_resumed)。
+        # 切断中の投稿・編集・削除はイベントで届かないため、接続のたびに状態表を作り直す
+        await self._seed_status_table()
+        if not self.flush_loop.is_running():
+            self.flush_loop.start()
+
+    async def close(self):
+        if self.flush_loop.is_running():
+            self.flush_loop.cancel()
+        # 書き込み待ちのセルを書き込んでから終了
+        await self._flush()
+        await super().close()
+
+    async def _seed_status_table(self):
+        """履歴を走査し、○の根拠となるメッセージIDから状態表を作り直す"""
+        logging.info("=== 状態表の初期化開始 ===")
+        channels = [self.get_channel(channel_id) for channel_id in self.target_channel_ids]
+        if not all(channels):
+            logging.error("エラー: チャンネルが見つかりません")
+            return
+
+        scan_started_id = time_snowflake(datetime.now(timezone.utc))
+        channel_matches: Dict[int, MessageMatches] = {}
+        await self._scan_channels(channels, channel_matches)
+        matches = {
+            (channel_id, target_date, user_id): message_ids
+            for channel_id, date_matches in channel_matches.items()
+            for (target_date, user_id), message_ids in date_matches.items()
+        }
+        # 走査中にイベントで追加された(走査開始後に投稿された)メッセージは残す
+        for key, message_ids in self._matches.items():
+            live_ids = {message_id for message_id in message_ids if message_id >= scan_started_id}
+            if live_ids:
+                matches.setdefault(key, set()).update(live_ids)
+        self._matches = matches
+        for target_date in self.target_dates:
+            self._mark_dirty_date(target_date)
+        logging.info("=== 状態表の初期化完了 ===")
+
+    async def on_message(self, message):
+        self._evaluate(message.id, message.channel.id, message.author.id, message.content)
+
+    async def on_raw_message_edit(self, payload):
+        content = payload.data.get('content')
+        author = payload.data.get('author')
+        if content is None or author is None:
+            # 埋め込みの展開など本文が変わらない更新
+            return
+        self._evaluate(payload.message_id, payload.channel_id, int(author['id']), content)
+
+    async def on_raw_message_delete(self, payload):
+        for (channel_id, target_date, user_id), message_ids in self._matches.items():
+            if payload.message_id in message_ids:
+                message_ids.discard(payload.message_id)
+                if not message_ids:
+                    self._mark_dirty(target_date, user_id)
+
+    def _resolve_target_channel_id(self, channel_id: int) -> Optional[int]:
+        """チェック対象のチャンネルID(スレッドの場合は親チャンネルID)を返す"""
+        if channel_id in self.target_channel_ids:
+            return channel_id
+        channel = self.get_channel(channel_id)
+        parent_id = getattr(channel, 'parent_id', None)
+        return parent_id if parent_id in self.target_channel_ids else None
+
+    def _evaluate(self, message_id: int, channel_id: int, author_id: int, content: str) -> None:
+        """1件のメッセージを判定し、状態表を更新する"""
+        target_channel_id = self._resolve_target_channel_id(channel_id)
+        # 作成者IDは整数のまま照合する(対象外のユーザーは1回のハッシュ検索で除外される)
+        entry = self.roster.get(author_id)
+        if target_channel_id is None or entry is None:
+            return
+        user_id = entry.user_id
+
+        date_offset = self._get_channel_config(self.get_channel(target_channel_id))['date_offset']
+        candidate_dates = [
+            target_date for target_date, window in self._window_planner.plan(self.target_dates, date_offset).items()
+            if window.contains(message_id)
+        ]
+        # 日付の抽出は1回だけ行い、すべての候補日と照合する
+        found_dates = MessageChecker.find_dates(content, candidate_dates, self.date_memo)
+        for target_date in candidate_dates:
+            matched = target_date in found_dates
+            message_ids = self._matches.setdefault((target_channel_id, target_date, user_id), set())
+            was_matched = bool(message_ids)
+            if matched:
+                message_ids.add(message_id)
+            else:
+                message_ids.discard(message_id)
+            if bool(message_ids) != was_matched:
+                logging.info(f"状態変更: {target_date.strftime('%Y/%m/%d')} {entry.name} "
+                             f"({'報告' if target_channel_id == REPORT_CHANNEL_ID else '宣言'}) → "
+                             f"{'○' if message_ids else '×'}")
+                self._mark_dirty(target_date, user_id)
+
+    def _mark_dirty(self, target_date: date, user_id: str) -> None:
+        now = datetime.now()
+        if not self._dirty:
+            self._first_dirty_time = now
+        self._last_change_time = now
+        self._dirty.add((target_date, user_id))
+
+    def _mark_dirty_date(self, target_date: date) -> None:
+        for user_id in self.roster.user_ids:
+            self._mark_dirty(target_date, user_id)
+
+    def _status(self, channel_id: int, target_date: date, user_id: str) -> bool:
+        return bool(self._matches.get((channel_id, target_date, user_id)))
+
+    @tasks.loop(seconds=DAEMON_FLUSH_INTERVAL)
+    async def flush_loop(self):
+        """デバウンスタイマー: 変更が落ち着いたら(または最大待ち時間を過ぎたら)書き込む"""
+        await self._reload_roster()
+        await self._roll_dates()
+
+        if self._dirty:
+            now = datetime.now()
+            quiet = (now - self._last_change_time).total_seconds() >= DAEMON_FLUSH_DEBOUNCE_SECONDS
+            overdue = (now - self._first_dirty_time).total_seconds() >= DAEMON_FLUSH_MAX_DELAY_SECONDS
+            if quiet or overdue:
+                await self._flush()
+
+    async def _flush(self):
+        """書き込み待ちのセルをGoogle Sheetsに書き込む"""
+        if not self._dirty:
+            return
+        dirty = sorted(self._dirty)
+        self._dirty = set()
+        updates = [
+            (
+                datetime.combine(target_date, datetime.min.time()),
+                user_id,
+                self._status(REPORT_CHANNEL_ID, target_date, user_id),
+                self._status(DECLARATION_CHANNEL_ID, target_date, user_id)
+            )
+            for target_date, user_id in dirty
+        ]
+        logging.info(f"変更を書き込み中... ({len(updates)}件)")
+        outbox_ids = self.outbox.append(updates) if self.outbox is not None else []
+        try:
+            await self.result_sink.write_check_results(updates)
+            if self.outbox is not None:
+                self.outbox.acknowledge(outbox_ids)
+            logging.info(f"✓ {len(updates)}件の変更を書き込みました")
+        except Exception as e:
+            logging.error(f"× 書き込みエラー: {str(e)}")
+            # 次回の書き込みで再試行する
+            for target_date, user_id in dirty:
+                self._mark_dirty(target_date, user_id)
+
+    async def _reload_roster(self):
+        """user_columns.jsonが変更されていたら読み込み直し、状態表を作り直す"""
+        try:
+            if not self.roster.reload_if_changed():
+                return
+        except (OSError, ValueError, KeyError) as e:
+            # 編集中のファイルは次回のタイマーで読み込み直す
+            logging.warning(f"ユーザー設定を読み込めませんでした: {str(e)}")
+            return
+
+        self.channel_scanner.user_ids = self.roster.user_ids
+        # 削除されたユーザーの状態を破棄し、追加されたユーザーや列が変わったユーザーを含めて書き込み直す
+        self._dirty = {key for key in self._dirty if self.roster.find(key[1])}
+        await self._seed_status_table()
+
+    async def _roll_dates(self):
+        """日付が変わったら対象日をずらし、不要になった対象日の状態を破棄する"""
+        live_dates = self._live_dates()
+        if live_dates == self.target_dates:
+            return
+        # 破棄する対象日の変更を先に書き込む
+        await self._flush()
+
+        logging.info(f"対象日を更新: {', '.join(d.strftime('%Y/%m/%d') for d in live_dates)}")
+        new_dates = [d for d in live_dates if d not in self.target_dates]
+        self.target_dates = live_dates
+        self._matches = {key: ids for key, ids in self._matches.items() if key[1] in live_dates}
+        self._dirty = {key for key in self._dirty if key[0] in live_dates}
+        for target_date in new_dates:
+            self._mark_dirty_date(target_date)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple
+
+# 抽出した日付(年, 月, 日)のタプル。年が書かれていない場合はNone
+DateTuples = Tuple[Tuple[Optional[int], int, int], ...]
+
+
+class DateMemo:
+    """
+    日付の抽出結果をメッセージ本文(先頭10行)のハッシュごとに記録するLRUメモ
+
+    db_pathを指定すると、終了時に今回使った結果をSQLiteに保存し、次回以降はメモにない本文だけを
+    ハッシュでSQLiteから探す(起動時にまとめて読み込まない)。同じ期間を繰り返しチェックする場合は
+    日付の抽出を省略できる。
+    保存した結果は抽出ルールのフィンガープリントと一緒に記録し、ルールが変わっていれば破棄する
+    """
+
+    def __init__(self, max_entries: int, db_path: Optional[Path] = None, fingerprint: str = ""):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[bytes, DateTuples]' = OrderedDict()
+        # 前回保存してから使ったキー(終了時に保存する)
+        self._touched: Set[bytes] = set()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path))
+            self._create_tables()
+            self._check_fingerprint(fingerprint)
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS date_memo (
+                    content_hash BLOB PRIMARY KEY,
+                    dates TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+    def _check_fingerprint(self, fingerprint: str):
+        """保存済みの結果が別の抽出ルールで作られていれば削除する"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+        with self._conn:
+            deleted = self._conn.execute("DELETE FROM date_memo").rowcount
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+        if deleted:
+            logging.info(f"日付の抽出ルールが変わったため日付抽出メモを破棄しました: {deleted}件")
+
+    def _lookup(self, content_hash: bytes) -> Optional[DateTuples]:
+        """保存済みの結果を探す"""
+        row = self._conn.execute("SELECT dates FROM date_memo WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        return tuple(tuple(date_tuple) for date_tuple in json.loads(row[0]))
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def get_or_extract(self, text: str, extract: Callable[[str], DateTuples]) -> DateTuples:
+        """メモにあれば記録済みの結果を、なければ抽出して記録した結果を返す"""
+        content_hash = self.key(text)
+        dates = self._entries.get(content_hash)
+        if dates is not None:
+            self.hits += 1
+            self._entries.move_to_end(content_hash)
+        else:
+            if self._conn is not None:
+                dates = self._lookup(content_hash)
+            if dates is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                dates = extract(text)
+            self._entries[content_hash] = dates
+            if len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._touched.discard(evicted)
+        if self._conn is not None:
+            self._touched.add(content_hash)
+        return dates
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数・記録数"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def flush(self):
+        """今回使った結果をSQLiteに保存し、max_entriesを超えた古い結果を削除する"""
+        if self._conn is None or not self._touched:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO date_memo (content_hash, dates) VALUES (?, ?)",
+                [(content_hash, json.dumps(self._entries[content_hash]))
+                 for content_hash in self._touched if content_hash in self._entries]
+            )
+            self._conn.execute(
+                "DELETE FROM date_memo WHERE rowid NOT IN "
+                "(SELECT rowid FROM date_memo ORDER BY rowid DESC LIMIT ?)", (self.max_entries,)
+            )
+        self._touched = set()
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,320 @@
+import logging
+import sqlite3
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import discord
+from discord.utils import snowflake_time, time_snowflake
+
+# アーカイブに保存する本文の行数(MessageCheckerが確認する先頭10行)
+CONTENT_PREFIX_LINES = 10
+# Discord APIの1ページあたりのメッセージ取得件数
+HISTORY_PAGE_SIZE = 100
+
+
+class MessageRecord(NamedTuple):
+    """判定に必要な項目だけを持つメッセージ"""
+    id: int
+    channel_id: int
+    author_id: int
+    created_at: datetime
+    thread_id: Optional[int]
+    content: str
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> 'MessageRecord':
+        """discord.MessageからMessageRecordを作成する"""
+        thread_id = message.channel.id if isinstance(message.channel, discord.Thread) else None
+        content_prefix = '\n'.join((message.content or '').split('\n')[:CONTENT_PREFIX_LINES])
+        return cls(
+            id=message.id,
+            channel_id=message.channel.id,
+            author_id=message.author.id,
+            created_at=message.created_at,
+            thread_id=thread_id,
+            content=content_prefix
+        )
+
+
+class MessageArchive:
+    """
+    チャンネルのメッセージをSQLiteに保存するローカルアーカイブ
+
+    チャンネルごとに同期済みのスノーフレーク範囲(oldest_id < id < newest_id)を記録し、
+    範囲外の差分だけをDiscord APIから取得する。直近resync_seconds秒の部分は同期済みでも
+    取得し直し、投稿後の編集・削除を反映する
+    """
+
+    def __init__(self, db_path: Path, resync_seconds: int = 0):
+        self.db_path = Path(db_path)
+        self.resync_seconds = resync_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    thread_id INTEGER,
+                    content TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_channel_id ON messages (channel_id, id)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id INTEGER PRIMARY KEY,
+                    parent_id INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    channel_id INTEGER PRIMARY KEY,
+                    oldest_id INTEGER NOT NULL,
+                    newest_id INTEGER NOT NULL
+                )
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    async def sync_channel(self, channel, search_start_utc: datetime, search_end_utc: datetime) -> int:
+        """
+        検索範囲のうち未同期の部分だけを取得してアーカイブに保存する
+
+        Args:
+            channel: 同期対象のチャンネル
+            search_start_utc: 検索開始日時(UTC)
+            search_end_utc: 検索終了日時(UTC)
+
+        Returns:
+            Discord APIから新たに取得したメッセージ数
+        """
+        stats: Dict[str, Any] = {}
+        async with aclosing(self.iter_channel(channel, search_start_utc, search_end_utc, stats)) as records:
+            async for _ in records:
+                pass
+        return stats['api_messages']
+
+    async def iter_channel(self, channel, search_start_utc: datetime, search_end_utc: datetime,
+                           stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[MessageRecord]:
+        """
+        検索範囲のメッセージを古い順に返す
+
+        同期済みの部分はアーカイブから読み出し、最新の同期位置以降の差分だけを
+        APIから取得しながら保存する。途中で打ち切った場合は取得済みの位置までを同期済みとして記録する
+
+        Args:
+            channel: 対象のチャンネル
+            search_start_utc: 検索開始日時(UTC)
+            search_end_utc: 検索終了日時(UTC)
+            stats: API取得の統計を書き込む辞書(api_messages, api_pages, api_after, exhausted)
+        """
+        stats = stats if stats is not None else {}
+        stats.update({'api_messages': 0, 'api_pages': 0, 'api_after': None, 'exhausted': True})
+        after_id = time_snowflake(search_start_utc, high=True)
+        before_id = time_snowflake(search_end_utc, high=False)
+        if getattr(channel, 'parent_id', None):
+            # スレッドの場合は親チャンネルを記録する(アーカイブだけで再判定する場合に使う)
+            self._record_thread(channel.id, channel.parent_id)
+
+        now_id = time_snowflake(datetime.now(timezone.utc), high=False)
+        synced_range = self._get_synced_range(channel.id)
+        if synced_range is not None and before_id <= synced_range[0]:
+            # 同期済み範囲より前で離れた検索範囲は、間の期間を取得せずに検索範囲だけを取得する
+            # (同期済み範囲は連続している必要があるため記録しない)
+            records = await self._fetch_range(channel, after_id, before_id)
+            self._store(records)
+            stats['api_messages'] += len(records)
+            stats['api_pages'] += len(records) // HISTORY_PAGE_SIZE + 1
+            logging.info(f"アーカイブ同期: {channel.name} - 同期済み範囲より前の検索範囲から{len(records)}件を取得")
+            for record in records:
+                yield record
+            return
+        if synced_range is not None and synced_range[1] < after_id:
+            # 同期済み範囲より後で離れた検索範囲は、間の期間を取得せずに検索範囲から同期し直す
+            logging.info(f"アーカイブ同期: {channel.name} - 同期済み範囲と離れているため検索範囲から同期し直します")
+            synced_range = None
+
+        if synced_range is None:
+            # 初回は検索範囲の先頭から取得
+            oldest_id = newest_id = after_id
+        else:
+            oldest_id, newest_id = synced_range
+            # 検索範囲より前の部分は取得し直さない(次に検索範囲に含まれたときに取得し直す)
+            resync_id = max(time_snowflake(datetime.now(timezone.utc) - timedelta(seconds=self.resync_seconds)),
+                            after_id)
+            if self.resync_seconds and newest_id > resync_id and before_id > resync_id:
+                # 直近の部分は編集・削除を反映するため取得し直す(削除されたメッセージが残らないよう先に消す)
+                newest_id = max(oldest_id, resync_id)
+                self._delete_from(channel.id, newest_id)
+                self._set_synced_range(channel.id, oldest_id, newest_id)
+            if after_id < oldest_id:
+                # 同期済み範囲より古い部分は範囲の連続性を保つため最後まで取得する(範囲の下端も含める)
+                records = await self._fetch_range(channel, after_id, oldest_id + 1)
+                self._store(records)
+                oldest_id = after_id
+                self._set_synced_range(channel.id, oldest_id, newest_id)
+                stats['api_messages'] += len(records)
+                stats['api_pages'] += len(records) // HISTORY_PAGE_SIZE + 1
+
+            # 同期済みの部分はアーカイブから読み出す(並行する同期の書き込みと重ならないよう先に読み切る)
+            for record in list(self.iter_messages(channel.id, search_start_utc, search_end_utc)):
+                if record.id >= newest_id:
+                    break
+                yield record
+
+        if before_id <= newest_id:
+            logging.info(f"アーカイブ同期: {channel.name} - 最新の差分なし (API取得: {stats['api_messages']}件)")
+            return
+
+        # 最新の同期位置以降の差分をページ単位で保存しながら返す
+        stats['exhausted'] = False
+        stats['api_after'] = max(snowflake_time(newest_id), search_start_utc)
+        page: List[MessageRecord] = []
+        completed = False
+        try:
+            async for message in channel.history(
+                after=discord.Object(id=newest_id - 1),
+                before=discord.Object(id=before_id),
+                limit=None,
+                oldest_first=True
+            ):
+                record = MessageRecord.from_message(message)
+                page.append(record)
+                stats['api_messages'] += 1
+                if len(page) == HISTORY_PAGE_SIZE:
+                    self._store(page)
+                    self._set_synced_range(channel.id, oldest_id, record.id + 1)
+                    stats['api_pages'] += 1
+                    page = []
+                if record.id > after_id:
+                    yield record
+            completed = True
+        finally:
+            if page:
+                self._store(page)
+                stats['api_pages'] += 1
+            if completed:
+                stats['exhausted'] = True
+                if not page and stats['api_messages'] % HISTORY_PAGE_SIZE == 0:
+                    # 最後の空ページの取得分
+                    stats['api_pages'] += 1
+                # 検索終了日時が未来の場合は、現在時刻より後に投稿されるメッセージを同期済みにしない
+                self._set_synced_range(channel.id, oldest_id, min(before_id, now_id))
+            elif page:
+                self._set_synced_range(channel.id, oldest_id, page[-1].id + 1)
+            logging.info(f"アーカイブ同期: {channel.name} - {stats['api_messages']}件を新たに取得 "
+                         f"({stats['api_pages']}ページ{'' if completed else '、途中で打ち切り'})")
+
+    def iter_messages(self, channel_id: int, search_start_utc: datetime, search_end_utc: datetime,
+                      author_id: Optional[int] = None, include_threads: bool = False) -> Iterator[MessageRecord]:
+        """
+        アーカイブから検索範囲のメッセージを古い順に返す
+
+        include_threads=Trueの場合は、チャンネルのスレッド(アーカイブ済みのもの)のメッセージも含める
+        """
+        channel_filter = "(channel_id = ? OR channel_id IN (SELECT thread_id FROM threads WHERE parent_id = ?))" \
+            if include_threads else "channel_id = ?"
+        query = "SELECT id, channel_id, author_id, created_at, thread_id, content FROM messages " \
+                f"WHERE {channel_filter} AND id > ? AND id < ?"
+        params = [channel_id] + ([channel_id] if include_threads else []) + \
+                 [time_snowflake(search_start_utc, high=True), time_snowflake(search_end_utc, high=False)]
+        if author_id is not None:
+            query += " AND author_id = ?"
+            params.append(author_id)
+        query += " ORDER BY id"
+
+        for row in self._conn.execute(query, params):
+            yield MessageRecord(
+                id=row[0],
+                channel_id=row[1],
+                author_id=row[2],
+                created_at=datetime.fromisoformat(row[3]),
+                thread_id=row[4],
+                content=row[5]
+            )
+
+    def covers(self, channel_id: int, after_id: int, before_id: int) -> bool:
+        """
+        スノーフレーク範囲(after_id < id < before_id)のメッセージがすべてアーカイブに保存されているか
+
+        チャンネル自体の同期済み範囲が範囲全体を含み、範囲内に同期済みの部分があるスレッドは
+        作成以降の部分を含む場合だけTrueを返す(範囲内に同期済みの部分がないスレッドは、
+        走査時に範囲内のメッセージがなく取得されなかったものとして扱う)
+        """
+        synced_range = self._get_synced_range(channel_id)
+        if synced_range is None or not (synced_range[0] <= after_id and before_id <= synced_range[1]):
+            return False
+
+        rows = self._conn.execute(
+            "SELECT t.thread_id, s.oldest_id, s.newest_id FROM threads t "
+            "LEFT JOIN sync_state s ON s.channel_id = t.thread_id WHERE t.parent_id = ? AND t.thread_id < ?",
+            (channel_id, before_id)
+        )
+        for thread_id, oldest_id, newest_id in rows:
+            # スレッドのメッセージIDはスレッドIDより小さくならない
+            thread_after_id = max(after_id, thread_id - 1)
+            if oldest_id is None or newest_id <= thread_after_id or before_id <= oldest_id:
+                if thread_id > after_id:
+                    # 範囲内に作成されたスレッドは必ず走査対象になるため、同期されていなければ不足している
+                    return False
+                continue
+            if not (oldest_id <= thread_after_id and before_id <= newest_id):
+                return False
+        return True
+
+    async def _fetch_range(self, channel, fetch_after: int, fetch_before: int) -> List[MessageRecord]:
+        """指定したスノーフレーク範囲のメッセージをすべて取得する"""
+        return [
+            MessageRecord.from_message(message)
+            async for message in channel.history(
+                after=discord.Object(id=fetch_after),
+                before=discord.Object(id=fetch_before),
+                limit=None,
+                oldest_first=True
+            )
+        ]
+
+    def _store(self, records: List[MessageRecord]):
+        if not records:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (id, channel_id, author_id, created_at, thread_id, content) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(r.id, r.channel_id, r.author_id, r.created_at.isoformat(), r.thread_id, r.content)
+                 for r in records]
+            )
+
+    def _delete_from(self, channel_id: int, from_id: int):
+        """チャンネルのfrom_id以降のメッセージを削除する"""
+        with self._conn:
+            self._conn.execute("DELETE FROM messages WHERE channel_id = ? AND id >= ?", (channel_id, from_id))
+
+    def _record_thread(self, thread_id: int, parent_id: int):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, parent_id) VALUES (?, ?)", (thread_id, parent_id)
+            )
+
+    def _get_synced_range(self, channel_id: int) -> Optional[Tuple[int, int]]:
+        row = self._conn.execute(
+            "SELECT oldest_id, newest_id FROM sync_state WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _set_synced_range(self, channel_id: int, oldest_id: int, newest_id: int):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (channel_id, oldest_id, newest_id) VALUES (?, ?, ?)",
+                (channel_id, oldest_id, newest_id)
+            )
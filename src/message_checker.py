@@ -1,12 +1,107 @@
 from datetime import datetime, date
+from functools import lru_cache
+import hashlib
+import json
 import re
-from typing import List, Dict
+import unicodedata
+from typing import FrozenSet, Iterable, List, Dict, Optional, Set, Tuple
 import logging
 from config.config import DATE_FORMATS
+from src.date_memo import DateMemo
+
+# 判定に使うメッセージの先頭行数
+CHECK_LINES = 10
+
+# 抽出した日付(年, 月, 日)。年が書かれていない場合はNone
+DateTuple = Tuple[Optional[int], int, int]
+
+
+def _compile_date_pattern(formats: List[str]) -> Tuple[re.Pattern, Dict[int, Tuple[Optional[int], int, int]]]:
+    """
+    DATE_FORMATSを1つの正規表現にまとめてコンパイルする
+
+    各パターンの名前付きグループ(year, month, day)をパターンごとに別名に付け替えて選択(|)で連結する。
+    同じ位置では先に書いたパターンが優先され、行の先頭側のマッチから順に返る
+
+    Returns:
+        コンパイル済みのパターンと、各パターンの最後のグループ番号 → (年, 月, 日)のグループ番号
+    """
+    alternatives = [
+        re.sub(r'\(\?P<(year|month|day)>', rf'(?P<\g<1>_{i}>', pattern)
+        for i, pattern in enumerate(formats)
+    ]
+    compiled = re.compile('|'.join(f'(?:{alternative})' for alternative in alternatives))
+    group_index = compiled.groupindex
+    groups = {}
+    for i in range(len(formats)):
+        year, month, day = (group_index.get(f'{name}_{i}') for name in ('year', 'month', 'day'))
+        # マッチしたパターンはmatch.lastindex(そのパターン内の最後のグループ)で判別する
+        last = max(index for name, index in group_index.items() if name.endswith(f'_{i}'))
+        groups[last] = (year, month, day)
+    return compiled, groups
+
+
+DATE_PATTERN, _DATE_GROUPS = _compile_date_pattern(DATE_FORMATS)
+# 日付の抽出処理(MessageChecker._extractなど)を変更したら上げる
+EXTRACTION_VERSION = 1
+# 保存済みの抽出結果を使い回せるかの判定に使う(DATE_FORMATSか抽出処理が変わると変わる)
+EXTRACTION_FINGERPRINT = hashlib.sha256(
+    json.dumps([EXTRACTION_VERSION, DATE_FORMATS, CHECK_LINES]).encode('utf-8')
+).hexdigest()
+# すべての日付パターンは数字(全角数字を含む)を必要とするため、数字のないメッセージは抽出を省略できる
+_DIGIT_PATTERN = re.compile(r'\d')
+# 年月日の区切り文字
+_SEPARATORS = '/-'
+
+
+class LiteralDateMatcher:
+    """
+    候補日の表記を文字列として探し、候補日を含み得ない本文を正規表現を使わずに除外するマッチャー
+
+    候補日の表記(2025/1/28, 25-01-28, 1/28, 01月28日など)はどれも「月+区切り+日」の部分
+    (1/28, 1-28, 1月28, 1/02など)を含むため、この部分文字列を1つも含まない本文には候補日が書かれていない。
+    含む場合は正規表現で抽出し、前後の数字の扱い(長い数字の並びの一部にはマッチしない)を確認する
+    """
+
+    def __init__(self, candidate_dates: FrozenSet[date]):
+        # (月, 日) → 候補日(正規表現で抽出した日付との照合用)
+        self.by_month_day: Dict[Tuple[int, int], List[date]] = {}
+        for candidate in candidate_dates:
+            self.by_month_day.setdefault((candidate.month, candidate.day), []).append(candidate)
+        # 候補日の表記に必ず含まれる部分文字列
+        self.cores = tuple({
+            f'{candidate.month}{separator}{day}'
+            for candidate in candidate_dates
+            for separator in _SEPARATORS + '月'
+            for day in (str(candidate.day), f'{candidate.day:02d}')
+        })
+
+    def may_match(self, text: str) -> bool:
+        """候補日の表記を含み得るか(Falseの場合は候補日が書かれていない)"""
+        return any(core in text for core in self.cores)
+
+
+@lru_cache(maxsize=256)
+def _literal_matcher(candidate_dates: FrozenSet[date]) -> LiteralDateMatcher:
+    """候補日の組み合わせごとのLiteralDateMatcher(候補日ごとに1回だけ作成)"""
+    return LiteralDateMatcher(candidate_dates)
+
+
+def _to_date_tuple(match: re.Match) -> DateTuple:
+    """DATE_PATTERNのマッチから(年, 月, 日)を取り出す"""
+    year_group, month_group, day_group = _DATE_GROUPS[match.lastindex]
+    year = int(match.group(year_group)) if year_group else None
+    if year is not None and year < 100:
+        # 2桁年の場合
+        year += 2000
+    return year, int(match.group(month_group)), int(match.group(day_group))
+
 
 class MessageChecker:
     def __init__(self, target_date: datetime = None, batch_size: int = 5):
-        self.target_date = target_date or datetime.now()
+        target_date = target_date or datetime.now()
+        # 比較は日付単位で行う
+        self.target_date = target_date.date() if isinstance(target_date, datetime) else target_date
         self.batch_size = batch_size
 
     def process_users_in_batches(self, users: List[Dict]) -> List[List[Dict]]:
@@ -18,69 +113,89 @@ class MessageChecker:
         return batches
 
     def has_valid_date(self, content: str) -> bool:
-        if not content:
-            logging.info("    × 内容が空です")
-            return False
-
-        # メッセージを行に分割し、最初の10行を取得
-        lines = content.split('\n')[:10]
-        logging.info("\n    最初の10行を確認:")
-        for i, line in enumerate(lines, 1):
-            logging.info(f"    {i}行目: {line}")
-
-        # 各行で日付パターンを確認
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-
-            logging.info(f"\n    {i}行目の日付チェック:")
-            # 各パターンで完全一致を試行
-            for pattern in DATE_FORMATS:
-                logging.info(f"    パターン: {pattern}")
-                logging.info(f"    チェック対象行: '{line}'")
-                matches = re.finditer(pattern, line)
-                match_found = False
-                
-                for match in matches:
-                    match_found = True
-                    date_str = match.group()
-                    logging.info(f"    マッチ: '{date_str}' (位置: {match.start()}-{match.end()})")
-                    # マッチした部分が行の一部に含まれているか確認
-                    if date_str in line:
-                        try:
-                            date = self._parse_date(date_str)
-                            if not date:
-                                logging.info(f"    × 日付のパースに失敗: '{date_str}'")
-                                continue
-
-                            # 年が指定されていない場合は現在の年を使用
-                            if date.year == 1900:
-                                date = date.replace(year=self.target_date.year)
-                                logging.info(f"    年の補完: {date.strftime('%Y/%m/%d')}")
-
-                            logging.info(f"    検出: '{date_str}' → '{date.strftime('%Y/%m/%d')}'")
-                            check_date = date.date()
-                            target_date = self.target_date if hasattr(self.target_date, 'date') else self.target_date
-                            
-                            logging.info(f"    比較: 検出={check_date} vs 目標={target_date}")
-                            if check_date == target_date:
-                                logging.info(f"    ✓ {self.target_date.strftime('%Y/%m/%d')}の日付を確認")
-                                return True
-                            else:
-                                logging.info(f"    × {self.target_date.strftime('%Y/%m/%d')}と一致しません")
-                                # 一致しない場合は次のパターンを試す
-                                continue
-                        except ValueError as e:
-                            logging.info(f"    日付パースエラー '{date_str}': {str(e)}")
-                            continue
-                
-                if not match_found:
-                    logging.info(f"    × このパターンではマッチしませんでした")
-
-        logging.info(f"\n    × 対象の日付が見つかりません")
+        # 判定はメッセージごとに呼ばれるため、詳細ログはDEBUGレベルで遅延フォーマットする
+        if self.target_date in self.find_dates(content, [self.target_date]):
+            logging.debug("    ✓ %sの日付を確認", self.target_date)
+            return True
+        logging.debug("    × 対象の日付が見つかりません")
         return False
 
+    @classmethod
+    def find_dates(cls, content: str, candidate_dates: Iterable[date], memo: Optional[DateMemo] = None,
+                   stats: Optional[Dict[str, int]] = None) -> Set[date]:
+        """メッセージに書かれている日付のうち、候補日に含まれるものを返す"""
+        return cls.find_dates_batch([content], candidate_dates, memo, stats)[0]
+
+    @classmethod
+    def find_dates_batch(cls, contents: Iterable[str], candidate_dates: Iterable[date],
+                         memo: Optional[DateMemo] = None, stats: Optional[Dict[str, int]] = None) -> List[Set[date]]:
+        """
+        複数のメッセージについて、書かれている日付のうち候補日に含まれるものをまとめて返す
+
+        各メッセージの日付の抽出は1回だけ行い、すべての候補日と照合する。
+        年が書かれていない日付(MM/DD, M月D日)は候補日ごとにその候補日の年として扱う。
+        本文は全角数字などをNFKC正規化してから、まず候補日の表記を文字列として探し、
+        見つかった場合だけ正規表現で日付を抽出する
+
+        Args:
+            contents: メッセージ本文のリスト
+            candidate_dates: 照合する候補日(バックフィルの対象期間など)
+            memo: 日付の抽出結果を本文のハッシュごとに再利用するメモ(省略時は毎回抽出する)
+            stats: 数字を含まないため抽出を省略したメッセージ数(prefiltered_count)と
+                正規表現で抽出したメッセージ数(regex_count)を加算する辞書
+
+        Returns:
+            メッセージごとの、書かれていた候補日の集合(contentsと同じ順)
+        """
+        literal_matcher = _literal_matcher(frozenset(candidate_dates))
+
+        results = []
+        for content in contents:
+            found = set()
+            if not cls.may_contain_date(content):
+                if stats is not None:
+                    stats['prefiltered_count'] = stats.get('prefiltered_count', 0) + 1
+            else:
+                text = cls._head(content)
+                if literal_matcher.may_match(text):
+                    if stats is not None:
+                        stats['regex_count'] = stats.get('regex_count', 0) + 1
+                    dates = memo.get_or_extract(text, cls._extract) if memo is not None else cls._extract(text)
+                    for year, month, day in dates:
+                        for candidate in literal_matcher.by_month_day.get((month, day), ()):
+                            if year is None or year == candidate.year:
+                                found.add(candidate)
+            results.append(found)
+        return results
+
+    @staticmethod
+    def may_contain_date(content: str) -> bool:
+        """日付を含み得るメッセージか(数字を1文字も含まないメッセージは日付を含まない)"""
+        return bool(content) and _DIGIT_PATTERN.search(content) is not None
+
+    @classmethod
+    def extract_dates(cls, content: str) -> List[DateTuple]:
+        """メッセージの先頭10行から日付を(年, 月, 日)のタプルとして抽出する"""
+        return list(cls._extract(cls._head(content)))
+
+    @staticmethod
+    def _head(content: str) -> str:
+        """判定に使う先頭10行(全角数字・全角記号をNFKC正規化する)"""
+        return unicodedata.normalize('NFKC', '\n'.join(content.split('\n')[:CHECK_LINES]))
+
+    @staticmethod
+    def _extract(text: str) -> Tuple[DateTuple, ...]:
+        """
+        1つのコンパイル済みパターンで1回だけ走査し、マッチしたグループから直接数値を取り出す
+
+        日付としての妥当性(2月30日など)は確認しない(対象日との比較で一致しないため)
+        """
+        dates = []
+        for match in DATE_PATTERN.finditer(text):
+            dates.append(_to_date_tuple(match))
+        logging.debug("    抽出した日付: %s", dates)
+        return tuple(dates)
+
     def _parse_date(self, date_str: str) -> datetime:
         # 全角括弧と余分な文字を除去
         date_str = date_str.replace('【', '').replace('】', '')
@@ -91,7 +206,7 @@ class MessageChecker:
         date_str = re.sub(r'日[報誌記].*$', '', date_str)
         date_str = date_str.strip()
         
-        logging.info(f"    クリーニング後の日付文字列: '{date_str}'")
+        logging.debug("    クリーニング後の日付文字列: '%s'", date_str)
         
         # 月日形式（MM月DD日）のチェック
         if '月' in date_str and '日' in date_str:
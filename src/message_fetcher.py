@@ -14,7 +14,9 @@ from pathlib import Path
 root_dir = str(Path(__file__).parent.parent)
 sys.path.append(root_dir)
 
-from config.config import REPORT_CHANNEL_ID, DISCORD_TOKEN
+from config.config import REPORT_CHANNEL_ID, DISCORD_TOKEN, MESSAGE_ARCHIVE_PATH, MESSAGE_ARCHIVE_RESYNC_SECONDS
+from src.message_archive import MessageArchive
+from src.message_checker import MessageChecker
 
 class MessageFetcher(commands.Bot):
     def __init__(self, user_id: str, target_date: datetime):
@@ -24,6 +26,7 @@ class MessageFetcher(commands.Bot):
         super().__init__(command_prefix='!', intents=intents)
         
         self.target_user_id = user_id
+        self.target_author_id = int(user_id)
         self.target_date = target_date.date() if isinstance(target_date, datetime) else target_date
         self.user_name = self._get_user_name()
         self.setup_logging()
@@ -129,42 +132,46 @@ class MessageFetcher(commands.Bot):
             message_count = 0
             user_message_count = 0
             date_match_count = 0
-            async for message in channel.history(
-                after=search_start_utc,
-                before=search_end_utc,
-                limit=None
-            ):
+            # アーカイブに未同期の差分だけをAPIから取得し、アーカイブから読み出す
+            archive = MessageArchive(MESSAGE_ARCHIVE_PATH, MESSAGE_ARCHIVE_RESYNC_SECONDS)
+            try:
+                await archive.sync_channel(channel, search_start_utc, search_end_utc)
+                messages = list(archive.iter_messages(channel.id, search_start_utc, search_end_utc))
+            finally:
+                archive.close()
+
+            # 対象ユーザーのメッセージの日付をまとめて判定する
+            checker = MessageChecker(target_date=self.target_date)
+            user_messages = [message for message in messages if message.author_id == self.target_author_id]
+            found_dates = dict(zip(
+                (message.id for message in user_messages),
+                checker.find_dates_batch((message.content for message in user_messages), [checker.target_date])
+            ))
+
+            for message in messages:
                 message_count += 1
                 if message_count % 100 == 0:
                     logging.info(f"  - {message_count}件目を処理中...")
                 
-                if str(message.author.id) == self.target_user_id:
+                if message.author_id == self.target_author_id:
                     user_message_count += 1
                     logging.info(f"\n=== 対象ユーザーのメッセージ #{user_message_count} ===")
                     logging.info(f"投稿日時 (UTC): {message.created_at.strftime('%Y/%m/%d %H:%M:%S')}")
                     logging.info(f"投稿日時 (JST): {message.created_at.astimezone(jst).strftime('%Y/%m/%d %H:%M:%S')}")
                     
-                    # メッセージ内容を行ごとに出力
+                    # メッセージ内容を行ごとに出力（アーカイブには先頭10行のみ保存）
                     lines = message.content.splitlines()
                     logging.info("\nメッセージ内容:")
                     for i, line in enumerate(lines, 1):
                         logging.info(f"    [{i}行目] {line}")
                     
-                    # 添付ファイルの情報も出力
-                    if message.attachments:
-                        logging.info("\n添付ファイル:")
-                        for attachment in message.attachments:
-                            logging.info(f"    - {attachment.filename} ({attachment.url})")
-                    
                     # メッセージへのリンクを出力
-                    message_link = f"https://discord.com/channels/{message.guild.id}/{message.channel.id}/{message.id}"
+                    message_link = f"https://discord.com/channels/{channel.guild.id}/{message.channel_id}/{message.id}"
                     logging.info(f"\nメッセージリンク: {message_link}")
                     
                     # 日付チェック
                     logging.info("\n=== 日付チェックの実行 ===")
-                    from src.message_checker import MessageChecker
-                    checker = MessageChecker(target_date=self.target_date)
-                    has_date = checker.has_valid_date(message.content)
+                    has_date = checker.target_date in found_dates[message.id]
                     if has_date:
                         date_match_count += 1
                         logging.info(f"✓ 対象日付({self.target_date.strftime('%Y/%m/%d')})を含むメッセージを発見")
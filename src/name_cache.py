@@ -0,0 +1,56 @@
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+class UserNameCache:
+    """
+    ユーザー名をTTL付きでJSONファイルに保存するキャッシュ
+
+    形式: {ユーザーID: {"name": ユーザー名, "fetched_at": 取得時刻(UNIX秒)}}
+    """
+
+    def __init__(self, cache_path: Path, ttl_seconds: int):
+        self.cache_path = Path(cache_path)
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"ユーザー名キャッシュを読み込めませんでした: {str(e)}")
+            return {}
+
+    def get(self, user_id: str) -> Optional[str]:
+        """有効期限内のユーザー名を返す(ない場合はNone)"""
+        entry = self._entries.get(user_id)
+        if not entry or time.time() - entry['fetched_at'] > self.ttl_seconds:
+            return None
+        return entry['name']
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        names = {}
+        for user_id in user_ids:
+            name = self.get(user_id)
+            if name is not None:
+                names[user_id] = name
+        return names
+
+    def update(self, names: Dict[str, str]) -> None:
+        now = time.time()
+        for user_id, name in names.items():
+            self._entries[user_id] = {'name': name, 'fetched_at': now}
+
+    def save(self) -> None:
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logging.warning(f"ユーザー名キャッシュを保存できませんでした: {str(e)}")
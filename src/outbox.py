@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windowsではmsvcrtでロックする
+    import msvcrt
+    fcntl = None
+
+
+class ResultOutbox:
+    """
+    Google Sheetsに書き込む前の判定結果を記録する追記専用のJSONLファイル
+
+    結果は計算した時点で追記し、書き込みが完了したら確認(ack)を追記する。
+    書き込みに失敗した結果はファイルに残り、run.py --replay でまとめて再送できる。
+    同じ(日付, ユーザー)の結果は新しいものだけを送信待ちとして扱う
+
+    常駐モードと--replayのように複数のプロセスが同じファイルを使う場合に備えて、読み書きは
+    ロックファイルで直列化し、書き込む前に他のプロセスが追記したレコードを読み込む
+
+    形式(1行1レコード):
+        {"op": "put", "id": 連番, "date": "YYYY-MM-DD", "user_id": ユーザーID, "report": bool, "declaration": bool}
+        {"op": "ack", "ids": [連番, ...]}
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        # (日付, ユーザーID) → (連番, レポート状態, 宣言状態)
+        self._pending: Dict[Tuple[date, str], Tuple[int, bool, bool]] = {}
+        self._next_id = 1
+        # 読み込み済みのバイト数と、読み込んだファイル(他のプロセスが作り直したかの判定用)
+        self._offset = 0
+        self._file_id: Optional[Tuple[int, int]] = None
+        with self._locked():
+            self._read_new_records()
+        if self._pending:
+            logging.info(f"送信待ちの結果: {len(self._pending)}件")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def append(self, updates: Iterable[Tuple[datetime, str, bool, bool]]) -> List[int]:
+        """
+        結果を追記する
+
+        Returns:
+            追記した結果の連番(書き込みが完了したらacknowledgeに渡す)
+        """
+        with self._locked():
+            # 他のプロセスが追記した連番と重ならないように先に読み込む
+            self._read_new_records()
+            ids = []
+            lines = []
+            for check_date, user_id, report_status, declaration_status in updates:
+                day = check_date.date() if isinstance(check_date, datetime) else check_date
+                entry_id = self._next_id
+                self._next_id += 1
+                self._put(entry_id, day, user_id, report_status, declaration_status)
+                ids.append(entry_id)
+                lines.append(json.dumps({'op': 'put', 'id': entry_id, 'date': day.isoformat(), 'user_id': user_id,
+                                         'report': report_status, 'declaration': declaration_status}))
+            self._write(lines)
+        return ids
+
+    def acknowledge(self, ids: Iterable[int]):
+        """
+        書き込みが完了した結果を送信済みにする
+
+        送信待ちがなくなったらファイルを作り直し、連番を引き継ぐための確認の1行だけにする
+        """
+        ids = list(ids)
+        with self._locked():
+            # 他のプロセスの送信待ちを消さないように先に読み込む
+            self._read_new_records()
+            if not self._ack(ids):
+                return
+            if self._pending:
+                self._write([json.dumps({'op': 'ack', 'ids': sorted(ids)})])
+            else:
+                self._rewrite([json.dumps({'op': 'ack', 'ids': [self._next_id - 1]})])
+
+    def pending(self) -> Tuple[List[int], List[Tuple[datetime, str, bool, bool]]]:
+        """
+        送信待ちの結果
+
+        Returns:
+            送信待ちの連番と、write_check_resultsに渡せる(日付, ユーザーID, レポート状態, 宣言状態)のリスト
+        """
+        with self._locked():
+            self._read_new_records()
+        ids = []
+        updates = []
+        for (day, user_id), (entry_id, report_status, declaration_status) in sorted(self._pending.items()):
+            ids.append(entry_id)
+            updates.append((datetime.combine(day, datetime.min.time()), user_id, report_status, declaration_status))
+        return ids, updates
+
+    def _read_new_records(self):
+        """前回の読み込み以降に追記されたレコードを反映する(ロック中に呼び出す)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if self._file_id is not None and (file_id != self._file_id or stat.st_size < self._offset):
+            # 他のプロセスが送信待ちをすべて送信してファイルを作り直した(このプロセスの結果も送信済み)
+            self._pending = {}
+            self._offset = 0
+        self._file_id = file_id
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            # 書き込み中に終了して最後の行が途中で切れている。次の追記が続けて書かれないように切り詰める
+            logging.warning(f"送信待ちファイルの途中で切れた最後の行を削除しました: {len(data) - end}バイト")
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._offset + end)
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            try:
+                record = json.loads(line)
+                if record['op'] == 'put':
+                    self._put(record['id'], date.fromisoformat(record['date']), record['user_id'],
+                              record['report'], record['declaration'])
+                elif record['op'] == 'ack':
+                    self._ack(record['ids'])
+                    self._next_id = max([self._next_id] + [entry_id + 1 for entry_id in record['ids']])
+            except (ValueError, KeyError) as e:
+                logging.warning(f"送信待ちファイルの行を読み込めませんでした: {str(e)}")
+        self._offset += end
+
+    def _put(self, entry_id: int, day: date, user_id: str, report_status: bool, declaration_status: bool):
+        self._pending[(day, user_id)] = (entry_id, report_status, declaration_status)
+        self._next_id = max(self._next_id, entry_id + 1)
+
+    def _ack(self, ids: Iterable[int]) -> bool:
+        """送信待ちから取り除く(新しい結果で置き換えられた連番は無視する)"""
+        ids = set(ids)
+        acked = [key for key, (entry_id, _, _) in self._pending.items() if entry_id in ids]
+        for key in acked:
+            del self._pending[key]
+        return bool(acked)
+
+    def _write(self, lines: List[str]):
+        """ファイルの末尾に追記する(ロック中に呼び出す)"""
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            # 書き込みの直後に終了しても結果が残るようにする
+            os.fsync(f.fileno())
+            stat = os.fstat(f.fileno())
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size
+
+    def _rewrite(self, lines: List[str]):
+        """ファイルを作り直す(他のプロセスが作り直しを検出できるように別のファイルで置き換える)"""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size
+
+    @contextmanager
+    def _locked(self):
+        """ファイルを使う複数のプロセスの読み書きを直列化する"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,119 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.message_archive import MessageArchive
+from src.message_checker import MessageChecker
+from src.window_planner import SearchWindow
+
+# ワーカーに渡す1件分の判定対象: (作成者ID, 候補日, 本文の先頭10行)
+EvaluationItem = Tuple[int, Tuple[date, ...], str]
+
+
+def _evaluate_chunk(chunk: List[EvaluationItem]) -> Tuple[List[Tuple[int, date]], Dict[str, int]]:
+    """
+    ワーカープロセスで1チャンク分のメッセージを判定する
+
+    Returns:
+        日付が書かれていた(作成者ID, 対象日)のリストと、判定の統計
+    """
+    found = []
+    stats: Dict[str, int] = {}
+    for author_id, candidate_dates, content in chunk:
+        for target_date in MessageChecker.find_dates(content, candidate_dates, stats=stats):
+            found.append((author_id, target_date))
+    return found, stats
+
+
+class ArchiveReevaluator:
+    """
+    アーカイブ済みのメッセージだけで判定をやり直す(Discord APIは使わない)
+
+    日付ルールを変更した後に過去数か月分をまとめて再判定するためのもので、
+    判定対象のメッセージを作成者・候補日・本文の先頭10行だけのチャンクに分け、
+    ProcessPoolExecutorで複数プロセスに分散して判定する
+    """
+
+    def __init__(self, archive: MessageArchive, user_ids: Iterable[str], max_workers: Optional[int] = None,
+                 chunk_size: int = 2000):
+        self.archive = archive
+        self.user_ids = list(user_ids)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def evaluate(self, channel_id: int, windows: Dict[date, SearchWindow]) -> Dict[date, Dict[str, bool]]:
+        """
+        チャンネル(スレッドを含む)のアーカイブ済みメッセージを再判定する
+
+        Args:
+            channel_id: 対象のチャンネルID
+            windows: 対象日をキーとした検索範囲(WindowPlannerで作成)
+
+        Returns:
+            対象日ごとの、ユーザーIDをキーとした判定結果(True: ○, False: ×)。
+            検索範囲がアーカイブの同期済み範囲に含まれない対象日は、保存されていないメッセージを
+            ×と判定してしまうため結果に含めない
+        """
+        roster = {int(user_id): user_id for user_id in self.user_ids}
+        uncovered = [target_date for target_date, window in windows.items()
+                     if not window.is_empty and not self.archive.covers(channel_id, window.after_id, window.before_id)]
+        if uncovered:
+            logging.warning(f"チャンネル {channel_id}: アーカイブの同期済み範囲外のため再判定しない日 "
+                            f"{len(uncovered)}日 ({', '.join(d.strftime('%Y/%m/%d') for d in sorted(uncovered))})")
+        windows = {target_date: window for target_date, window in windows.items() if target_date not in uncovered}
+        results = {target_date: {user_id: False for user_id in self.user_ids} for target_date in windows}
+        windows = {target_date: window for target_date, window in windows.items() if not window.is_empty}
+        if not windows:
+            return results
+
+        start_time = datetime.now()
+        chunks = self._build_chunks(channel_id, windows, roster)
+        item_count = sum(len(chunk) for chunk in chunks)
+        stats: Dict[str, int] = {}
+
+        if self.max_workers == 1 or len(chunks) <= 1:
+            # 分散する必要がない場合はこのプロセスで判定する
+            self._merge(map(_evaluate_chunk, chunks), roster, results, stats)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                self._merge(executor.map(_evaluate_chunk, chunks), roster, results, stats)
+
+        elapsed = (datetime.now() - start_time).total_seconds()
+        logging.info(f"チャンネル {channel_id} の再判定: {item_count}件を{len(chunks)}チャンクに分割 "
+                     f"(ワーカー数: {self.max_workers}, 数字なしで除外 {stats.get('prefiltered_count', 0)}件, "
+                     f"正規表現で抽出 {stats.get('regex_count', 0)}件, 処理時間: {elapsed:.2f}秒)")
+        return results
+
+    def _build_chunks(self, channel_id: int, windows: Dict[date, SearchWindow],
+                      roster: Dict[int, str]) -> List[List[EvaluationItem]]:
+        """ロスターのユーザーが検索範囲内に投稿したメッセージを、候補日付きでチャンクに分ける"""
+        search_start_utc = min(window.start_utc for window in windows.values())
+        search_end_utc = max(window.end_utc for window in windows.values())
+        chunks: List[List[EvaluationItem]] = []
+        chunk: List[EvaluationItem] = []
+        for record in self.archive.iter_messages(channel_id, search_start_utc, search_end_utc, include_threads=True):
+            if record.author_id not in roster:
+                continue
+            candidate_dates = tuple(target_date for target_date, window in windows.items()
+                                    if window.contains(record.id))
+            if not candidate_dates:
+                continue
+            chunk.append((record.author_id, candidate_dates, record.content))
+            if len(chunk) == self.chunk_size:
+                chunks.append(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _merge(chunk_results, roster: Dict[int, str], results: Dict[date, Dict[str, bool]],
+               stats: Dict[str, int]) -> None:
+        """チャンクごとの判定結果を(対象日, ユーザー)ごとの結果にまとめる"""
+        for found, chunk_stats in chunk_results:
+            for author_id, target_date in found:
+                results[target_date][roster[author_id]] = True
+            for key, value in chunk_stats.items():
+                stats[key] = stats.get(key, 0) + value
@@ -0,0 +1,194 @@
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.outbox import ResultOutbox
+
+# (日付, ユーザーID, レポート状態, 宣言状態)
+CheckResult = Tuple[datetime, str, bool, bool]
+
+
+class ResultSink(ABC):
+    """判定結果の書き込み先"""
+
+    name = ""
+
+    @abstractmethod
+    async def write_check_results(self, updates: List[CheckResult]) -> int:
+        """
+        判定結果をまとめて書き込む(失敗した場合は例外を送出する)
+
+        Returns:
+            書き込みに使ったリクエスト(トランザクション)の回数
+        """
+
+    async def close(self):
+        """書き込み先の接続などを閉じる"""
+
+
+class SQLiteResultSink(ResultSink):
+    """
+    判定結果をローカルのSQLiteに保存する書き込み先
+
+    (日付, ユーザー)ごとに1行のWITHOUT ROWIDテーブルにまとめて書き込むため、
+    過去の結果の集計をSheets APIを使わずに手元で実行できる
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS check_results (
+                    date TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    report INTEGER NOT NULL,
+                    declaration INTEGER NOT NULL,
+                    PRIMARY KEY (date, user_id)
+                ) WITHOUT ROWID
+            """)
+
+    async def write_check_results(self, updates: List[CheckResult]) -> int:
+        if not updates:
+            return 0
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO check_results (date, user_id, report, declaration) VALUES (?, ?, ?, ?)",
+                [(self._day(check_date).isoformat(), int(user_id), int(report_status), int(declaration_status))
+                 for check_date, user_id, report_status, declaration_status in updates]
+            )
+        logging.info(f"ローカルの結果DBに書き込みました: {len(updates)}件")
+        return 1
+
+    def results_between(self, start_date: date, end_date: date) -> List[CheckResult]:
+        """期間(両端を含む)の判定結果を日付・ユーザーID順に返す"""
+        rows = self._conn.execute(
+            "SELECT date, user_id, report, declaration FROM check_results "
+            "WHERE date BETWEEN ? AND ? ORDER BY date, user_id",
+            (start_date.isoformat(), end_date.isoformat())
+        ).fetchall()
+        return [(datetime.combine(date.fromisoformat(day), datetime.min.time()), str(user_id),
+                 bool(report), bool(declaration)) for day, user_id, report, declaration in rows]
+
+    def submission_counts(self, start_date: date, end_date: date) -> Dict[str, Tuple[int, int]]:
+        """期間(両端を含む)のユーザーごとの(報告の提出日数, 宣言の提出日数)"""
+        rows = self._conn.execute(
+            "SELECT user_id, SUM(report), SUM(declaration) FROM check_results "
+            "WHERE date BETWEEN ? AND ? GROUP BY user_id",
+            (start_date.isoformat(), end_date.isoformat())
+        ).fetchall()
+        return {str(user_id): (reports, declarations) for user_id, reports, declarations in rows}
+
+    async def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _day(check_date) -> date:
+        return check_date.date() if isinstance(check_date, datetime) else check_date
+
+
+class MultiResultSink(ResultSink):
+    """
+    複数の書き込み先にまとめて書き込む
+
+    一部の書き込み先が失敗しても残りには書き込み、最後に最初のエラーを送出する
+    """
+
+    name = "multi"
+
+    def __init__(self, sinks: Iterable[ResultSink]):
+        self.sinks = list(sinks)
+
+    async def write_check_results(self, updates: List[CheckResult]) -> int:
+        request_count = 0
+        errors = []
+        for sink in self.sinks:
+            try:
+                request_count += await sink.write_check_results(updates)
+            except Exception as e:
+                logging.error(f"書き込み先 {sink.name} への書き込みに失敗しました: {str(e)}")
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return request_count
+
+    async def close(self):
+        for sink in self.sinks:
+            await sink.close()
+
+
+class SheetWriteBuffer:
+    """
+    実行中の結果をためておき、最後にまとめて書き込むライトビハインドバッファ
+
+    同じ(日付, ユーザー)の結果は後から追加したものを優先する。
+    outboxを指定すると、追加した時点で結果を送信待ちファイルに記録し、書き込みが完了したら送信済みにする
+    """
+
+    def __init__(self, sink: ResultSink, outbox: Optional[ResultOutbox] = None):
+        self.sink = sink
+        self.outbox = outbox
+        self._pending: Dict[Tuple[datetime, str], Tuple[bool, bool]] = {}
+        self._outbox_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, updates: List[Tuple[datetime, str, bool, bool]]):
+        if self.outbox is not None:
+            self._outbox_ids.extend(self.outbox.append(updates))
+        for check_date, user_id, report_status, declaration_status in updates:
+            self._pending[(check_date, user_id)] = (report_status, declaration_status)
+
+    async def flush(self) -> int:
+        """
+        ためた結果をまとめて書き込む(失敗した場合は結果を残したまま例外を送出する)
+
+        Returns:
+            書き込みに使ったリクエストの回数
+        """
+        if not self._pending:
+            return 0
+        updates = [(check_date, user_id, report_status, declaration_status)
+                   for (check_date, user_id), (report_status, declaration_status) in self._pending.items()]
+        request_count = await self.sink.write_check_results(updates)
+        if self.outbox is not None:
+            self.outbox.acknowledge(self._outbox_ids)
+        self._pending = {}
+        self._outbox_ids = []
+        return request_count
+
+
+def create_result_sink(names: Iterable[str], db_path: Path) -> ResultSink:
+    """
+    設定(RESULT_SINKS)の名前から書き込み先を作成する
+
+    Args:
+        names: 書き込み先の名前のリスト('sheets', 'sqlite')
+        db_path: 'sqlite'の保存先
+    """
+    sinks = []
+    for name in names:
+        if name == "sheets":
+            # Google APIの認証情報が不要な構成(sqliteのみ)では読み込まない
+            from config.config import SPREADSHEET_ID
+            from src.sheets_handler import SheetsHandler
+            if not SPREADSHEET_ID:
+                raise ValueError("Required environment variable SPREADSHEET_ID is not set")
+            sinks.append(SheetsHandler())
+        elif name == "sqlite":
+            sinks.append(SQLiteResultSink(db_path))
+        else:
+            raise ValueError(f"Unknown result sink: {name}")
+    if not sinks:
+        raise ValueError("RESULT_SINKS is empty")
+    return sinks[0] if len(sinks) == 1 else MultiResultSink(sinks)
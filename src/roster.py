@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+def column_to_index(column: str) -> int:
+    # 列名(A,B,C...)を数値インデックス(0,1,2...)に変換
+    return sum((ord(char) - ord('A') + 1) * (26 ** i)
+               for i, char in enumerate(reversed(column))) - 1
+
+
+def index_to_column(index: int) -> str:
+    # 数値インデックスを列名に変換
+    index += 1
+    result = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        result = chr(ord('A') + remainder) + result
+    return result
+
+
+class RosterEntry:
+    """ロスターの1ユーザー(列のインデックスは読み込み時に計算しておく)"""
+
+    __slots__ = ('author_id', 'user_id', 'name', 'declaration_column', 'report_column',
+                 'declaration_index', 'report_index')
+
+    def __init__(self, user: Dict):
+        self.user_id: str = user['userId']
+        self.author_id = int(self.user_id)
+        self.name: str = user.get('name', 'N/A')  # nameフィールドがない場合はN/A
+        # 宣言の列の次の列が報告の列
+        self.declaration_column: str = user['sengenCol']
+        self.declaration_index = column_to_index(self.declaration_column)
+        self.report_index = self.declaration_index + 1
+        self.report_column = index_to_column(self.report_index)
+
+
+class Roster:
+    """
+    user_columns.jsonのユーザー一覧
+
+    作成者IDを整数のままキーにするため、メッセージごとの照合は1回の整数のハッシュ検索で済む。
+    reload_if_changed()はファイルの更新時刻が変わっている場合だけ読み込み直す(常駐中の編集を反映する)
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path is not None else None
+        self.entries: Dict[int, RosterEntry] = {}
+        self._mtime_ns: Optional[int] = None
+        if self.path is not None:
+            self.reload_if_changed()
+
+    @classmethod
+    def from_users(cls, users: List[Dict]) -> 'Roster':
+        """ファイルを使わずにユーザー一覧から作成する"""
+        roster = cls()
+        roster._set_users(users)
+        return roster
+
+    def _set_users(self, users: List[Dict]):
+        entries = {}
+        for user in users:
+            entry = RosterEntry(user)
+            entries[entry.author_id] = entry
+        self.entries = entries
+
+    def reload_if_changed(self) -> bool:
+        """ファイルの更新時刻が前回の読み込みから変わっていれば読み込み直す"""
+        if self.path is None:
+            return False
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            users = json.load(f)
+        reloaded = self._mtime_ns is not None
+        self._set_users(users)
+        self._mtime_ns = mtime_ns
+        if reloaded:
+            logging.info(f"ユーザー設定を読み込み直しました: {len(self.entries)}人")
+        return True
+
+    def get(self, author_id: int) -> Optional[RosterEntry]:
+        return self.entries.get(author_id)
+
+    def find(self, user_id: str) -> Optional[RosterEntry]:
+        """文字列のユーザーIDからエントリーを探す(数字でないIDはNone)"""
+        return self.entries.get(int(user_id)) if user_id.isdigit() else None
+
+    @property
+    def user_ids(self) -> List[str]:
+        return [entry.user_id for entry in self.entries.values()]
+
+    def columns(self) -> Dict[str, Dict[str, str]]:
+        """ユーザーID → {"name", "declaration", "report"}(USER_COLUMNSの形式)"""
+        return {
+            entry.user_id: {
+                "name": entry.name,
+                "declaration": entry.declaration_column,
+                "report": entry.report_column
+            }
+            for entry in self.entries.values()
+        }
+
+    def __contains__(self, author_id: int) -> bool:
+        return author_id in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.user_ids)
+
+    def __len__(self) -> int:
+        return len(self.entries)
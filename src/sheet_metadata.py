@@ -0,0 +1,62 @@
+import json
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable
+
+
+class SheetMetadataCache:
+    """
+    スプレッドシートのシート名とsheetIdの対応をJSONファイルにキャッシュする
+
+    キャッシュにないシート名を問い合わせたときだけAPIから取得し直す(シートが追加された場合など)
+
+    形式: {スプレッドシートID: {シート名: sheetId}}
+    """
+
+    def __init__(self, cache_path: Path, spreadsheet_id: str, fetch: Callable[[], Awaitable[Dict[str, int]]]):
+        """
+        Args:
+            cache_path: キャッシュファイルのパス
+            spreadsheet_id: スプレッドシートID
+            fetch: APIからシート名 → sheetIdの対応を取得するコルーチン関数
+        """
+        self.cache_path = Path(cache_path)
+        self.spreadsheet_id = spreadsheet_id
+        self.fetch = fetch
+        self._entries: Dict[str, Dict[str, int]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, int]]:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"シート情報のキャッシュを読み込めませんでした: {str(e)}")
+            return {}
+
+    async def resolve(self, titles: Iterable[str]) -> Dict[str, int]:
+        """
+        シート名からsheetIdを求める
+
+        Returns:
+            シート名 → sheetId(スプレッドシートに存在しないシートは含まない)
+        """
+        titles = set(titles)
+        sheet_ids = self._entries.get(self.spreadsheet_id, {})
+        if not titles <= sheet_ids.keys():
+            sheet_ids = await self.refresh()
+        return {title: sheet_ids[title] for title in titles if title in sheet_ids}
+
+    async def refresh(self) -> Dict[str, int]:
+        """APIからシートの一覧を取得し直してキャッシュを更新する"""
+        sheet_ids = await self.fetch()
+        self._entries[self.spreadsheet_id] = sheet_ids
+        logging.info(f"シート情報を取得しました: {len(sheet_ids)}シート")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logging.warning(f"シート情報のキャッシュを保存できませんでした: {str(e)}")
+        return sheet_ids
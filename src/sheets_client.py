@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from src.token_cache import TokenCache
+
+SHEETS_API_BASE_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+
+
+class SheetsApiError(Exception):
+    """Sheets APIがエラーを返した場合の例外"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[str] = None):
+        super().__init__(f"Sheets API error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AsyncSheetsClient:
+    """
+    aiohttpでSheets API(v4)を呼び出す非同期クライアント
+
+    1つのセッション(keep-aliveの接続プール)を使い回すため、同時に書き込んでも安全で、
+    リクエストごとの接続のコストもかからない。アクセストークンはサービスアカウントの
+    認証情報から取得し、期限が切れたときだけ更新する(token_cacheを指定すると実行をまたいで使い回す)
+    """
+
+    def __init__(self, credentials, base_url: str = SHEETS_API_BASE_URL, pool_size: int = 10,
+                 timeout_seconds: float = 60, token_cache: Optional[TokenCache] = None):
+        self.credentials = credentials
+        self.token_cache = token_cache
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout_seconds = timeout_seconds
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token_lock = asyncio.Lock()
+
+    async def values_batch_get(self, spreadsheet_id: str, ranges: List[str],
+                               major_dimension: str = 'ROWS') -> Dict[str, Any]:
+        """spreadsheets.values.batchGet"""
+        params = [('ranges', cell_range) for cell_range in ranges] + [('majorDimension', major_dimension)]
+        return await self._request('GET', f"/{spreadsheet_id}/values:batchGet", params=params)
+
+    async def get_sheet_properties(self, spreadsheet_id: str) -> Dict[str, Any]:
+        """spreadsheets.get(シートのタイトルとsheetIdだけを取得する)"""
+        return await self._request('GET', f"/{spreadsheet_id}",
+                                   params={'fields': 'sheets.properties(sheetId,title)'})
+
+    async def batch_update(self, spreadsheet_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.batchUpdate(updateCellsなどのリクエスト)"""
+        return await self._request('POST', f"/{spreadsheet_id}:batchUpdate", json=body)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        for attempt in range(2):
+            session = self._get_session()
+            authorization = await self._authorization()
+            async with session.request(method, self.base_url + path, headers={'Authorization': authorization},
+                                       **kwargs) as response:
+                if response.status == 401 and attempt == 0:
+                    # キャッシュしたトークンが鍵の更新・無効化で使えなくなった場合は、取得し直して1回だけ再試行する
+                    logging.warning("Sheets APIのアクセストークンが拒否されたため取得し直します")
+                    await self._invalidate_token(authorization)
+                    continue
+                if response.status >= 400:
+                    raise SheetsApiError(response.status, await response.text(), response.headers.get('Retry-After'))
+                return await response.json()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # イベントループ上で作成する必要があるため、最初のリクエストで作成する
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+        return self._session
+
+    async def _invalidate_token(self, authorization: str):
+        """拒否されたトークンを破棄する(同時に拒否された他のリクエストが更新済みなら何もしない)"""
+        async with self._token_lock:
+            if authorization != f"Bearer {self.credentials.token}":
+                return
+            self.credentials.token = None
+            if self.token_cache:
+                self.token_cache.clear()
+
+    async def _authorization(self) -> str:
+        async with self._token_lock:
+            if not self.credentials.valid and self.token_cache and self.token_cache.load(self.credentials):
+                logging.debug("キャッシュしたSheets APIのアクセストークンを使います")
+            if not self.credentials.valid:
+                # requestsの読み込みは起動を遅くするため、トークンを更新する場合だけ読み込む
+                import google.auth.transport.requests
+                # トークンの更新は1時間に1回程度のため、スレッドプールで実行する
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.credentials.refresh,
+                                           google.auth.transport.requests.Request())
+                logging.debug("Sheets APIのアクセストークンを更新しました")
+                if self.token_cache:
+                    self.token_cache.save(self.credentials)
+        return f"Bearer {self.credentials.token}"
@@ -1,5 +1,4 @@
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from datetime import datetime
 import asyncio
 from typing import Dict, List, Tuple, Any
@@ -9,61 +8,101 @@ from config.config import (
     SPREADSHEET_ID, 
     CREDENTIALS_PATH,
     START_ROW,
-    USER_COLUMNS
+    ROSTER,
+    SHEETS_READ_REQUESTS_PER_MINUTE,
+    SHEETS_WRITE_REQUESTS_PER_MINUTE,
+    SHEETS_CONCURRENT_LIMIT,
+    SHEETS_MAX_RETRIES,
+    SHEETS_TOKEN_CACHE_PATH,
+    SHEET_METADATA_CACHE_PATH
 )
+from src.result_sink import ResultSink
+from src.sheet_metadata import SheetMetadataCache
+from src.sheets_client import AsyncSheetsClient, SheetsApiError
+from src.sheets_scheduler import SheetsRequestScheduler
+from src.token_cache import TokenCache
+
+class SheetsHandler(ResultSink):
+    """判定結果をGoogle Sheetsに書き込む書き込み先"""
+
+    name = "sheets"
 
-class SheetsHandler:
     def __init__(self):
         credentials = service_account.Credentials.from_service_account_file(
             CREDENTIALS_PATH,
             scopes=['https://www.googleapis.com/auth/spreadsheets']
         )
-        self.service = build('sheets', 'v4', credentials=credentials)
+        self.client = AsyncSheetsClient(credentials, token_cache=TokenCache(SHEETS_TOKEN_CACHE_PATH))
         self.spreadsheet_id = SPREADSHEET_ID
         # シート名のキャッシュ
         self._sheet_name_cache: Dict[str, str] = {}
-        # 最大バッチサイズ(Google Sheets APIの制限に基づく)
-        self.MAX_BATCH_SIZE = 100
-        # 1バッチあたりのユーザー数(パフォーマンステストに基づいて最適化)
-        self.USERS_PER_BATCH = 15
-        # 最大再試行回数
-        self.MAX_RETRIES = 3
-        # 同時実行数の制限
-        self.CONCURRENT_LIMIT = 3
-
-    async def write_check_results(self, updates: List[Tuple[datetime, str, bool, bool]]):
-        """
-        複数のユーザーの更新をバッチ処理で行う
-        
+        # シート名 → sheetIdの対応(ディスクにキャッシュし、知らないシート名があるときだけ取得し直す)
+        self.sheet_metadata = SheetMetadataCache(SHEET_METADATA_CACHE_PATH, self.spreadsheet_id,
+                                                 self._fetch_sheet_ids)
+        # 1回のbatchUpdateに含める最大updateCells数・最大セル数(ペイロードの上限2MBに余裕を持たせた値)
+        self.MAX_RANGES_PER_REQUEST = 500
+        self.MAX_CELLS_PER_REQUEST = 50000
+        # 1回のbatchGetで読み込む最大範囲数(GETのURL長の制限に基づく)
+        self.MAX_RANGES_PER_READ = 100
+        # 書き込み前に現在の値を読み込み、変更のないセルを書き込まない
+        self.SKIP_UNCHANGED_CELLS = True
+        # すべてのリクエストをクォータの範囲で実行するスケジューラー(同時実行数・再試行も管理する)
+        self.scheduler = SheetsRequestScheduler(
+            read_per_minute=SHEETS_READ_REQUESTS_PER_MINUTE,
+            write_per_minute=SHEETS_WRITE_REQUESTS_PER_MINUTE,
+            max_concurrency=SHEETS_CONCURRENT_LIMIT,
+            max_retries=SHEETS_MAX_RETRIES
+        )
+
+    async def write_check_results(self, updates: List[Tuple[datetime, str, bool, bool]]) -> int:
+        """
+        複数のユーザーの更新をまとめて書き込む
+
+        書き込む月のシートが存在することを確認し、対象の範囲を1回のbatchGetで読み込んで
+        変更のないセルを除いた後、同じ行の隣り合うセルを1つのupdateCells(sheetIdで指定)にまとめ
+        (連続する行で列が同じ範囲は矩形にまとめる)、APIのペイロード制限の範囲で
+        できるだけ少ないbatchUpdateで送信する
+
         Args:
             updates: (日付, ユーザーID, レポート状態, 宣言状態)のタプルのリスト
+
+        Returns:
+            送信したbatchUpdateの回数
         """
-        # シートごとに更新をグループ化
-        sheet_updates: Dict[str, List[Tuple[datetime, str, bool, bool]]] = {}
-        for update in updates:
-            date = update[0]
-            sheet_name = self._get_cached_sheet_name(date)
-            if sheet_name not in sheet_updates:
-                sheet_updates[sheet_name] = []
-            sheet_updates[sheet_name].append(update)
-
-        # 各シートの更新を並列で処理
-        tasks = []
-        for sheet_name, sheet_updates_list in sheet_updates.items():
-            tasks.append(self._process_sheet_updates(sheet_name, sheet_updates_list))
-
-        # 同時実行数を制限して実行
-        semaphore = asyncio.Semaphore(self.CONCURRENT_LIMIT)
-        async def bounded_process(task):
-            async with semaphore:
-                return await task
-        
-        results = await asyncio.gather(*[bounded_process(task) for task in tasks])
-        
+        sheet_cells = self._collect_cells(updates)
+        sheet_ids = await self._check_sheets(sheet_cells)
+        if not sheet_cells:
+            return 0
+        if self.SKIP_UNCHANGED_CELLS:
+            full_request_count = len(self._split_requests(self._coalesce_all(sheet_cells, sheet_ids)))
+            skipped_cells = await self._drop_unchanged_cells(sheet_cells)
+        update_requests = self._coalesce_all(sheet_cells, sheet_ids)
+        cell_count = sum(len(cells) for rows in sheet_cells.values() for cells in rows.values())
+        requests = self._split_requests(update_requests)
+        if self.SKIP_UNCHANGED_CELLS:
+            logging.info(f"変更のないセルをスキップ: {skipped_cells}セル "
+                         f"(省略したリクエスト: {full_request_count - len(requests)}件)")
+        if not requests:
+            return 0
+
+        # 同時実行数・クォータはスケジューラーが制限する
+        results = await asyncio.gather(*[self._execute_batch_update(request) for request in requests],
+                                       return_exceptions=True)
+        failed = [request for request, result in zip(requests, results) if self._is_stale_sheet_id_error(result)]
+        if failed:
+            # シートが削除され同じ名前で作り直された場合は、sheetIdを取得し直して1回だけ再送する
+            results = [result for result in results if not self._is_stale_sheet_id_error(result)]
+            results += await self._retry_with_new_sheet_ids(failed, sheet_ids)
+
         # エラーチェック
-        for sheet_name, result in zip(sheet_updates.keys(), results):
-            if isinstance(result, Exception):
-                logging.error(f"Failed to process sheet {sheet_name}: {str(result)}")
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            logging.error(f"Failed to write check results: {str(error)}")
+        if errors:
+            raise errors[0]
+        logging.info(f"Google Sheetsに書き込みました: {cell_count}セル / {len(update_requests)}範囲 / "
+                     f"{len(requests)}リクエスト")
+        return len(requests)
 
     async def write_check_result(self, date: datetime, user_id: str, report_status: bool, declaration_status: bool):
         """
@@ -72,76 +111,232 @@ class SheetsHandler:
         updates = [(date, user_id, report_status, declaration_status)]
         await self.write_check_results(updates)
 
-    async def _process_sheet_updates(self, sheet_name: str, updates: List[Tuple[datetime, str, bool, bool]]) -> bool:
+    def _collect_cells(self, updates: List[Tuple[datetime, str, bool, bool]]) -> Dict[str, Dict[int, Dict[int, str]]]:
         """
-        1つのシートの更新を処理する
+        更新をシート名 → 行 → 列インデックス → 値にまとめる(同じセルは後の更新を優先する)
         """
+        sheet_cells: Dict[str, Dict[int, Dict[int, str]]] = {}
+        for date, user_id, report_status, declaration_status in updates:
+            entry = ROSTER.find(user_id)
+            if entry is None:
+                logging.error(f"Unknown user_id: {user_id}")
+                continue
+
+            sheet_name = self._get_cached_sheet_name(date)
+            row_cells = sheet_cells.setdefault(sheet_name, {}).setdefault(self._get_row_index(date), {})
+            row_cells[entry.report_index] = "提出" if report_status else "なし"
+            row_cells[entry.declaration_index] = "提出" if declaration_status else "なし"
+        return sheet_cells
+
+    async def _check_sheets(self, sheet_cells: Dict[str, Dict[int, Dict[int, str]]]) -> Dict[str, int]:
+        """
+        書き込む月のシートのsheetIdを求め、存在しないシートのセルをsheet_cellsから取り除く
+
+        Returns:
+            シート名 → sheetId
+        """
+        if not sheet_cells:
+            return {}
+        sheet_ids = await self.sheet_metadata.resolve(sheet_cells.keys())
+        for sheet_name in [sheet_name for sheet_name in sheet_cells if sheet_name not in sheet_ids]:
+            cells = sum(len(row_cells) for row_cells in sheet_cells.pop(sheet_name).values())
+            logging.error(f"シート「{sheet_name}」が見つからないため、{cells}セルを書き込めません")
+        return sheet_ids
+
+    @staticmethod
+    def _is_stale_sheet_id_error(error) -> bool:
+        """キャッシュしたsheetIdのシートが存在しない場合のエラー(No grid with id)"""
+        return isinstance(error, SheetsApiError) and error.status == 400 and 'grid' in str(error).lower()
+
+    async def _retry_with_new_sheet_ids(self, failed: List[List[Dict]], sheet_ids: Dict[str, int]) -> List[Any]:
+        """
+        シートの一覧を取得し直し、失敗したリクエストのsheetIdを新しいものに置き換えて再送する
+
+        Returns:
+            再送したリクエストごとの結果(失敗した場合は例外)
+        """
+        logging.warning(f"キャッシュしたsheetIdが無効なため、シート情報を取得し直して{len(failed)}リクエストを再送します")
+        new_sheet_ids = await self.sheet_metadata.refresh()
+        id_map = {sheet_id: new_sheet_ids[title] for title, sheet_id in sheet_ids.items() if title in new_sheet_ids}
+        retry_requests = []
+        for request in failed:
+            retry_request = []
+            for update_request in request:
+                grid = update_request['updateCells']['range']
+                if grid['sheetId'] not in id_map:
+                    logging.error(f"sheetId {grid['sheetId']} のシートが見つからないため書き込めません")
+                    continue
+                retry_request.append({'updateCells': dict(update_request['updateCells'],
+                                                          range=dict(grid, sheetId=id_map[grid['sheetId']]))})
+            if retry_request:
+                retry_requests.append(retry_request)
+        return await asyncio.gather(*[self._execute_batch_update(request) for request in retry_requests],
+                                    return_exceptions=True)
+
+    async def _fetch_sheet_ids(self) -> Dict[str, int]:
+        """スプレッドシートのシート名 → sheetIdを取得する"""
+        response = await self.scheduler.submit('read', lambda: self.client.get_sheet_properties(self.spreadsheet_id))
+        return {sheet['properties']['title']: sheet['properties']['sheetId'] for sheet in response.get('sheets', [])}
+
+    async def _drop_unchanged_cells(self, sheet_cells: Dict[str, Dict[int, Dict[int, str]]]) -> int:
+        """
+        書き込む範囲の現在の値をbatchGetで読み込み、値が同じセルをsheet_cellsから取り除く
+
+        読み込みに失敗した場合は何も取り除かない(すべてのセルを書き込む)
+
+        Returns:
+            取り除いたセル数
+        """
+        blocks = [(sheet_name, block) for sheet_name, rows in sheet_cells.items()
+                  for block in self._coalesce_blocks(rows)]
         try:
-            # 更新をバッチに分割
-            batches = [updates[i:i + self.USERS_PER_BATCH] 
-                      for i in range(0, len(updates), self.USERS_PER_BATCH)]
-            
-            # 各バッチを処理
-            for batch in batches:
-                batch_updates = self._prepare_batch_updates(sheet_name, batch)
-                await self._execute_batch_update(batch_updates)
-            
-            return True
+            current_ranges = []
+            for i in range(0, len(blocks), self.MAX_RANGES_PER_READ):
+                current_ranges.extend(await self._execute_batch_get(
+                    [self._block_range(sheet_name, block) for sheet_name, block in blocks[i:i + self.MAX_RANGES_PER_READ]]
+                ))
         except Exception as e:
-            logging.error(f"Error processing sheet {sheet_name}: {str(e)}")
-            return False
+            logging.warning(f"現在の値の読み込みに失敗したため、すべてのセルを書き込みます: {str(e)}")
+            return 0
+
+        skipped = 0
+        for (sheet_name, (first_row, _, first_col, _, values)), current_values in zip(blocks, current_ranges):
+            rows = sheet_cells[sheet_name]
+            for row_offset, row_values in enumerate(values):
+                row = first_row + row_offset
+                current_row = current_values[row_offset] if row_offset < len(current_values) else []
+                for col_offset, value in enumerate(row_values):
+                    # 末尾の空のセルは読み込み結果に含まれない
+                    current = current_row[col_offset] if col_offset < len(current_row) else ""
+                    if current == value:
+                        del rows[row][first_col + col_offset]
+                        skipped += 1
 
-    def _prepare_batch_updates(self, sheet_name: str, batch: List[Tuple[datetime, str, bool, bool]]) -> List[Dict]:
+        # 書き込むセルがなくなった行・シートを取り除く
+        for sheet_name in list(sheet_cells):
+            rows = sheet_cells[sheet_name]
+            for row in [row for row, cells in rows.items() if not cells]:
+                del rows[row]
+            if not rows:
+                del sheet_cells[sheet_name]
+        return skipped
+
+    def _coalesce_all(self, sheet_cells: Dict[str, Dict[int, Dict[int, str]]], sheet_ids: Dict[str, int]) -> List[Dict]:
+        """全シートのセルをupdateCellsのリクエストにまとめる"""
+        update_requests = []
+        for sheet_name, rows in sheet_cells.items():
+            update_requests.extend(self._update_cells_requests(sheet_ids[sheet_name], rows))
+        return update_requests
+
+    def _update_cells_requests(self, sheet_id: int, rows: Dict[int, Dict[int, str]]) -> List[Dict]:
+        """1つのシートのセルを、矩形の範囲ごとにsheetIdで指定したupdateCellsにまとめる"""
+        update_requests = []
+        for first_row, last_row, first_col, last_col, values in self._coalesce_blocks(rows):
+            update_requests.append({
+                'updateCells': {
+                    # GridRangeの行・列は0始まりで、終了は含まない
+                    'range': {
+                        'sheetId': sheet_id,
+                        'startRowIndex': first_row - 1,
+                        'endRowIndex': last_row,
+                        'startColumnIndex': first_col,
+                        'endColumnIndex': last_col + 1
+                    },
+                    'rows': [{'values': [{'userEnteredValue': {'stringValue': value}} for value in row_values]}
+                             for row_values in values],
+                    'fields': 'userEnteredValue'
+                }
+            })
+        return update_requests
+
+    def _block_range(self, sheet_name: str, block: List[Any]) -> str:
+        """[開始行, 終了行, 開始列, 終了列, 値]の範囲をA1表記にする"""
+        first_row, last_row, first_col, last_col, _ = block
+        cell_range = f"{self._index_to_column(first_col)}{first_row}"
+        if (first_row, first_col) != (last_row, last_col):
+            cell_range += f":{self._index_to_column(last_col)}{last_row}"
+        return f"'{sheet_name}'!{cell_range}"
+
+    def _coalesce_blocks(self, rows: Dict[int, Dict[int, str]]) -> List[List[Any]]:
         """
-        バッチ更新のデータを準備する
+        各行の連続する列を1つの範囲にし、直前の行と列の範囲が同じ場合は矩形に広げる
+
+        Returns:
+            [開始行, 終了行, 開始列, 終了列, 値]のリスト
         """
-        updates = []
-        for date, user_id, report_status, declaration_status in batch:
-            row = self._get_row_index(date)
-            columns = USER_COLUMNS.get(user_id)
-            
-            if not columns:
-                logging.error(f"Unknown user_id: {user_id}")
-                continue
+        blocks: List[List[Any]] = []
+        open_blocks: Dict[Tuple[int, int], List[Any]] = {}
+        for row in sorted(rows):
+            next_open_blocks = {}
+            for first_col, last_col, values in self._row_spans(rows[row]):
+                block = open_blocks.get((first_col, last_col))
+                if block is not None and block[1] == row - 1:
+                    block[1] = row
+                    block[4].append(values)
+                else:
+                    block = [row, row, first_col, last_col, [values]]
+                    blocks.append(block)
+                next_open_blocks[(first_col, last_col)] = block
+            open_blocks = next_open_blocks
+        return blocks
 
-            updates.extend([
-                {
-                    'range': f"'{sheet_name}'!{columns['report']}{row}",
-                    'values': [["提出" if report_status else "なし"]]
-                },
-                {
-                    'range': f"'{sheet_name}'!{columns['declaration']}{row}",
-                    'values': [["提出" if declaration_status else "なし"]]
-                }
-            ])
-        
-        return updates
+    @staticmethod
+    def _row_spans(cells: Dict[int, str]) -> List[Tuple[int, int, List[str]]]:
+        """1行のセルを連続する列ごとに(開始列, 終了列, 値)にまとめる"""
+        spans = []
+        for col in sorted(cells):
+            if spans and spans[-1][1] == col - 1:
+                spans[-1][1] = col
+                spans[-1][2].append(cells[col])
+            else:
+                spans.append([col, col, [cells[col]]])
+        return [tuple(span) for span in spans]
 
-    async def _execute_batch_update(self, updates: List[Dict], attempt: int = 0) -> bool:
+    def _split_requests(self, update_requests: List[Dict]) -> List[List[Dict]]:
+        """updateCells数・セル数の上限を超えないようにbatchUpdateのリクエストに分割する"""
+        requests: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_cells = 0
+        for update_request in update_requests:
+            cells = sum(len(row['values']) for row in update_request['updateCells']['rows'])
+            if current and (len(current) >= self.MAX_RANGES_PER_REQUEST
+                            or current_cells + cells > self.MAX_CELLS_PER_REQUEST):
+                requests.append(current)
+                current, current_cells = [], 0
+            current.append(update_request)
+            current_cells += cells
+        if current:
+            requests.append(current)
+        return requests
+
+    async def _execute_batch_update(self, update_requests: List[Dict]) -> bool:
         """
-        バッチ更新を実行し、必要に応じて再試行する
+        バッチ更新を実行する(クォータ超過・一時的なエラーはスケジューラーが再試行する)
         """
-        try:
-            data = {
-                'valueInputOption': 'USER_ENTERED',
-                'data': updates
-            }
-
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.service.spreadsheets().values().batchUpdate(
-                    spreadsheetId=self.spreadsheet_id,
-                    body=data
-                ).execute()
-            )
-            return True
+        data = {'requests': update_requests}
+        await self.scheduler.submit('write', lambda: self.client.batch_update(self.spreadsheet_id, data))
+        return True
 
-        except Exception as e:
-            if attempt < self.MAX_RETRIES:
-                await asyncio.sleep(2 ** attempt)  # 指数バックオフ
-                return await self._execute_batch_update(updates, attempt + 1)
-            raise e
+    async def _execute_batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        """
+        複数の範囲の現在の値を1回のbatchGetで読み込む
+
+        Returns:
+            範囲ごとの値(行のリスト)
+        """
+        response = await self.scheduler.submit(
+            'read', lambda: self.client.values_batch_get(self.spreadsheet_id, ranges, major_dimension='ROWS')
+        )
+        return [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+
+    async def close(self):
+        """HTTPセッションを閉じる"""
+        metrics = self.scheduler.metrics()
+        if metrics['requests']:
+            logging.info(f"Sheets APIのリクエスト: {metrics['requests']}件 (再試行 {metrics['retries']}件, "
+                         f"クォータ待ち {metrics['throttled']}件 / {metrics['throttled_seconds']}秒, "
+                         f"最大待ち行列 {metrics['max_queue_depth']}件)")
+        await self.client.close()
 
     def _get_cached_sheet_name(self, date: datetime) -> str:
         """
@@ -160,4 +355,12 @@ class SheetsHandler:
 
     def _column_to_index(self, column: str) -> int:
         return sum((ord(char) - ord('A') + 1) * (26 ** i) 
-                for i, char in enumerate(reversed(column))) - 1
\ No newline at end of file
+                for i, char in enumerate(reversed(column))) - 1
+
+    def _index_to_column(self, index: int) -> str:
+        index += 1
+        column = ""
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            column = chr(ord('A') + remainder) + column
+        return column
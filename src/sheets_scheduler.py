@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import aiohttp
+
+from src.sheets_client import SheetsApiError
+
+T = TypeVar('T')
+
+# 再試行するHTTPステータス(クォータ超過・一時的なサーバーエラー)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    1分あたりのリクエスト数の上限を守るトークンバケット
+
+    トークンは1分あたりrate_per_minute個の速さで補充され、最大でcapacity個までたまる
+    """
+
+    def __init__(self, rate_per_minute: int, capacity: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate_per_second = rate_per_minute / 60
+        # 上限いっぱいのバーストを許すと直近1分間の上限を超えるため、既定では1/6にする
+        self.capacity = capacity or max(1, rate_per_minute // 6)
+        self.clock = clock
+        self.tokens = float(self.capacity)
+        self.updated_at = clock()
+        # サーバーから待機を指示された場合の再開時刻
+        self.paused_until = 0.0
+
+    def reserve(self) -> float:
+        """
+        トークンを1つ予約し、使えるようになるまでの待ち時間(秒)を返す
+
+        トークンが足りない場合は残高がマイナスになり、後の予約ほど待ち時間が長くなる
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate_per_second if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        """サーバーから待機を指示された場合に、このバケットのリクエストをすべて止める"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+class SheetsRequestScheduler:
+    """
+    Sheets APIへのすべてのリクエストを通すスケジューラー
+
+    読み込み・書き込みごとに1分あたりのクォータをトークンバケットで守り、同時実行数を制限する。
+    429や一時的なエラーの場合は、Retry-Afterがあればその秒数以上、なければ指数バックオフに
+    ジッターを加えた時間だけ待って再試行する
+    """
+
+    def __init__(self, read_per_minute: int = 60, write_per_minute: int = 60, max_concurrency: int = 3,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 64.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.buckets = {
+            'read': TokenBucket(read_per_minute, clock=clock),
+            'write': TokenBucket(write_per_minute, clock=clock),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        # 実行ごとに作り直さず、すべての呼び出しで共有する
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.request_count = 0
+        self.throttled_count = 0
+        self.throttled_seconds = 0.0
+        self.retry_count = 0
+
+    async def submit(self, kind: str, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        クォータの範囲でリクエストを実行する
+
+        Args:
+            kind: 'read' または 'write'
+            call: リクエストを実行するコルーチン関数(再試行のたびに呼び出す)
+        """
+        bucket = self.buckets[kind]
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            attempt = 0
+            while True:
+                wait = bucket.reserve()
+                if wait > 0:
+                    self.throttled_count += 1
+                    self.throttled_seconds += wait
+                    await self.sleep(wait)
+                async with self._semaphore:
+                    self.request_count += 1
+                    try:
+                        return await call()
+                    except (SheetsApiError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if attempt >= self.max_retries or not self._is_retryable(e):
+                            raise
+                        error = e
+                delay = self._backoff(attempt, error)
+                self.retry_count += 1
+                attempt += 1
+                logging.warning(f"Sheets APIのリクエストを{delay:.1f}秒後に再試行します "
+                                f"({attempt}/{self.max_retries}): {str(error)}")
+                if getattr(error, 'status', None) == 429:
+                    # クォータ超過は同じ種類のリクエストすべてを止める(次の予約で待つ)
+                    bucket.pause(delay)
+                else:
+                    await self.sleep(delay)
+        finally:
+            self.queue_depth -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """待ち行列の長さ・スロットリングの回数などの指標"""
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'requests': self.request_count,
+            'throttled': self.throttled_count,
+            'throttled_seconds': round(self.throttled_seconds, 2),
+            'retries': self.retry_count,
+        }
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, SheetsApiError):
+            return error.status in RETRYABLE_STATUSES
+        return True
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """指数バックオフにジッターを加えた待ち時間(Retry-Afterがあればそれ以上)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                # HTTP日付形式の場合は指数バックオフだけを使う
+                pass
+        return delay
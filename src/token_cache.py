@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+class TokenCache:
+    """
+    Sheets APIのアクセストークンをファイルに保存し、次回の起動時に有効期限内であれば使い回す
+
+    形式: {"account": サービスアカウントのメールアドレス, "token": アクセストークン, "expiry": 有効期限(UTC)}
+    """
+
+    def __init__(self, cache_path: Path, margin_seconds: int = 300):
+        self.cache_path = Path(cache_path)
+        # 有効期限までの残りがこの秒数より短いトークンは使わない
+        self.margin_seconds = margin_seconds
+
+    def load(self, credentials) -> bool:
+        """有効期限内のトークンがあれば認証情報に設定してTrueを返す"""
+        if not self.cache_path.exists():
+            return False
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            expiry = datetime.fromisoformat(entry['expiry'])
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"アクセストークンのキャッシュを読み込めませんでした: {str(e)}")
+            return False
+
+        if entry.get('account') != getattr(credentials, 'service_account_email', None):
+            return False
+        # google-authの有効期限はタイムゾーンなしのUTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if expiry - timedelta(seconds=self.margin_seconds) <= now:
+            return False
+        credentials.token = entry['token']
+        credentials.expiry = expiry
+        return True
+
+    def clear(self) -> None:
+        """キャッシュしたトークンを削除する(APIに拒否された場合)"""
+        try:
+            self.cache_path.unlink(missing_ok=True)
+        except OSError as e:
+            logging.warning(f"アクセストークンのキャッシュを削除できませんでした: {str(e)}")
+
+    def save(self, credentials) -> None:
+        if not credentials.token or not credentials.expiry:
+            return
+        entry = {
+            'account': getattr(credentials, 'service_account_email', None),
+            'token': credentials.token,
+            'expiry': credentials.expiry.isoformat()
+        }
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # トークンを含むため所有者だけが読めるようにする
+            fd = os.open(self.cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+        except OSError as e:
+            logging.warning(f"アクセストークンのキャッシュを保存できませんでした: {str(e)}")
@@ -0,0 +1,85 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import pytz
+from discord.utils import time_snowflake
+
+JST = pytz.timezone('Asia/Tokyo')
+# 検索範囲の日数(検索開始日の0:00 JSTから2日後の0:00 JSTまで)
+SEARCH_DAYS = 2
+
+
+class SearchWindow(NamedTuple):
+    """
+    1つの対象日の検索範囲
+
+    メッセージの判定はスノーフレークID同士の整数比較(after_id < id < before_id)で行う
+    """
+    start_utc: datetime
+    end_utc: datetime
+    after_id: int
+    before_id: int
+
+    @classmethod
+    def between(cls, start_utc: datetime, end_utc: datetime) -> 'SearchWindow':
+        """UTCの開始・終了日時から検索範囲を作成する(両端を含まない)"""
+        return cls(
+            start_utc=start_utc,
+            end_utc=end_utc,
+            after_id=time_snowflake(start_utc, high=True),
+            before_id=time_snowflake(end_utc, high=False)
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return self.start_utc >= self.end_utc
+
+    def contains(self, message_id: int) -> bool:
+        return self.after_id < message_id < self.before_id
+
+
+class WindowPlanner:
+    """
+    実行ごとに1回だけ検索範囲を計算するプランナー
+
+    現在時刻は作成時に1回だけ取得し、(検索開始日)ごとの検索範囲をキャッシュする
+    """
+
+    def __init__(self, now: Optional[datetime] = None, cap_at_now: bool = True):
+        """
+        Args:
+            now: 検索終了日時の上限とする現在時刻(省略時は作成時の時刻)
+            cap_at_now: Falseの場合は検索終了日時を現在時刻で打ち切らない(常駐モード用)
+        """
+        self.now = now or datetime.now(JST)
+        self.cap_at_now = cap_at_now
+        self._windows: Dict[date, SearchWindow] = {}
+
+    def window(self, search_date: date) -> SearchWindow:
+        """検索開始日の0:00 JSTから2日後の0:00 JST(または現在時刻)までの検索範囲"""
+        if search_date not in self._windows:
+            start_jst = JST.localize(datetime.combine(search_date, datetime.min.time()))
+            end_jst = JST.localize(datetime.combine(search_date + timedelta(days=SEARCH_DAYS), datetime.min.time()))
+            if self.cap_at_now:
+                end_jst = min(self.now, end_jst)
+            self._windows[search_date] = SearchWindow.between(start_jst.astimezone(pytz.utc),
+                                                              end_jst.astimezone(pytz.utc))
+        return self._windows[search_date]
+
+    def plan(self, target_dates: Iterable[date], date_offset: int) -> Dict[date, SearchWindow]:
+        """
+        チャンネルの対象日ごとの検索範囲を返す
+
+        Args:
+            target_dates: 対象日のリスト
+            date_offset: 対象日から検索開始日までの日数(日報: 0, 宣言: -1)
+        """
+        windows = {}
+        for target_date in target_dates:
+            search_date = target_date + timedelta(days=date_offset)
+            window = self.window(search_date)
+            logging.debug("対象日: %s 検索範囲: %s 〜 %s JST", target_date,
+                          window.start_utc.astimezone(JST), window.end_utc.astimezone(JST))
+            windows[target_date] = window
+        return windows
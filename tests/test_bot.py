@@ -0,0 +1,125 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from config.config import DECLARATION_CHANNEL_ID, REPORT_CHANNEL_ID
+from src.bot import ReportBot
+from src.name_cache import UserNameCache
+
+
+class BotTestCase(unittest.IsolatedAsyncioTestCase):
+    """ReportBotを書き込み先やローカルデータ(アーカイブ・メモ・送信待ちファイル)なしで作成するテストの基底クラス"""
+
+    def setUp(self):
+        for target, value in [('src.bot.MESSAGE_ARCHIVE_ENABLED', False), ('src.bot.DATE_MEMO_PERSIST', False),
+                              ('src.bot.OUTBOX_ENABLED', False)]:
+            patcher = patch(target, value)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+        patcher = patch('src.bot.create_result_sink')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+
+class BlockingChannel:
+    """history()がgateの解放まで待つテスト用チャンネル(同時に走査中のチャンネル数を記録する)"""
+
+    def __init__(self, channel_id: int, tracker: dict, gate: asyncio.Event):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.threads = []
+        self.tracker = tracker
+        self.gate = gate
+        self.started = asyncio.Event()
+
+    async def history(self, after=None, before=None, limit=None, oldest_first=True):
+        self.started.set()
+        self.tracker['active'] += 1
+        self.tracker['max_active'] = max(self.tracker['max_active'], self.tracker['active'])
+        try:
+            await self.gate.wait()
+        finally:
+            self.tracker['active'] -= 1
+        return
+        yield
+
+
+class FakeGuild:
+    """メンバーキャッシュと一括取得を持つテスト用サーバー"""
+
+    def __init__(self, cached_members, queried_members):
+        self.cached_members = cached_members
+        self.query_members = AsyncMock(return_value=[
+            SimpleNamespace(id=member_id, name=name) for member_id, name in queried_members.items()
+        ])
+
+    def get_member(self, member_id):
+        name = self.cached_members.get(member_id)
+        return SimpleNamespace(id=member_id, name=name) if name else None
+
+
+class TestScanChannels(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = {'active': 0, 'max_active': 0}
+        self.gate = asyncio.Event()
+        self.channels = [BlockingChannel(channel_id, self.tracker, self.gate)
+                         for channel_id in (REPORT_CHANNEL_ID, DECLARATION_CHANNEL_ID)]
+
+    async def test_channels_are_scanned_concurrently(self):
+        bot = ReportBot(target_date=date(2025, 1, 28), scan_concurrency=2)
+        scan = asyncio.create_task(bot._scan_channels(self.channels))
+
+        # 両方のチャンネルの履歴取得が同時に始まる
+        await asyncio.wait_for(asyncio.gather(*[channel.started.wait() for channel in self.channels]), timeout=1)
+        self.gate.set()
+        results = await scan
+
+        self.assertEqual(self.tracker['max_active'], 2)
+        self.assertEqual(set(results), {REPORT_CHANNEL_ID, DECLARATION_CHANNEL_ID})
+
+    async def test_scan_concurrency_limits_channels_in_flight(self):
+        bot = ReportBot(target_date=date(2025, 1, 28), scan_concurrency=1)
+        scan = asyncio.create_task(bot._scan_channels(self.channels))
+
+        await asyncio.wait_for(self.channels[0].started.wait(), timeout=1)
+        await asyncio.sleep(0.05)
+        # 1つ目の走査が終わるまで2つ目は始まらない
+        self.assertFalse(self.channels[1].started.is_set())
+        self.gate.set()
+        await scan
+
+        self.assertTrue(self.channels[1].started.is_set())
+        self.assertEqual(self.tracker['max_active'], 1)
+
+
+class TestUserNameResolution(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_path = Path(tmp_dir.name) / 'user_names.json'
+        self.bot = ReportBot()
+        self.bot.user_name_cache = UserNameCache(self.cache_path, ttl_seconds=60)
+
+    async def test_resolves_from_cache_member_cache_and_bulk_query(self):
+        self.bot.user_name_cache.update({"1": "cached"})
+        guild = FakeGuild(cached_members={2: "member"}, queried_members={3: "queried"})
+
+        names = await self.bot._fetch_user_names(["1", "2", "3", "4"], guild)
+
+        self.assertEqual(names, {"1": "cached", "2": "member", "3": "queried", "4": "4"})
+        # キャッシュにないユーザーだけを1回の一括取得で問い合わせる
+        guild.query_members.assert_awaited_once_with(user_ids=[3, 4], limit=100, cache=False)
+
+        # 次回の実行ではディスクキャッシュだけで解決する
+        reloaded = UserNameCache(self.cache_path, ttl_seconds=60)
+        self.assertEqual(reloaded.get_many(["2", "3"]), {"2": "member", "3": "queried"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import discord
+import pytz
+from discord.utils import time_snowflake
+
+from src.channel_scanner import ChannelScanner
+from src.window_planner import SearchWindow, WindowPlanner
+
+
+def _message(author_id: int, content: str, created_at: datetime):
+    return SimpleNamespace(
+        id=time_snowflake(created_at) + author_id,
+        channel=SimpleNamespace(id=1),
+        author=SimpleNamespace(id=author_id, name=f"user{author_id}"),
+        content=content,
+        created_at=created_at,
+        thread=None
+    )
+
+
+class FakeChannel:
+    """history()の呼び出し回数を記録するテスト用チャンネル"""
+
+    def __init__(self, messages):
+        self.id = 1
+        self.name = "fake-channel"
+        self.messages = messages
+        self.history_calls = 0
+        self.yielded_count = 0
+
+    async def history(self, after=None, before=None, limit=None, oldest_first=True):
+        self.history_calls += 1
+        for message in self.messages:
+            if after.id < message.id < before.id:
+                self.yielded_count += 1
+                yield message
+
+
+class FakeThread(FakeChannel):
+    def __init__(self, thread_id: int, messages, archive_timestamp=None):
+        super().__init__(messages)
+        self.id = thread_id
+        self.name = f"thread-{thread_id}"
+        self.archive_timestamp = archive_timestamp
+        self.last_message_id = messages[-1].id if messages else None
+
+
+class TestChannelScanner(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.target_date = date(2025, 1, 28)
+        self.start = datetime(2025, 1, 27, 15, 0, tzinfo=pytz.utc)
+        self.end = self.start + timedelta(days=2)
+        self.windows = {self.target_date: SearchWindow.between(self.start, self.end)}
+
+    async def test_scan_resolves_all_users_in_one_pass(self):
+        base = self.start + timedelta(hours=1)
+        channel = FakeChannel([
+            _message(111, "雑談", base),
+            _message(111, "1/28 日報", base + timedelta(minutes=1)),
+            _message(222, "1/27 日報", base + timedelta(minutes=2)),
+            _message(999, "1/28 日報", base + timedelta(minutes=3)),
+        ])
+        scanner = ChannelScanner(["111", "222", "333"])
+
+        results = await scanner.scan(channel, self.windows)
+
+        self.assertEqual(results, {self.target_date: {"111": True, "222": False, "333": False}})
+        self.assertEqual(channel.history_calls, 1)
+
+    async def test_scan_stops_once_every_user_is_resolved(self):
+        base = self.start + timedelta(hours=1)
+        channel = FakeChannel([
+            _message(111, "1/28 日報", base),
+            _message(222, "1/28 日報", base + timedelta(minutes=1)),
+        ] + [
+            _message(111, "雑談", base + timedelta(minutes=2 + i)) for i in range(300)
+        ])
+        scanner = ChannelScanner(["111", "222"])
+
+        results = await scanner.scan(channel, self.windows)
+
+        self.assertEqual(results, {self.target_date: {"111": True, "222": True}})
+        self.assertEqual(channel.yielded_count, 2)
+
+    async def test_scan_includes_thread_replies(self):
+        base = self.start + timedelta(hours=1)
+        active_thread = FakeThread(time_snowflake(base), [
+            _message(222, "1/28 日報", base + timedelta(minutes=5)),
+        ])
+        archived_thread = FakeThread(time_snowflake(base) + 1, [
+            _message(333, "1/28 日報", base + timedelta(minutes=6)),
+        ], archive_timestamp=base + timedelta(hours=3))
+        channel = FakeChannel([
+            _message(111, "1/28 日報", base),
+        ])
+        channel.threads = [active_thread]
+
+        async def archived_threads(limit=None):
+            yield archived_thread
+        channel.archived_threads = archived_threads
+        scanner = ChannelScanner(["111", "222", "333"], thread_concurrency=2)
+
+        results = await scanner.scan(channel, self.windows)
+
+        self.assertEqual(results, {self.target_date: {"111": True, "222": True, "333": True}})
+        self.assertEqual(active_thread.history_calls, 1)
+        self.assertEqual(archived_thread.history_calls, 1)
+
+    async def test_scan_reads_channel_when_thread_discovery_fails(self):
+        base = self.start + timedelta(hours=1)
+        active_thread = FakeThread(time_snowflake(base), [
+            _message(222, "1/28 日報", base + timedelta(minutes=5)),
+        ])
+        channel = FakeChannel([
+            _message(111, "1/28 日報", base),
+        ])
+        channel.threads = [active_thread]
+
+        async def archived_threads(limit=None):
+            raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Missing Access")
+            yield
+        channel.archived_threads = archived_threads
+        scanner = ChannelScanner(["111", "222"])
+
+        with self.assertLogs(level='ERROR'):
+            results = await scanner.scan(channel, self.windows)
+
+        self.assertEqual(results, {self.target_date: {"111": True, "222": True}})
+        self.assertEqual(channel.history_calls, 1)
+        self.assertEqual(active_thread.history_calls, 1)
+
+    async def test_scan_ignores_messages_outside_window(self):
+        channel = FakeChannel([
+            _message(111, "1/28 日報", self.end + timedelta(minutes=1)),
+        ])
+        scanner = ChannelScanner(["111"])
+
+        results = await scanner.scan(channel, self.windows)
+
+        self.assertEqual(results, {self.target_date: {"111": False}})
+
+    async def test_scan_evaluates_each_date_within_its_own_window(self):
+        next_date = self.target_date + timedelta(days=1)
+        windows = {
+            self.target_date: SearchWindow.between(self.start, self.end),
+            next_date: SearchWindow.between(self.start + timedelta(days=1), self.end + timedelta(days=1)),
+        }
+        channel = FakeChannel([
+            # 1/29の範囲外(1/28の範囲内)に投稿された1/29の日報は数えない
+            _message(111, "1/29 日報", self.start + timedelta(hours=1)),
+            _message(111, "1/28 日報", self.start + timedelta(hours=2)),
+            _message(222, "1/29 日報", self.start + timedelta(days=1, hours=1)),
+        ])
+        scanner = ChannelScanner(["111", "222"])
+
+        results = await scanner.scan(channel, windows)
+
+        self.assertEqual(results, {
+            self.target_date: {"111": True, "222": False},
+            next_date: {"111": False, "222": True},
+        })
+        self.assertEqual(channel.history_calls, 1)
+
+
+class TestWindowPlanner(unittest.TestCase):
+    def test_plan_computes_jst_bounds_and_snowflakes_once(self):
+        now = pytz.timezone('Asia/Tokyo').localize(datetime(2025, 1, 29, 12, 0))
+        planner = WindowPlanner(now=now)
+
+        windows = planner.plan([date(2025, 1, 28), date(2025, 1, 29)], date_offset=-1)
+
+        first = windows[date(2025, 1, 28)]
+        self.assertEqual(first.start_utc, datetime(2025, 1, 26, 15, 0, tzinfo=pytz.utc))
+        self.assertEqual(first.end_utc, datetime(2025, 1, 28, 15, 0, tzinfo=pytz.utc))
+        self.assertEqual(first.after_id, time_snowflake(first.start_utc, high=True))
+        self.assertEqual(first.before_id, time_snowflake(first.end_utc, high=False))
+        # 2日後の0:00より現在時刻が前の場合は現在時刻で打ち切る
+        self.assertEqual(windows[date(2025, 1, 29)].end_utc, now.astimezone(pytz.utc))
+        # 同じ検索開始日の範囲は使い回す
+        self.assertIs(planner.plan([date(2025, 1, 29)], date_offset=0)[date(2025, 1, 29)],
+                      planner.window(date(2025, 1, 29)))
+        self.assertFalse(first.contains(first.after_id))
+        self.assertTrue(first.contains(first.after_id + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
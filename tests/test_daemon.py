@@ -0,0 +1,117 @@
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytz
+from discord.utils import time_snowflake
+
+from config.config import DECLARATION_CHANNEL_ID, REPORT_CHANNEL_ID, USER_COLUMNS
+from src.daemon import ReportDaemon
+from test_bot import BotTestCase
+
+
+class FakeChannel:
+    """history()で指定したメッセージを返すテスト用チャンネル"""
+
+    def __init__(self, channel_id: int, messages):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.threads = []
+        self.messages = messages
+
+    async def history(self, after=None, before=None, limit=None, oldest_first=True):
+        for message in self.messages:
+            if after.id < message.id < before.id:
+                yield message
+
+
+class TestReportDaemon(BotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.daemon = ReportDaemon()
+        self.daemon.result_sink.write_check_results = AsyncMock()
+        channels = {
+            REPORT_CHANNEL_ID: SimpleNamespace(id=REPORT_CHANNEL_ID, name="report"),
+            DECLARATION_CHANNEL_ID: SimpleNamespace(id=DECLARATION_CHANNEL_ID, name="declaration"),
+        }
+        self.daemon.get_channel = channels.get
+        self.user_id = list(USER_COLUMNS.keys())[0]
+        self.today = self.daemon.target_dates[1]
+        # 当日の正午(JST)に投稿されたメッセージ
+        noon = pytz.timezone('Asia/Tokyo').localize(datetime.combine(self.today, datetime.min.time()) + timedelta(hours=12))
+        self.message_id = time_snowflake(noon)
+
+    async def test_message_and_edit_update_only_changed_cells(self):
+        content = f"{self.today.month}/{self.today.day} 日報"
+        self.daemon._evaluate(self.message_id, REPORT_CHANNEL_ID, int(self.user_id), content)
+
+        self.assertEqual(self.daemon._dirty, {(self.today, self.user_id)})
+        await self.daemon._flush()
+        check_time = datetime.combine(self.today, datetime.min.time())
+        self.daemon.result_sink.write_check_results.assert_awaited_once_with(
+            [(check_time, self.user_id, True, False)]
+        )
+
+        # 日付を消す編集で×に戻る
+        self.daemon._evaluate(self.message_id, REPORT_CHANNEL_ID, int(self.user_id), "日報")
+        self.assertEqual(self.daemon._dirty, {(self.today, self.user_id)})
+        await self.daemon._flush()
+        self.daemon.result_sink.write_check_results.assert_awaited_with(
+            [(check_time, self.user_id, False, False)]
+        )
+
+    async def _seed_with_report(self, content: str) -> int:
+        """前日の正午(JST)の報告を含む履歴で状態表を作成し、そのメッセージIDを返す"""
+        yesterday = self.daemon.target_dates[0]
+        posted_at = pytz.timezone('Asia/Tokyo').localize(
+            datetime.combine(yesterday, datetime.min.time()) + timedelta(hours=12)).astimezone(pytz.utc)
+        message = SimpleNamespace(id=time_snowflake(posted_at), channel=SimpleNamespace(id=REPORT_CHANNEL_ID),
+                                  author=SimpleNamespace(id=int(self.user_id)), content=content, created_at=posted_at)
+        channels = {
+            REPORT_CHANNEL_ID: FakeChannel(REPORT_CHANNEL_ID, [message]),
+            DECLARATION_CHANNEL_ID: FakeChannel(DECLARATION_CHANNEL_ID, []),
+        }
+        self.daemon.get_channel = channels.get
+        await self.daemon._seed_status_table()
+        self.daemon._dirty = set()
+        self.assertTrue(self.daemon._status(REPORT_CHANNEL_ID, yesterday, self.user_id))
+        return message.id
+
+    async def test_seeded_message_can_be_edited_back_to_unchecked(self):
+        yesterday = self.daemon.target_dates[0]
+        message_id = await self._seed_with_report(f"{yesterday.month}/{yesterday.day} 日報")
+
+        self.daemon._evaluate(message_id, REPORT_CHANNEL_ID, int(self.user_id), "日報")
+
+        self.assertFalse(self.daemon._status(REPORT_CHANNEL_ID, yesterday, self.user_id))
+        self.assertEqual(self.daemon._dirty, {(yesterday, self.user_id)})
+
+    async def test_seeded_message_can_be_deleted(self):
+        yesterday = self.daemon.target_dates[0]
+        message_id = await self._seed_with_report(f"{yesterday.month}/{yesterday.day} 日報")
+
+        await self.daemon.on_raw_message_delete(SimpleNamespace(message_id=message_id))
+
+        self.assertFalse(self.daemon._status(REPORT_CHANNEL_ID, yesterday, self.user_id))
+        self.assertEqual(self.daemon._dirty, {(yesterday, self.user_id)})
+
+    async def test_reseed_drops_messages_deleted_while_disconnected(self):
+        yesterday = self.daemon.target_dates[0]
+        await self._seed_with_report(f"{yesterday.month}/{yesterday.day} 日報")
+
+        # 新しいセッションで再接続したときには削除済みのメッセージは履歴にない
+        self.daemon.get_channel(REPORT_CHANNEL_ID).messages = []
+        await self.daemon._seed_status_table()
+
+        self.assertFalse(self.daemon._status(REPORT_CHANNEL_ID, yesterday, self.user_id))
+
+    async def test_unrelated_message_does_not_mark_dirty(self):
+        self.daemon._evaluate(self.message_id, REPORT_CHANNEL_ID, 1, "1/1 日報")
+        self.daemon._evaluate(self.message_id, 12345, int(self.user_id), "1/1 日報")
+
+        self.assertEqual(self.daemon._dirty, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from src.date_memo import DateMemo
+from src.message_checker import MessageChecker
+
+
+class TestDateMemo(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_path = Path(self.temp_dir.name) / 'date_memo.sqlite3'
+
+    def test_repeated_contents_are_extracted_once(self):
+        memo = DateMemo(max_entries=10)
+        # 年の異なる日付は表記の検索では判定できず、正規表現で抽出する
+        contents = ["2024/1/28 日報", "雑談", "2024/1/28 日報"]
+
+        results = MessageChecker.find_dates_batch(contents, [date(2025, 1, 28)], memo)
+
+        self.assertEqual(results, [set(), set(), set()])
+        # 数字を含まない"雑談"はメモを使わずに除外される
+        self.assertEqual(memo.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        memo = DateMemo(max_entries=2)
+        for text in ["1/1", "1/2", "1/1", "1/3"]:
+            memo.get_or_extract(text, MessageChecker._extract)
+
+        # 1/2が最も長く使われていないため追い出される
+        memo.get_or_extract("1/2", MessageChecker._extract)
+        self.assertEqual(memo.stats(), {'hits': 1, 'misses': 4, 'entries': 2})
+
+    def test_persisted_results_skip_extraction_on_next_run(self):
+        memo = DateMemo(max_entries=10, db_path=self.db_path)
+        MessageChecker.find_dates("2024/1/28の宣言\n2/1", [date(2025, 1, 28)], memo)
+        memo.close()
+
+        reloaded = DateMemo(max_entries=10, db_path=self.db_path)
+        self.addCleanup(reloaded.close)
+        extracted = []
+
+        def extract(text):
+            extracted.append(text)
+            return ()
+
+        dates = reloaded.get_or_extract("2024/1/28の宣言\n2/1", extract)
+
+        self.assertEqual(dates, ((2024, 1, 28), (None, 2, 1)))
+        self.assertEqual(extracted, [])
+        self.assertEqual(reloaded.hits, 1)
+        # 起動時にはまとめて読み込まない
+        fresh = DateMemo(max_entries=10, db_path=self.db_path)
+        self.addCleanup(fresh.close)
+        self.assertEqual(fresh.stats()['entries'], 0)
+
+    def test_persisted_results_are_discarded_when_rules_change(self):
+        memo = DateMemo(max_entries=10, db_path=self.db_path, fingerprint="rules-v1")
+        memo.get_or_extract("1/28 日報", MessageChecker._extract)
+        memo.close()
+
+        # DATE_FORMATSや抽出処理を変更した後の起動
+        reloaded = DateMemo(max_entries=10, db_path=self.db_path, fingerprint="rules-v2")
+        extracted = []
+        reloaded.get_or_extract("1/28 日報", lambda text: extracted.append(text) or ((None, 1, 28),))
+        reloaded.close()
+        self.assertEqual(extracted, ["1/28 日報"])
+
+        # 新しいルールで保存した結果は次の起動で使われる
+        again = DateMemo(max_entries=10, db_path=self.db_path, fingerprint="rules-v2")
+        self.addCleanup(again.close)
+        again.get_or_extract("1/28 日報", lambda text: extracted.append(text) or ())
+        self.assertEqual(extracted, ["1/28 日報"])
+        self.assertEqual(again.hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import tempfile
+import unittest
+from contextlib import aclosing
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytz
+from discord.utils import time_snowflake
+
+from src.message_archive import MessageArchive
+
+
+def _message(author_id: int, content: str, created_at: datetime):
+    return SimpleNamespace(
+        id=time_snowflake(created_at),
+        channel=SimpleNamespace(id=1),
+        author=SimpleNamespace(id=author_id),
+        content=content,
+        created_at=created_at
+    )
+
+
+class FakeChannel:
+    """history()で取得したメッセージ数を記録するテスト用チャンネル"""
+
+    def __init__(self, messages):
+        self.id = 1
+        self.name = "fake-channel"
+        self.messages = messages
+        self.fetched_count = 0
+
+    async def history(self, after=None, before=None, limit=None, oldest_first=True):
+        for message in self.messages:
+            if after.id < message.id < before.id:
+                self.fetched_count += 1
+                yield message
+
+
+class TestMessageArchive(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.archive = MessageArchive(Path(self.temp_dir.name) / 'messages.sqlite3')
+        self.addCleanup(self.archive.close)
+        self.start = datetime(2025, 1, 27, 15, 0, tzinfo=pytz.utc)
+        self.messages = [
+            _message(111, f"メッセージ{i}\n" + "行\n" * 20, self.start + timedelta(hours=i))
+            for i in range(1, 72)
+        ]
+        self.channel = FakeChannel(self.messages)
+
+    async def test_sync_fetches_only_delta(self):
+        end = self.start + timedelta(days=2)
+        fetched = await self.archive.sync_channel(self.channel, self.start, end)
+        self.assertEqual(fetched, 47)
+
+        # 同じ範囲の再実行ではAPI取得なし
+        fetched = await self.archive.sync_channel(self.channel, self.start, end)
+        self.assertEqual(fetched, 0)
+
+        # 1日ずらした範囲では重複しない差分だけを取得
+        fetched = await self.archive.sync_channel(
+            self.channel, self.start + timedelta(days=1), end + timedelta(days=1)
+        )
+        self.assertEqual(fetched, 24)
+        self.assertEqual(self.channel.fetched_count, 71)
+
+    async def test_early_stop_keeps_fetched_messages_synced(self):
+        end = self.start + timedelta(days=2)
+        async with aclosing(self.archive.iter_channel(self.channel, self.start, end)) as records:
+            async for record in records:
+                if record.content.startswith("メッセージ5\n"):
+                    break
+
+        # 打ち切った位置以降の差分だけを取得
+        fetched = await self.archive.sync_channel(self.channel, self.start, end)
+        self.assertEqual(fetched, 42)
+        self.assertEqual(self.channel.fetched_count, 47)
+
+    async def test_recent_messages_are_refetched_to_pick_up_edits_and_deletes(self):
+        end = self.start + timedelta(days=2)
+        await self.archive.sync_channel(self.channel, self.start, end)
+
+        # 同期後に日付を追記する編集と削除
+        edited = self.messages[0]
+        self.channel.messages = [
+            SimpleNamespace(**dict(vars(edited), content="1/28 日報"))
+        ] + self.messages[2:]
+        # 直近の部分として取得し直す
+        self.archive.resync_seconds = 10 ** 9
+        await self.archive.sync_channel(self.channel, self.start, end)
+
+        records = list(self.archive.iter_messages(1, self.start, end))
+        self.assertEqual(records[0].content, "1/28 日報")
+        self.assertNotIn(self.messages[1].id, [r.id for r in records])
+
+    async def test_resync_starts_at_window_start(self):
+        now = datetime.now(pytz.utc)
+        start = now - timedelta(days=5)
+        self.channel.messages = [
+            _message(111, f"メッセージ{i}", start + timedelta(hours=i, minutes=30)) for i in range(5 * 24)
+        ]
+        self.archive.resync_seconds = 3 * 24 * 60 * 60
+        await self.archive.sync_channel(self.channel, start, now)
+        self.channel.fetched_count = 0
+
+        # 直近12時間の検索範囲では、取得し直すのも検索範囲の分だけ
+        fetched = await self.archive.sync_channel(self.channel, now - timedelta(hours=12), now)
+        self.assertEqual(fetched, 12)
+        self.assertEqual(self.channel.fetched_count, 12)
+
+    async def test_disjoint_window_fetches_only_the_window(self):
+        end = self.start + timedelta(days=1)
+        await self.archive.sync_channel(self.channel, self.start, end)
+        old_start = self.start - timedelta(days=90)
+        self.channel.messages = [
+            _message(111, f"古いメッセージ{i}", old_start + timedelta(days=i, hours=1)) for i in range(90)
+        ] + self.messages
+        self.channel.fetched_count = 0
+
+        # 同期済み範囲より前の1日分だけを取得し、同期済み範囲は変えない
+        fetched = await self.archive.sync_channel(self.channel, old_start, old_start + timedelta(days=1))
+        self.assertEqual(fetched, 1)
+        self.assertEqual(self.archive._get_synced_range(1)[0], time_snowflake(self.start, high=True))
+
+        # 同期済み範囲より後で離れた1日分も、間の期間を取得しない
+        fetched = await self.archive.sync_channel(self.channel, self.start + timedelta(days=2),
+                                                  self.start + timedelta(days=3))
+        self.assertEqual(fetched, 23)
+        self.assertEqual(self.channel.fetched_count, 24)
+
+    async def test_iter_messages_returns_window_in_order(self):
+        end = self.start + timedelta(days=1)
+        await self.archive.sync_channel(self.channel, self.start, end)
+
+        records = list(self.archive.iter_messages(1, self.start, end))
+
+        self.assertEqual(len(records), 23)
+        self.assertEqual([r.id for r in records], sorted(r.id for r in records))
+        self.assertEqual(records[0].author_id, 111)
+        self.assertEqual(len(records[0].content.split('\n')), 10)
+        self.assertEqual(records[0].created_at, self.messages[0].created_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from datetime import datetime
+from datetime import date, datetime
 from src.message_checker import MessageChecker
 
 class TestMessageChecker(unittest.TestCase):
@@ -32,6 +32,58 @@ class TestMessageChecker(unittest.TestCase):
             with self.subTest(message=message):
                 self.assertFalse(self.checker.has_valid_date(message))
 
+    def test_extract_dates(self):
+        test_cases = [
+            ("【2025/1/28】報告", [(2025, 1, 28)]),
+            ("25-01-28 報告", [(2025, 1, 28)]),
+            ("1/28の報告\n1月29日", [(None, 1, 28), (None, 1, 29)]),
+            # 年/月/日の一部を月/日として重複して拾わない
+            ("報告 2024/1/28", [(2024, 1, 28)]),
+            # 月/日の範囲指定を年/月/日として取り込まない
+            ("12/28-12/29", [(None, 12, 28), (None, 12, 29)]),
+        ]
+        for content, expected in test_cases:
+            with self.subTest(content=content):
+                self.assertEqual(self.checker.extract_dates(content), expected)
+
+    def test_find_dates_batch_infers_year_per_candidate(self):
+        candidates = [date(2024, 12, 31), date(2025, 1, 1), date(2025, 1, 28)]
+        contents = ["12/31 日報", "1月1日の宣言", "2024/1/28", "雑談", "12/31と1/28"]
+
+        results = MessageChecker.find_dates_batch(contents, candidates)
+
+        self.assertEqual(results, [
+            {date(2024, 12, 31)},
+            {date(2025, 1, 1)},
+            set(),  # 年が書かれている場合は候補日の年と一致する必要がある
+            set(),
+            {date(2024, 12, 31), date(2025, 1, 28)},
+        ])
+
+    def test_messages_without_digits_are_rejected_before_extraction(self):
+        stats = {}
+        contents = ["おはようございます", "", "１月２８日の日報", "今日は 1/28"]
+
+        results = MessageChecker.find_dates_batch(contents, [date(2025, 1, 28)], stats=stats)
+
+        self.assertEqual(results, [set(), set(), {date(2025, 1, 28)}, {date(2025, 1, 28)}])
+        self.assertEqual(stats, {'prefiltered_count': 2, 'regex_count': 2})
+
+    def test_full_width_dates_are_normalized(self):
+        valid_messages = ["１／２８ 日報", "２０２５－０１－２８", "【２０２５/１/２８】報告"]
+        for message in valid_messages:
+            with self.subTest(message=message):
+                self.assertTrue(self.checker.has_valid_date(message))
+        # 候補日の表記を含まないメッセージは正規表現で抽出しない
+        stats = {}
+        MessageChecker.find_dates_batch(["15:00から会議", "1/27 日報"], [date(2025, 1, 28)], stats=stats)
+        self.assertEqual(stats, {})
+
+    def test_has_valid_date_logs_nothing_at_info_level(self):
+        # メッセージごとの詳細ログはDEBUGレベルのみ
+        with self.assertNoLogs(level='INFO'):
+            self.checker.has_valid_date("今日の報告です\n2025/1/27\n雑談")
+
     def test_parse_date(self):
         test_cases = [
             ("2025/1/28", datetime(2025, 1, 28)),
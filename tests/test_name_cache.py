@@ -0,0 +1,31 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from src.name_cache import UserNameCache
+
+
+class TestUserNameCache(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_path = Path(tmp_dir.name) / 'user_names.json'
+        self.cache = UserNameCache(self.cache_path, ttl_seconds=60)
+
+    def test_entries_are_persisted(self):
+        self.cache.update({"1": "name"})
+        self.cache.save()
+
+        reloaded = UserNameCache(self.cache_path, ttl_seconds=60)
+        self.assertEqual(reloaded.get_many(["1", "2"]), {"1": "name"})
+
+    def test_expired_entries_are_ignored(self):
+        self.cache.update({"1": "old"})
+        self.cache._entries["1"]["fetched_at"] = time.time() - 120
+
+        self.assertIsNone(self.cache.get("1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
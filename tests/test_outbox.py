@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+from src.outbox import ResultOutbox
+from src.result_sink import SheetWriteBuffer
+
+
+class TestResultOutbox(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = Path(self.temp_dir.name) / 'outbox.jsonl'
+
+    def test_unacknowledged_results_survive_restart(self):
+        outbox = ResultOutbox(self.path)
+        first_ids = outbox.append([(datetime(2025, 1, 28), "1", True, False), (datetime(2025, 1, 28), "2", False, False)])
+        outbox.acknowledge(first_ids[:1])
+        # 同じ(日付, ユーザー)の新しい結果で置き換える
+        outbox.append([(datetime(2025, 1, 28), "2", True, True)])
+        # 書き込み中に終了して壊れた行
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "put", "id"')
+
+        reloaded = ResultOutbox(self.path)
+        ids, updates = reloaded.pending()
+
+        self.assertEqual(updates, [(datetime(2025, 1, 28), "2", True, True)])
+        # 置き換えられた古い連番を送信済みにしても新しい結果は残る
+        reloaded.acknowledge(first_ids)
+        self.assertEqual(len(reloaded), 1)
+
+        reloaded.acknowledge(ids)
+        self.assertEqual(len(reloaded), 0)
+        # 送信待ちがなくなったら連番を引き継ぐ1行だけになる
+        self.assertEqual(len(self.path.read_text(encoding='utf-8').splitlines()), 1)
+        self.assertEqual(ResultOutbox(self.path).append([(datetime(2025, 1, 29), "1", True, True)]), [4])
+
+    def test_append_after_torn_line_is_not_lost(self):
+        outbox = ResultOutbox(self.path)
+        outbox.append([(datetime(2025, 1, 28), "1", True, False)])
+        # 書き込み中に終了して途中で切れた行
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "put", "id"')
+
+        restarted = ResultOutbox(self.path)
+        restarted.append([(datetime(2025, 1, 28), "2", True, True)])
+
+        _, updates = ResultOutbox(self.path).pending()
+        self.assertEqual(updates, [(datetime(2025, 1, 28), "1", True, False), (datetime(2025, 1, 28), "2", True, True)])
+
+    def test_processes_sharing_the_file_keep_each_others_results(self):
+        # 常駐モードが追記した後に--replayが起動する
+        daemon = ResultOutbox(self.path)
+        daemon_ids = daemon.append([(datetime(2025, 1, 28), "1", True, False)])
+        replay = ResultOutbox(self.path)
+        replay_ids, _ = replay.pending()
+        # 常駐モードが次の結果を追記してから--replayが送信済みにする
+        second_ids = daemon.append([(datetime(2025, 1, 29), "1", True, True)])
+        replay.acknowledge(replay_ids)
+
+        self.assertNotEqual(daemon_ids, second_ids)
+        _, updates = ResultOutbox(self.path).pending()
+        self.assertEqual(updates, [(datetime(2025, 1, 29), "1", True, True)])
+
+        # 常駐モードが同じ連番を送信済みにしても--replayが追記した結果は消えない
+        third_ids = replay.append([(datetime(2025, 1, 30), "1", False, True)])
+        daemon.acknowledge(daemon_ids + second_ids)
+        self.assertNotIn(third_ids[0], daemon_ids + second_ids)
+        _, updates = ResultOutbox(self.path).pending()
+        self.assertEqual(updates, [(datetime(2025, 1, 30), "1", False, True)])
+
+    async def test_failed_flush_leaves_results_for_replay(self):
+        sheets_handler = Mock()
+        sheets_handler.write_check_results = AsyncMock(side_effect=RuntimeError("unavailable"))
+        buffer = SheetWriteBuffer(sheets_handler, ResultOutbox(self.path))
+        buffer.add([(datetime(2025, 1, 28), "1", True, True)])
+
+        with self.assertRaises(RuntimeError):
+            await buffer.flush()
+
+        # 次の実行(run.py --replay)で再送する
+        replay = ResultOutbox(self.path)
+        ids, updates = replay.pending()
+        self.assertEqual(updates, [(datetime(2025, 1, 28), "1", True, True)])
+
+        sheets_handler.write_check_results = AsyncMock(return_value=1)
+        await buffer.flush()
+        self.assertEqual(len(ResultOutbox(self.path)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
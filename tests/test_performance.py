@@ -35,7 +35,7 @@ async def test_batch_performance():
     # バッチ更新の時間計測
     start_time = time.time()
     updates = [(test_date, user_id, True, True) for user_id in test_users]
-    await handler.write_check_results(updates)
+    total_batches = await handler.write_check_results(updates)
     batch_update_time = time.time() - start_time
     logging.info(f"バッチ更新の処理時間: {batch_update_time:.2f}秒")
     
@@ -43,13 +43,10 @@ async def test_batch_performance():
     improvement = ((single_update_time - batch_update_time) / single_update_time) * 100
     logging.info(f"処理速度の改善率: {improvement:.1f}%")
     
-    # バッチサイズの情報
-    users_per_batch = handler.USERS_PER_BATCH
-    total_batches = (total_users + users_per_batch - 1) // users_per_batch
-    avg_time_per_batch = batch_update_time / total_batches
+    # バッチの情報(同じ行のセルはまとめて送信される)
+    avg_time_per_batch = batch_update_time / max(total_batches, 1)
     
     logging.info(f"バッチ処理の詳細:")
-    logging.info(f"- 1バッチあたりのユーザー数: {users_per_batch}")
     logging.info(f"- 合計バッチ数: {total_batches}")
     logging.info(f"- 1バッチあたりの平均処理時間: {avg_time_per_batch:.2f}秒")
 
@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytz
+from discord.utils import time_snowflake
+
+from src.message_archive import MessageArchive, MessageRecord
+from src.reevaluator import ArchiveReevaluator
+from src.window_planner import JST, WindowPlanner
+
+
+def _record(channel_id: int, author_id: int, content: str, created_at: datetime) -> MessageRecord:
+    return MessageRecord(
+        id=time_snowflake(created_at),
+        channel_id=channel_id,
+        author_id=author_id,
+        created_at=created_at,
+        thread_id=channel_id if channel_id != 1 else None,
+        content=content
+    )
+
+
+class TestArchiveReevaluator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.archive = MessageArchive(Path(self.temp_dir.name) / 'messages.sqlite3')
+        self.addCleanup(self.archive.close)
+
+        posted_at = JST.localize(datetime(2025, 1, 28, 21, 0)).astimezone(pytz.utc)
+        records = [
+            _record(1, 111, "2025/1/28 日報", posted_at),
+            # スレッド内の投稿も親チャンネルの判定に含める
+            _record(2, 222, "1月29日の日報", posted_at + timedelta(days=1)),
+            # ロスターにないユーザー
+            _record(1, 999, "1/28", posted_at + timedelta(seconds=30)),
+        ] + [
+            _record(1, 333, f"雑談{i}", posted_at + timedelta(minutes=i)) for i in range(1, 10)
+        ]
+        self.archive._store(records)
+        self.archive._record_thread(2, 1)
+        self.target_dates = [date(2025, 1, 28), date(2025, 1, 29)]
+        self.windows = WindowPlanner(now=JST.localize(datetime(2025, 2, 1))).plan(self.target_dates, 0)
+
+    def _sync(self, channel_id: int, first_date: date, last_date: date):
+        """first_dateからlast_dateまでの検索範囲を同期済みとして記録する"""
+        self.archive._set_synced_range(channel_id, self.windows[first_date].after_id, self.windows[last_date].before_id)
+
+    def test_sharded_results_match_inline_results(self):
+        self._sync(1, date(2025, 1, 28), date(2025, 1, 29))
+        self._sync(2, date(2025, 1, 28), date(2025, 1, 29))
+        windows = self.windows
+        user_ids = ["111", "222", "333"]
+
+        sharded = ArchiveReevaluator(self.archive, user_ids, max_workers=2, chunk_size=3).evaluate(1, windows)
+        inline = ArchiveReevaluator(self.archive, user_ids, max_workers=1).evaluate(1, windows)
+
+        expected = {
+            date(2025, 1, 28): {"111": True, "222": False, "333": False},
+            date(2025, 1, 29): {"111": False, "222": True, "333": False},
+        }
+        self.assertEqual(sharded, expected)
+        self.assertEqual(inline, expected)
+
+    def test_dates_outside_synced_range_are_skipped(self):
+        # 1/29の検索範囲の途中までしか同期されていない
+        self._sync(1, date(2025, 1, 28), date(2025, 1, 28))
+        self._sync(2, date(2025, 1, 28), date(2025, 1, 29))
+        user_ids = ["111", "222"]
+
+        results = ArchiveReevaluator(self.archive, user_ids, max_workers=1).evaluate(1, self.windows)
+
+        self.assertEqual(results, {date(2025, 1, 28): {"111": True, "222": False}})
+
+    def test_partially_synced_thread_skips_dates(self):
+        self._sync(1, date(2025, 1, 28), date(2025, 1, 29))
+        # スレッドは1/28の検索範囲の途中で取得を打ち切った
+        self.archive._set_synced_range(2, self.windows[date(2025, 1, 28)].after_id,
+                                       time_snowflake(JST.localize(datetime(2025, 1, 29, 12, 0)), high=False))
+
+        results = ArchiveReevaluator(self.archive, ["111", "222"], max_workers=1).evaluate(1, self.windows)
+
+        self.assertEqual(results, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from datetime import date, datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock, patch
+
+from src.result_sink import MultiResultSink, SQLiteResultSink, SheetWriteBuffer, create_result_sink
+
+
+class TestResultSinks(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_path = Path(self.temp_dir.name) / 'results.sqlite3'
+        self.sink = create_result_sink(['sqlite'], self.db_path)
+        self.addAsyncCleanup(self.sink.close)
+
+    async def test_sqlite_sink_stores_latest_result_per_day(self):
+        buffer = SheetWriteBuffer(self.sink)
+        buffer.add([(datetime(2025, 1, 28), "111", True, False), (datetime(2025, 1, 29), "111", True, True),
+                    (datetime(2025, 1, 28), "222", False, False)])
+        await buffer.flush()
+        # 再実行で結果が変わった場合は上書きする
+        await self.sink.write_check_results([(datetime(2025, 1, 28), "222", True, False)])
+
+        self.assertIsInstance(self.sink, SQLiteResultSink)
+        self.assertEqual(self.sink.results_between(date(2025, 1, 28), date(2025, 1, 28)), [
+            (datetime(2025, 1, 28), "111", True, False),
+            (datetime(2025, 1, 28), "222", True, False),
+        ])
+        self.assertEqual(self.sink.submission_counts(date(2025, 1, 1), date(2025, 1, 31)),
+                         {"111": (2, 1), "222": (1, 0)})
+
+    async def test_multi_sink_writes_to_remaining_sinks_on_failure(self):
+        failing = Mock(name="sheets")
+        failing.write_check_results = AsyncMock(side_effect=RuntimeError("unavailable"))
+        multi = MultiResultSink([failing, self.sink])
+
+        with self.assertRaises(RuntimeError):
+            await multi.write_check_results([(datetime(2025, 1, 28), "111", True, True)])
+
+        self.assertEqual(len(self.sink.results_between(date(2025, 1, 28), date(2025, 1, 28))), 1)
+
+    def test_unknown_sink_name_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_result_sink(['csv'], self.db_path)
+
+    def test_sheets_sink_requires_spreadsheet_id(self):
+        with patch('config.config.SPREADSHEET_ID', None), self.assertRaises(ValueError):
+            create_result_sink(['sheets'], self.db_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
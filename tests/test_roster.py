@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.roster import Roster, column_to_index, index_to_column
+
+
+class TestRoster(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = Path(self.temp_dir.name) / 'user_columns.json'
+
+    def _write_users(self, users, mtime_ns):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(users, f)
+        # 更新時刻の精度に依存しないように明示的に設定する
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_entries_are_keyed_by_integer_author_id(self):
+        roster = Roster.from_users([{"userId": "123", "name": "a", "sengenCol": "Z"}, {"userId": "456", "sengenCol": "B"}])
+
+        entry = roster.get(123)
+        self.assertEqual((entry.user_id, entry.name), ("123", "a"))
+        # Zの次の列はAA
+        self.assertEqual((entry.declaration_column, entry.report_column), ("Z", "AA"))
+        self.assertEqual((entry.declaration_index, entry.report_index), (25, 26))
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertIsNone(roster.get(789))
+        self.assertIs(roster.find("456"), roster.get(456))
+        self.assertIsNone(roster.find("invalid_user_id"))
+        self.assertEqual(roster.columns()["456"], {"name": "N/A", "declaration": "B", "report": "C"})
+        self.assertEqual(column_to_index("AA"), 26)
+        self.assertEqual(index_to_column(26), "AA")
+
+    def test_reloads_only_when_mtime_changes(self):
+        self._write_users([{"userId": "1", "name": "a", "sengenCol": "B"}], 1_000_000_000)
+        roster = Roster(self.path)
+        self.assertEqual(roster.user_ids, ["1"])
+        self.assertFalse(roster.reload_if_changed())
+
+        self._write_users([{"userId": "1", "name": "a", "sengenCol": "D"}, {"userId": "2", "name": "b", "sengenCol": "F"}],
+                          2_000_000_000)
+        self.assertTrue(roster.reload_if_changed())
+        self.assertEqual(roster.user_ids, ["1", "2"])
+        self.assertEqual(roster.get(1).report_column, "E")
+        self.assertIn(2, roster)
+        self.assertFalse(roster.reload_if_changed())
+
+
+if __name__ == '__main__':
+    unittest.main()
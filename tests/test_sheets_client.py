@@ -0,0 +1,200 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from aiohttp import web
+
+from src.roster import Roster
+from src.sheets_client import AsyncSheetsClient, SheetsApiError
+from src.sheets_handler import SheetsHandler
+from src.token_cache import TokenCache
+
+
+class FakeCredentials:
+    """refresh()の回数を記録するテスト用のサービスアカウント認証情報"""
+
+    service_account_email = "bot@example.iam.gserviceaccount.com"
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+        self.refresh_count = 0
+
+    @property
+    def valid(self):
+        return self.token is not None and self.expiry > datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def refresh(self, request):
+        self.refresh_count += 1
+        self.token = f"token-{self.refresh_count}"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+
+class StubSheetsServer:
+    """batchUpdate・batchGet・シート情報の取得を受け付けるローカルのテスト用Sheets APIサーバー"""
+
+    def __init__(self):
+        self.requests = []
+        self.peers = set()
+        self.fail_status = None
+        # 401を返すAuthorizationヘッダー(無効化されたトークン)
+        self.rejected_authorizations = set()
+        app = web.Application()
+        app.router.add_get('/v4/spreadsheets/{spreadsheet_id}/values:batchGet', self.batch_get)
+        app.router.add_get('/v4/spreadsheets/{spreadsheet_id}', self.get_spreadsheet)
+        app.router.add_post('/v4/spreadsheets/{spreadsheet_id}:batchUpdate', self.batch_update)
+        self.runner = web.AppRunner(app)
+
+    async def start(self) -> str:
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v4/spreadsheets"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def _record(self, request, body):
+        self.requests.append((request.method, request.match_info['spreadsheet_id'],
+                              request.headers.get('Authorization'), body))
+        self.peers.add(request.transport.get_extra_info('peername'))
+
+    async def batch_update(self, request):
+        if self.fail_status:
+            return web.Response(status=self.fail_status, text="quota", headers={'Retry-After': '5'})
+        body = await request.json()
+        self._record(request, body)
+        # 同時に処理中のリクエストが重なるようにする
+        await asyncio.sleep(0.01)
+        return web.json_response({'replies': [{} for _ in body['requests']]})
+
+    async def get_spreadsheet(self, request):
+        self._record(request, dict(request.query))
+        return web.json_response({'sheets': [{'properties': {'sheetId': 101, 'title': "1月"}},
+                                             {'properties': {'sheetId': 102, 'title': "2月"}}]})
+
+    async def batch_get(self, request):
+        if request.headers.get('Authorization') in self.rejected_authorizations:
+            return web.Response(status=401, text="invalid credentials")
+        ranges = request.query.getall('ranges')
+        self._record(request, ranges)
+        return web.json_response({'valueRanges': [{'range': cell_range} for cell_range in ranges]})
+
+
+class TestAsyncSheetsClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StubSheetsServer()
+        base_url = await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        credentials = SimpleNamespace(valid=True, token="test-token")
+        self.client = AsyncSheetsClient(credentials, base_url=base_url)
+        self.addAsyncCleanup(self.client.close)
+
+    async def test_concurrent_writes_share_pooled_session(self):
+        bodies = [{'requests': [{'updateCells': {
+            'range': {'sheetId': 101, 'startRowIndex': row - 1, 'endRowIndex': row,
+                      'startColumnIndex': 1, 'endColumnIndex': 2},
+            'rows': [{'values': [{'userEnteredValue': {'stringValue': "提出"}}]}],
+            'fields': 'userEnteredValue'
+        }}]} for row in range(7, 13)]
+
+        await asyncio.gather(*[self.client.batch_update("sheet-id", body) for body in bodies])
+        await self.client.values_batch_get("sheet-id", ["'1月'!B7:C8", "'1月'!D7"])
+
+        def start_rows(sent_bodies):
+            return sorted(body['requests'][0]['updateCells']['range']['startRowIndex'] for body in sent_bodies)
+
+        self.assertEqual(start_rows(body for _, _, _, body in self.server.requests[:6]), start_rows(bodies))
+        self.assertEqual(self.server.requests[-1], ('GET', "sheet-id", "Bearer test-token", ["'1月'!B7:C8", "'1月'!D7"]))
+        # 同時に6件送っても接続はプールの中で使い回される
+        self.assertLessEqual(len(self.server.peers), self.client.pool_size)
+
+    async def test_error_status_raises_with_retry_after(self):
+        self.server.fail_status = 429
+
+        with self.assertRaises(SheetsApiError) as context:
+            await self.client.batch_update("sheet-id", {'requests': []})
+
+        self.assertEqual(context.exception.status, 429)
+        self.assertEqual(context.exception.retry_after, '5')
+
+    async def test_sheets_handler_writes_through_client(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        with patch('src.sheets_handler.service_account.Credentials.from_service_account_file'), \
+                patch('src.sheets_handler.SPREADSHEET_ID', "sheet-id"), \
+                patch('src.sheets_handler.SHEET_METADATA_CACHE_PATH', Path(tmp_dir.name) / 'sheet_metadata.json'), \
+                patch('src.sheets_handler.ROSTER', Roster.from_users([{"userId": "1", "name": "a", "sengenCol": "B"}])):
+            handler = SheetsHandler()
+            handler.client = self.client
+            request_count = await handler.write_check_results([(datetime(2025, 1, 1), "1", True, False)])
+
+            # 次の実行ではシート情報をキャッシュから読み込む
+            next_handler = SheetsHandler()
+            next_handler.client = self.client
+            await next_handler.write_check_results([(datetime(2025, 2, 1), "1", True, True)])
+
+        self.assertEqual(request_count, 1)
+        self.assertEqual([(method, body.get('fields') if method == 'GET' else None)
+                          for method, _, _, body in self.server.requests if not isinstance(body, list)],
+                         [('GET', 'sheets.properties(sheetId,title)'), ('POST', None), ('POST', None)])
+        body = self.server.requests[-1][3]
+        self.assertEqual(body['requests'][0]['updateCells']['range']['sheetId'], 102)
+
+
+    async def test_cached_token_is_reused_by_next_run(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        token_cache = TokenCache(Path(tmp_dir.name) / 'sheets_token.json')
+
+        first = FakeCredentials()
+        first_client = AsyncSheetsClient(first, base_url=self.client.base_url, token_cache=token_cache)
+        self.addAsyncCleanup(first_client.close)
+        await first_client.values_batch_get("sheet-id", ["'1月'!B7"])
+
+        # 次の実行ではトークンを取得せず、キャッシュしたトークンを使う
+        second = FakeCredentials()
+        second_client = AsyncSheetsClient(second, base_url=self.client.base_url, token_cache=token_cache)
+        self.addAsyncCleanup(second_client.close)
+        await second_client.values_batch_get("sheet-id", ["'1月'!B7"])
+
+        self.assertEqual((first.refresh_count, second.refresh_count), (1, 0))
+        self.assertEqual([auth for _, _, auth, _ in self.server.requests], ["Bearer token-1", "Bearer token-1"])
+
+        # 有効期限が近いトークンは使わない
+        second.token = None
+        token_cache.margin_seconds = 2 * 60 * 60
+        self.assertFalse(token_cache.load(second))
+
+    async def test_rejected_cached_token_is_refreshed_once(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        token_cache = TokenCache(Path(tmp_dir.name) / 'sheets_token.json')
+        first = FakeCredentials()
+        first_client = AsyncSheetsClient(first, base_url=self.client.base_url, token_cache=token_cache)
+        self.addAsyncCleanup(first_client.close)
+        await first_client.values_batch_get("sheet-id", ["'1月'!B7"])
+
+        # 鍵を更新してキャッシュしたトークンが無効になった
+        self.server.rejected_authorizations.add("Bearer token-1")
+        second = FakeCredentials()
+        second.refresh_count = 1
+        second_client = AsyncSheetsClient(second, base_url=self.client.base_url, token_cache=token_cache)
+        self.addAsyncCleanup(second_client.close)
+        await second_client.values_batch_get("sheet-id", ["'1月'!B7"])
+
+        self.assertEqual(second.refresh_count, 2)
+        self.assertEqual(self.server.requests[-1][2], "Bearer token-2")
+        # 新しいトークンがキャッシュされる
+        third = FakeCredentials()
+        self.assertTrue(token_cache.load(third))
+        self.assertEqual(third.token, "token-2")
+
+
+if __name__ == '__main__':
+    unittest.main()
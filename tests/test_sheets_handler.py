@@ -1,17 +1,20 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from datetime import datetime
+from src.sheets_client import SheetsApiError
+from src.result_sink import SheetWriteBuffer
 from src.sheets_handler import SheetsHandler
 from config.config import USER_COLUMNS
+from src.roster import Roster
 
 class TestSheetsHandler(unittest.TestCase):
     def setUp(self):
         # Google APIのモック化
         self.mock_service = Mock()
-        patcher = patch('src.sheets_handler.build')
+        patcher = patch('src.sheets_handler.AsyncSheetsClient')
         self.addCleanup(patcher.stop)
-        mock_build = patcher.start()
-        mock_build.return_value = self.mock_service
+        mock_client = patcher.start()
+        mock_client.return_value = self.mock_service
 
         # 認証情報のモック化
         patcher = patch('src.sheets_handler.service_account.Credentials.from_service_account_file')
@@ -91,5 +94,139 @@ class TestSheetsHandler(unittest.TestCase):
                 True
             )
 
+class TestSheetsWriteCoalescing(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch('src.sheets_handler.AsyncSheetsClient')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        patcher = patch('src.sheets_handler.service_account.Credentials.from_service_account_file')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        # 隣り合う列を使う2人と、離れた列を使う1人
+        patcher = patch('src.sheets_handler.ROSTER', Roster.from_users([
+            {"userId": "1", "name": "a", "sengenCol": "B"},
+            {"userId": "2", "name": "b", "sengenCol": "D"},
+            {"userId": "3", "name": "c", "sengenCol": "H"},
+        ]))
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        patcher = patch('src.sheets_handler.START_ROW', 7)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        self.sheets_handler = SheetsHandler()
+        self.sheets_handler._execute_batch_update = AsyncMock(return_value=True)
+        # 1月・2月のシートだけがある
+        self.sheets_handler.sheet_metadata.resolve = AsyncMock(
+            side_effect=lambda titles: {title: sheet_id for title, sheet_id in {"1月": 101, "2月": 102}.items()
+                                        if title in titles}
+        )
+        # 現在の値はすべて空
+        self.sheets_handler._execute_batch_get = AsyncMock(side_effect=lambda ranges: [[] for _ in ranges])
+
+    def _written_ranges(self):
+        """送信したupdateCellsを(sheetId, A1表記の範囲, 値)にする"""
+        to_column = self.sheets_handler._index_to_column
+        written = []
+        for call in self.sheets_handler._execute_batch_update.await_args_list:
+            for request in call.args[0]:
+                grid = request['updateCells']['range']
+                cell_range = f"{to_column(grid['startColumnIndex'])}{grid['startRowIndex'] + 1}:" \
+                             f"{to_column(grid['endColumnIndex'] - 1)}{grid['endRowIndex']}"
+                values = [[value['userEnteredValue']['stringValue'] for value in row['values']]
+                          for row in request['updateCells']['rows']]
+                written.append((grid['sheetId'], cell_range, values))
+        return written
+
+    async def test_run_results_are_sent_in_one_request(self):
+        buffer = SheetWriteBuffer(self.sheets_handler)
+        for day in (1, 2):
+            buffer.add([(datetime(2025, 1, day), "1", True, False), (datetime(2025, 1, day), "3", False, False)])
+            buffer.add([(datetime(2025, 1, day), "2", True, True)])
+        # 同じセルは後の結果を優先する
+        buffer.add([(datetime(2025, 1, 2), "3", True, True)])
+
+        request_count = await buffer.flush()
+
+        self.assertEqual(request_count, 1)
+        self.assertEqual(len(buffer), 0)
+        self.sheets_handler._execute_batch_update.assert_awaited_once()
+        self.assertEqual(self.sheets_handler._execute_batch_update.await_args.args[0][1], {
+            'updateCells': {
+                'range': {'sheetId': 101, 'startRowIndex': 6, 'endRowIndex': 8, 'startColumnIndex': 7,
+                          'endColumnIndex': 9},
+                'rows': [
+                    {'values': [{'userEnteredValue': {'stringValue': "なし"}}] * 2},
+                    {'values': [{'userEnteredValue': {'stringValue': "提出"}}] * 2},
+                ],
+                'fields': 'userEnteredValue'
+            }
+        })
+        self.assertEqual(self._written_ranges(), [
+            (101, "B7:E8", [["なし", "提出", "提出", "提出"], ["なし", "提出", "提出", "提出"]]),
+            (101, "H7:I8", [["なし", "なし"], ["提出", "提出"]]),
+        ])
+
+    async def test_requests_are_split_by_payload_limits(self):
+        self.sheets_handler.MAX_RANGES_PER_REQUEST = 2
+        updates = [(datetime(2025, 1, 1), "1", True, True), (datetime(2025, 1, 1), "3", True, True),
+                   (datetime(2025, 2, 1), "1", True, True)]
+
+        request_count = await self.sheets_handler.write_check_results(updates)
+
+        self.assertEqual(request_count, 2)
+        self.assertEqual([len(call.args[0]) for call in self.sheets_handler._execute_batch_update.await_args_list],
+                         [2, 1])
+
+    async def test_unchanged_cells_are_not_written(self):
+        # B7:E7の現在の値(E7は空のため読み込み結果に含まれない)
+        self.sheets_handler._execute_batch_get.side_effect = None
+        self.sheets_handler._execute_batch_get.return_value = [[["提出", "提出", "なし"]]]
+        updates = [(datetime(2025, 1, 1), "1", True, True), (datetime(2025, 1, 1), "2", True, True)]
+
+        with self.assertLogs(level='INFO') as logs:
+            request_count = await self.sheets_handler.write_check_results(updates)
+
+        self.sheets_handler._execute_batch_get.assert_awaited_once_with(["'1月'!B7:E7"])
+        self.assertEqual(request_count, 1)
+        self.assertEqual(self._written_ranges(), [(101, "D7:E7", [["提出", "提出"]])])
+        self.assertIn("変更のないセルをスキップ: 2セル", '\n'.join(logs.output))
+
+        # すべて変更がない場合は書き込まない
+        self.sheets_handler._execute_batch_update.reset_mock()
+        self.sheets_handler._execute_batch_get.return_value = [[["提出", "提出", "提出", "提出"]]]
+        self.assertEqual(await self.sheets_handler.write_check_results(updates), 0)
+        self.sheets_handler._execute_batch_update.assert_not_awaited()
+
+    async def test_missing_month_sheet_is_skipped(self):
+        updates = [(datetime(2025, 1, 1), "1", True, True), (datetime(2025, 3, 1), "1", True, True)]
+
+        with self.assertLogs(level='ERROR') as logs:
+            await self.sheets_handler.write_check_results(updates)
+
+        self.assertIn("シート「3月」が見つからないため、2セルを書き込めません", '\n'.join(logs.output))
+        self.assertEqual(self._written_ranges(), [(101, "B7:C7", [["提出", "提出"]])])
+
+    async def test_recreated_sheet_is_retried_with_new_sheet_id(self):
+        # 1月のシートが削除され、同じ名前で作り直された(キャッシュのsheetId 101は無効)
+        stale = SheetsApiError(400, "Invalid requests[0].updateCells: No grid with id: 101")
+        self.sheets_handler._execute_batch_update.side_effect = [stale, True]
+        self.sheets_handler.sheet_metadata.refresh = AsyncMock(return_value={"1月": 201, "2月": 102})
+
+        await self.sheets_handler.write_check_results([(datetime(2025, 1, 1), "1", True, True)])
+
+        self.sheets_handler.sheet_metadata.refresh.assert_awaited_once()
+        self.assertEqual(self._written_ranges(), [(101, "B7:C7", [["提出", "提出"]]),
+                                                  (201, "B7:C7", [["提出", "提出"]])])
+
+    async def test_failed_flush_keeps_pending_results(self):
+        self.sheets_handler._execute_batch_update.side_effect = RuntimeError("quota")
+        buffer = SheetWriteBuffer(self.sheets_handler)
+        buffer.add([(datetime(2025, 1, 1), "1", True, True)])
+
+        with self.assertRaises(RuntimeError):
+            await buffer.flush()
+        self.assertEqual(len(buffer), 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import AsyncMock
+
+from src.sheets_client import SheetsApiError
+from src.sheets_scheduler import SheetsRequestScheduler
+
+
+class FakeClock:
+    """sleep()で進む疑似時計"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestSheetsRequestScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _scheduler(self, **kwargs):
+        return SheetsRequestScheduler(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    async def test_requests_stay_within_per_minute_quota(self):
+        scheduler = self._scheduler(write_per_minute=60)
+        call = AsyncMock(return_value={})
+
+        for _ in range(40):
+            await scheduler.submit('write', call)
+
+        # バースト(10件)の後は1秒に1件のペースになる
+        self.assertEqual(call.await_count, 40)
+        self.assertAlmostEqual(self.clock.now, 30.0)
+        self.assertEqual(scheduler.metrics()['throttled'], 30)
+        # 読み込みのクォータは別に管理する
+        self.assertEqual(scheduler.buckets['read'].reserve(), 0.0)
+
+    async def test_quota_error_waits_for_retry_after(self):
+        scheduler = self._scheduler()
+        call = AsyncMock(side_effect=[SheetsApiError(429, "quota", retry_after='30'), {'ok': True}])
+
+        result = await scheduler.submit('write', call)
+
+        self.assertEqual(result, {'ok': True})
+        self.assertGreaterEqual(self.clock.now, 30.0)
+        self.assertEqual(scheduler.metrics()['retries'], 1)
+        # 同じ種類の次のリクエストも止めた時刻まで待つ
+        self.assertEqual(scheduler.buckets['write'].paused_until, 30.0)
+
+    async def test_non_retryable_error_is_raised_immediately(self):
+        scheduler = self._scheduler()
+        call = AsyncMock(side_effect=SheetsApiError(400, "bad range"))
+
+        with self.assertRaises(SheetsApiError):
+            await scheduler.submit('read', call)
+        self.assertEqual(call.await_count, 1)
+        self.assertEqual(scheduler.metrics()['queue_depth'], 0)
+
+    async def test_gives_up_after_max_retries(self):
+        scheduler = self._scheduler(max_retries=2)
+        call = AsyncMock(side_effect=SheetsApiError(503, "unavailable"))
+
+        with self.assertRaises(SheetsApiError):
+            await scheduler.submit('write', call)
+        self.assertEqual(call.await_count, 3)
+        # ジッターを含めても上限の待ち時間を超えない
+        self.assertTrue(all(0 <= seconds <= 2 for seconds in self.clock.sleeps))
+
+
+if __name__ == '__main__':
+    unittest.main()